@@ -0,0 +1,25 @@
+# assign_areas.py
+#
+#   python assign_areas.py [areas.geojson]
+#
+# Recomputes every bathroom's ``areas`` from the GeoJSON file (default
+# AREAS_PATH). Run it after changing the file; imports and writes assign
+# areas as they go.
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# imported after load_dotenv so webapp.db sees MONGO_URI
+from webapp.areas import AREAS_PATH, assign_areas, ensure_indexes, load_areas  # noqa: E402
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else AREAS_PATH
+    count = load_areas(path)
+    if not count:
+        print(f"No areas loaded from {path or 'AREAS_PATH (unset)'}.")
+        sys.exit(1)
+    ensure_indexes()
+    updated = assign_areas()
+    print(f"Loaded {count} areas; updated the areas of {updated} bathrooms.")
@@ -0,0 +1,12 @@
+# backfill_review_summaries.py
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# imported after load_dotenv so webapp.db sees MONGO_URI
+from webapp.reviews import backfill_review_summaries  # noqa: E402
+
+
+if __name__ == "__main__":
+    updated = backfill_review_summaries()
+    print(f"Wrote review_summary on {updated} bathrooms.")
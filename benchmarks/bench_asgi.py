@@ -0,0 +1,157 @@
+# benchmarks/bench_asgi.py
+#
+# Throughput of GET /api/bathrooms (viewport query) and
+# GET /api/bathrooms/recommendations with many concurrent
+# clients: the sync Flask app on a fixed pool of WSGI threads vs the
+# ASGI app (webapp.asgi) on one hypercorn event loop. Both talk to the
+# Mongo at MONGO_URI; admission control is switched off for the run.
+#
+#   python -m benchmarks.bench_asgi [seconds] [wsgi_threads]
+import asyncio
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+from dotenv import load_dotenv
+
+load_dotenv()
+os.environ["ADMISSION_CONTROL"] = "0"
+
+from webapp.app import app as wsgi_app  # noqa: E402
+from webapp.asgi import app as asgi_app  # noqa: E402
+
+CONCURRENCY = (1, 16, 64, 256)
+LAT_RANGE = (40.49, 40.92)
+LON_RANGE = (-74.26, -73.70)
+
+
+def random_path():
+    lat = random.uniform(*LAT_RANGE)
+    lon = random.uniform(*LON_RANGE)
+    if random.random() < 0.25:
+        return f"/api/bathrooms/recommendations?lat={lat:.5f}&lon={lon:.5f}"
+    half = random.uniform(0.005, 0.02)
+    return (
+        f"/api/bathrooms?min_lat={lat - half:.5f}&max_lat={lat + half:.5f}"
+        f"&min_lon={lon - half:.5f}&max_lon={lon + half:.5f}&limit=200"
+    )
+
+
+class PooledWSGIServer(ThreadingMixIn, WSGIServer):
+    """wsgiref with a bounded worker pool, like gunicorn --threads N."""
+
+    pool_size = 8
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self.process_request_thread, request, client_address)
+
+    def serve_forever(self, poll_interval=0.5):
+        self._pool = ThreadPoolExecutor(self.pool_size)
+        super().serve_forever(poll_interval)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_wsgi(threads):
+    PooledWSGIServer.pool_size = threads
+    port = free_port()
+    server = make_server(
+        "127.0.0.1", port, wsgi_app, PooledWSGIServer, handler_class=QuietHandler
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return port
+
+
+def start_asgi():
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    port = free_port()
+    config = Config()
+    config.bind = [f"127.0.0.1:{port}"]
+    config.accesslog = None
+    config.errorlog = None
+
+    async def run():
+        # a shutdown trigger keeps hypercorn from installing signal handlers,
+        # which only works on the main thread
+        await serve(asgi_app, config, shutdown_trigger=asyncio.Event().wait)
+
+    threading.Thread(target=asyncio.run, args=(run(),), daemon=True).start()
+    return port
+
+
+async def fetch(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        request = f"GET {path} HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n"
+        writer.write(request.encode())
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b" ", 2)[1])
+
+
+async def load(port, concurrency, seconds):
+    deadline = time.perf_counter() + seconds
+    done = errors = 0
+
+    async def worker():
+        nonlocal done, errors
+        while time.perf_counter() < deadline:
+            try:
+                ok = await fetch(port, random_path()) == 200
+            except (OSError, IndexError, ValueError):
+                ok = False
+            if ok:
+                done += 1
+            else:
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return done / seconds, errors
+
+
+def wait_until_up(port):
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on {port} did not start")
+
+
+def main(seconds=5.0, threads=8):
+    servers = {f"sync ({threads} threads)": start_wsgi(threads), "asgi": start_asgi()}
+    for port in servers.values():
+        wait_until_up(port)
+
+    print(f"{'clients':>12} " + " ".join(f"{name:>20}" for name in servers))
+    for concurrency in CONCURRENCY:
+        cells = []
+        for port in servers.values():
+            rps, errors = asyncio.run(load(port, concurrency, seconds))
+            cells.append(f"{rps:>12.0f} req/s" + (f" ({errors} err)" if errors else ""))
+        print(f"{concurrency:>12} " + " ".join(f"{cell:>20}" for cell in cells))
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    main(seconds, threads)
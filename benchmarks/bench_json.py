@@ -0,0 +1,106 @@
+# benchmarks/bench_json.py
+#
+# Encode time per 1k bathrooms for the GET /api/bathrooms body (listings)
+# and GET /api/bathrooms/full (with reviews): the old path (a new dict per
+# row via serialize_*, then the stdlib encoder with sorted keys, as
+# Flask's default provider did) against the projected rows from wire_rows
+# encoded by webapp.json_provider. Synthetic rows; no database needed.
+#
+#   python -m benchmarks.bench_json [rows] [repeats]
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from webapp.json_provider import default, dumps_bytes, orjson
+from webapp.routes.api import (
+    FULL_DEFAULTS,
+    LISTING_DEFAULTS,
+    serialize_bathroom,
+    serialize_listing,
+    wire_rows,
+)
+
+TAG_VALUES = {
+    "name": ["Bryant Park", "Starbucks", "Public Restroom", "Library"],
+    "wheelchair": ["yes", "no", "limited"],
+    "fee": ["yes", "no"],
+    "opening_hours": ["24/7", "Mo-Fr 08:00-18:00", "Mo-Su 06:00-22:00"],
+}
+
+
+def synthetic_doc(osm_id, with_reviews):
+    doc = {
+        "osm_id": osm_id,
+        "lat": random.uniform(40.49, 40.92),
+        "lon": random.uniform(-74.26, -73.70),
+        "tags": {k: random.choice(v) for k, v in TAG_VALUES.items() if random.random() < 0.7},
+        "average_rating": random.choice([None, 3.5, 4.0, 4.25]),
+        "rating_count": random.randint(0, 5),
+    }
+    if with_reviews:
+        now = datetime.utcnow()
+        doc["reviews"] = [
+            {
+                "rating": random.randint(1, 5),
+                "comment": "clean, would go again " * random.randint(0, 3),
+                "user_name": "Someone",
+                "user_email": "someone@nyu.edu",
+                "created_at": now - timedelta(days=random.randint(0, 900)),
+            }
+            for _ in range(doc["rating_count"])
+        ]
+        doc["images"] = []
+    return doc
+
+
+def per_1k(label, encode, make_rows, rows, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        batch = make_rows()  # fresh rows each time, as a cursor would give
+        started = time.perf_counter()
+        body = encode(batch)
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:>44}: {best / rows * 1000 * 1000:8.3f} ms / 1k   ({len(body) // rows} B/row)")
+
+
+def stdlib_flask(payload):
+    return json.dumps(payload, default=default, sort_keys=True, separators=(",", ":")).encode()
+
+
+def main(rows, repeats):
+    print(f"encoder: {'orjson ' + orjson.__version__ if orjson else 'stdlib (orjson not installed)'}")
+    for name, with_reviews, serialize, defaults in (
+        ("listings", False, serialize_listing, LISTING_DEFAULTS),
+        ("full", True, serialize_bathroom, FULL_DEFAULTS),
+    ):
+        docs = [synthetic_doc(i, with_reviews) for i in range(rows)]
+
+        def old_rows():
+            return [dict(d, _id=i) for i, d in enumerate(docs)]
+
+        def new_rows():
+            return [dict(d) for d in docs]
+
+        per_1k(
+            f"{name}: serialize + stdlib (sorted)",
+            lambda batch: stdlib_flask({"bathrooms": [serialize(d) for d in batch]}),
+            old_rows,
+            rows,
+            repeats,
+        )
+        per_1k(
+            f"{name}: wire_rows + provider",
+            lambda batch: dumps_bytes({"bathrooms": wire_rows(batch, defaults)}),
+            new_rows,
+            rows,
+            repeats,
+        )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+    )
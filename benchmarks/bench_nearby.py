@@ -0,0 +1,59 @@
+# benchmarks/bench_nearby.py
+#
+# Radius search over 100k synthetic points: the old per-document Python
+# loop (planar squared degrees over every point) versus PointIndex
+# (latitude band + lon mask + vectorized haversine).
+#
+#   python -m benchmarks.bench_nearby [points] [queries]
+import random
+import sys
+import time
+
+from webapp.geo import PointIndex
+
+LAT_RANGE = (40.49, 40.92)
+LON_RANGE = (-74.26, -73.70)
+
+
+def python_nearest(docs, lat, lon, limit):
+    for doc in docs:
+        doc["dist_sq"] = (doc["lat"] - lat) ** 2 + (doc["lon"] - lon) ** 2
+    return sorted(docs, key=lambda doc: doc["dist_sq"])[:limit]
+
+
+def timed(label, fn, queries):
+    started = time.perf_counter()
+    for lat, lon in queries:
+        fn(lat, lon)
+    per_query = (time.perf_counter() - started) / len(queries) * 1000
+    print(f"{label:>28}: {per_query:8.3f} ms/query")
+
+
+def main(points, n_queries):
+    docs = [
+        {
+            "osm_id": i,
+            "lat": random.uniform(*LAT_RANGE),
+            "lon": random.uniform(*LON_RANGE),
+        }
+        for i in range(points)
+    ]
+    queries = [
+        (random.uniform(*LAT_RANGE), random.uniform(*LON_RANGE))
+        for _ in range(n_queries)
+    ]
+
+    started = time.perf_counter()
+    index = PointIndex.from_docs(docs)
+    print(f"Built index over {len(index)} points in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    timed("python loop, k=5", lambda lat, lon: python_nearest(docs, lat, lon, 5), queries[:20])
+    timed("numpy, k=5, no radius", lambda lat, lon: index.nearest(lat, lon, 5), queries)
+    timed("numpy, k=20, 1 km radius", lambda lat, lon: index.nearest(lat, lon, 20, 1000), queries)
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 200,
+    )
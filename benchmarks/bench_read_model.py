@@ -0,0 +1,87 @@
+# benchmarks/bench_read_model.py
+#
+# Checks the in-process read model against Mongo, then compares p50/p99
+# latency of the viewport query in GET /api/bathrooms on both paths.
+#
+#   python -m benchmarks.bench_read_model [iterations]
+import random
+import sys
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from webapp.db import bathrooms_collection  # noqa: E402
+from webapp.routes.api import serialize_listing  # noqa: E402
+from webapp.store import BathroomStore  # noqa: E402
+
+# NYC, roughly
+LAT_RANGE = (40.49, 40.92)
+LON_RANGE = (-74.26, -73.70)
+SORTS = (None, "rating", "reviews", "name")
+
+
+def random_viewport():
+    lat = random.uniform(*LAT_RANGE)
+    lon = random.uniform(*LON_RANGE)
+    half = random.uniform(0.005, 0.05)
+    return (lat - half, lat + half, lon - half, lon + half)
+
+
+def mongo_query(bbox, sort, limit):
+    min_lat, max_lat, min_lon, max_lon = bbox
+    cursor = bathrooms_collection.find(
+        {
+            "lat": {"$gte": min_lat, "$lte": max_lat},
+            "lon": {"$gte": min_lon, "$lte": max_lon},
+        }
+    )
+    sort_spec = {
+        "rating": [("average_rating", -1)],
+        "reviews": [("rating_count", -1)],
+        "name": [("tags.name", 1)],
+    }.get(sort)
+    if sort_spec:
+        cursor = cursor.sort(sort_spec)
+    return [serialize_listing(doc) for doc in cursor.limit(limit)]
+
+
+def store_query(store, bbox, sort, limit):
+    return [listing.to_dict() for listing in store.query(bbox, None, sort, limit)]
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]  # noqa: E731
+    return pick(0.50) * 1000, pick(0.99) * 1000
+
+
+def main(iterations):
+    store = BathroomStore(enabled=True)
+    started = time.perf_counter()
+    store.load()
+    print(f"Loaded {len(store)} bathrooms in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    report = store.verify()
+    print(
+        "Consistency: "
+        f"{len(report['missing'])} missing, {len(report['extra'])} extra, "
+        f"{len(report['stale'])} stale"
+    )
+
+    cases = [(random_viewport(), random.choice(SORTS), 2000) for _ in range(iterations)]
+    for label, run in (
+        ("mongo", lambda c: mongo_query(*c)),
+        ("read model", lambda c: store_query(store, *c)),
+    ):
+        samples = []
+        for case in cases:
+            t0 = time.perf_counter()
+            run(case)
+            samples.append(time.perf_counter() - t0)
+        p50, p99 = percentiles(samples)
+        print(f"{label:>10}: p50 {p50:7.3f} ms   p99 {p99:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,130 @@
+# benchmarks/bench_regions.py
+#
+# Query latency as regions are added. Each step registers another
+# synthetic metro (an NYC-sized box, 2 degrees east of the last) and loads
+# POINTS bathrooms into it, then times a viewport query and a top-rated
+# query inside the first metro two ways: routed (listing_query /
+# point_partition_query with the region indexes) and unrouted (the same
+# filter without the region key, i.e. a scan of every region). Uses a
+# scratch database on the Mongo at MONGO_URI.
+#
+#   python -m benchmarks.bench_regions [points_per_region] [max_regions]
+import random
+import statistics
+import sys
+import time
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+load_dotenv()
+
+from webapp import regions  # noqa: E402
+from webapp.db import mongo_uri  # noqa: E402
+from webapp.routes.api import listing_query  # noqa: E402
+
+LAT_RANGE = (40.49, 40.92)
+LON_RANGE = (-74.26, -73.70)
+LON_STEP = 2.0
+QUERIES = 200
+
+
+def synthetic_region(i):
+    min_lon, max_lon = LON_RANGE[0] + i * LON_STEP, LON_RANGE[1] + i * LON_STEP
+    min_lat, max_lat = LAT_RANGE
+    polygon = [(min_lat, min_lon), (max_lat, min_lon), (max_lat, max_lon), (min_lat, max_lon)]
+    return regions.Region(f"bench-{i}", f"Bench {i}", polygon)
+
+
+def load_region(collection, region, points, first_id):
+    min_lat, max_lat, min_lon, max_lon = region.bbox
+    docs = []
+    for n in range(points):
+        lat, lon = random.uniform(min_lat, max_lat), random.uniform(min_lon, max_lon)
+        docs.append(
+            {
+                "osm_id": first_id + n,
+                "lat": lat,
+                "lon": lon,
+                "region": regions.region_for_point(lat, lon),
+                "tags": {},
+                "average_rating": random.choice([None, 1.0, 2.5, 4.0, 5.0]),
+                "favorite_count": random.randint(0, 3),
+            }
+        )
+    collection.insert_many(docs)
+
+
+def viewport():
+    lat = random.uniform(*LAT_RANGE)
+    lon = random.uniform(*LON_RANGE)
+    half = random.uniform(0.005, 0.02)
+    return (lat - half, lat + half, lon - half, lon + half)
+
+
+def median_ms(run):
+    samples = []
+    for _ in range(QUERIES):
+        started = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main(points, max_regions):
+    collection = MongoClient(mongo_uri)["vivo_bench_regions"]["bathrooms"]
+    collection.drop()
+    for keys in regions.INDEXES:
+        collection.create_index(keys)
+    saved = dict(regions.REGIONS)
+    regions.REGIONS.clear()
+
+    def routed_viewport():
+        list(collection.find(listing_query(viewport()), {"osm_id": 1}))
+
+    def unrouted_viewport():
+        query = listing_query(viewport())
+        query.pop("region")
+        list(collection.find(query, {"osm_id": 1}))
+
+    def top_rated(partition):
+        def run():
+            query = {"average_rating": {"$ne": None}, **partition}
+            list(collection.find(query, {"osm_id": 1}).sort("average_rating", -1).limit(5))
+
+        return run
+
+    print(
+        f"{'regions':>8} {'docs':>9}  {'viewport routed':>16} {'unrouted':>9}"
+        f"  {'top-rated routed':>17} {'unrouted':>9}   (median ms)"
+    )
+    try:
+        count = 1
+        while count <= max_regions:
+            while len(regions.REGIONS) < count:
+                region = synthetic_region(len(regions.REGIONS))
+                regions.register(region)
+                load_region(collection, region, points, len(regions.REGIONS) * points)
+            lat, lon = statistics.mean(LAT_RANGE), statistics.mean(LON_RANGE)
+            partition = regions.point_partition_query(lat, lon)
+            cells = [
+                median_ms(routed_viewport),
+                median_ms(unrouted_viewport),
+                median_ms(top_rated(partition)),
+                median_ms(top_rated({})),
+            ]
+            print(
+                f"{count:>8} {collection.estimated_document_count():>9}  {cells[0]:>16.2f}"
+                f" {cells[1]:>9.2f}  {cells[2]:>17.2f} {cells[3]:>9.2f}"
+            )
+            count *= 2
+    finally:
+        regions.REGIONS.clear()
+        regions.REGIONS.update(saved)
+        collection.drop()
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 16,
+    )
@@ -0,0 +1,92 @@
+# benchmarks/bench_wire.py
+#
+# The GET /api/bathrooms body for a 2000-marker map, as today's JSON rows
+# and as format=compact (map tags only, and tags=all): bytes on the wire,
+# raw and gzipped, then the time to encode it and to parse it back into
+# row objects (json.loads, plus wire.expand for the compact forms, as the
+# browser does). Parse times are CPython's json, a stand-in for the
+# browser's JSON.parse. Synthetic OSM-like rows; no database needed.
+#
+#   python -m benchmarks.bench_wire [rows] [repeats]
+import gzip
+import json
+import random
+import sys
+import time
+from webapp.json_provider import dumps_bytes
+from webapp.routes.api import LISTING_DEFAULTS, wire_rows
+from webapp.wire import compact_listings, expand
+
+TAG_VALUES = {
+    "amenity": ["toilets"],
+    "name": ["Bryant Park", "Starbucks", "Public Restroom", "Library", "McDonald's"],
+    "access": ["yes", "customers", "permissive"],
+    "fee": ["yes", "no"],
+    "wheelchair": ["yes", "no", "limited"],
+    "unisex": ["yes", "no"],
+    "changing_table": ["yes", "no"],
+    "opening_hours": ["24/7", "Mo-Fr 08:00-18:00", "Mo-Su 06:00-22:00"],
+    "addr:housenumber": [str(n) for n in range(1, 400)],
+    "addr:street": ["Broadway", "5th Avenue", "Bedford Avenue", "Main Street"],
+    "addr:city": ["New York", "Brooklyn"],
+    "addr:postcode": ["10001", "10018", "11211", "11375"],
+}
+
+
+def synthetic_doc(osm_id):
+    return {
+        "osm_id": 100_000_000 + osm_id,
+        "lat": random.uniform(40.49, 40.92),
+        "lon": random.uniform(-74.26, -73.70),
+        "tags": {
+            k: random.choice(v) for k, v in TAG_VALUES.items() if random.random() < 0.6
+        },
+        "average_rating": random.choice([None, None, 3.5, 4.0, 4.333333333333333]),
+        "rating_count": random.randint(0, 5),
+    }
+
+
+def best_ms(run, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main(rows, repeats):
+    random.seed(48)
+    docs = [synthetic_doc(i) for i in range(rows)]
+    # fresh rows per run for the JSON path, as a cursor would give
+    variants = {
+        "json rows": (
+            lambda: {"bathrooms": wire_rows([dict(d) for d in docs], LISTING_DEFAULTS)},
+            lambda payload: payload["bathrooms"],
+        ),
+        "compact": (lambda: compact_listings(docs), expand),
+        "compact, tags=all": (lambda: compact_listings(docs, tag_keys=None), expand),
+    }
+
+    print(f"{rows} markers")
+    print(
+        f"{'':>18} {'bytes':>9} {'gzip':>8}  {'encode ms':>9}  {'parse ms':>8}"
+        f"  {'parse+rows ms':>13}"
+    )
+    for name, (build, decode) in variants.items():
+        body = dumps_bytes(build())
+        gzipped = len(gzip.compress(body, 6))
+        encode = best_ms(lambda: dumps_bytes(build()), repeats)
+        parse = best_ms(lambda: json.loads(body), repeats)
+        rows_ms = best_ms(lambda: decode(json.loads(body)), repeats)
+        print(
+            f"{name:>18} {len(body):>9} {gzipped:>8}  {encode:>9.2f}  {parse:>8.2f}"
+            f"  {rows_ms:>13.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+    )
@@ -0,0 +1,26 @@
+# build_street_graph.py
+#
+#   python build_street_graph.py nyc-streets.osm [nyc-streets.graph]
+#
+# Compacts the walkable ways of an OSM XML extract into the street graph
+# file STREET_GRAPH_PATH points at, landmark trees included, so app workers
+# map one prebuilt file instead of each parsing the XML at startup.
+import sys
+import time
+from webapp.routing import build_engine, write_graph
+
+DEFAULT_PATH = "nyc-streets.graph"
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("usage: python build_street_graph.py EXTRACT.osm [OUTPUT]")
+    path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_PATH
+    started = time.perf_counter()
+    engine = build_engine(sys.argv[1])
+    write_graph(path, engine)
+    elapsed = time.perf_counter() - started
+    print(
+        f"Wrote {len(engine.graph)} nodes and {len(engine.landmark_trees)} landmarks"
+        f" to {path} in {elapsed:.2f}s."
+    )
@@ -0,0 +1,19 @@
+# export_snapshot.py
+import sys
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# imported after load_dotenv so webapp.db sees MONGO_URI
+from webapp.snapshot import export_snapshot  # noqa: E402
+
+DEFAULT_PATH = "bathrooms.snap"
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+    started = time.perf_counter()
+    count = export_snapshot(path)
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {count} bathrooms to {path} in {elapsed:.2f}s.")
@@ -1,69 +1,73 @@
 # import_overpass.py
+#
+#   python import_overpass.py [--workers N] [--tile-degrees D] [region ...]
+#
+# Regions default to nyc.
+#
+# Rerunning after an interrupted or partly failed import picks up from the
+# region's checkpoint file instead of starting over.
+import argparse
 import os
-import requests
-from pymongo import MongoClient
+import sys
 from dotenv import load_dotenv
 
-load_dotenv() 
-mongo_uri = os.getenv("MONGO_URI")
+load_dotenv()
 
-client = MongoClient(mongo_uri)
-db = client["bathrooms"]  
-collection = db["bathrooms"]  
+# imported after load_dotenv so webapp.db sees MONGO_URI
+from webapp.areas import AREAS_PATH, load_areas  # noqa: E402
+from webapp.areas import ensure_indexes as ensure_area_indexes  # noqa: E402
+from webapp.changes import compact_changes  # noqa: E402
+from webapp.duplicates import ensure_indexes  # noqa: E402
+from webapp.enrichment import enrichment_queue  # noqa: E402
+from webapp.images import ensure_indexes as ensure_image_indexes  # noqa: E402
+from webapp.overpass import MAX_WORKERS, TILE_DEGREES, import_region  # noqa: E402
+from webapp.regions import DEFAULT_REGION, REGIONS, backfill_regions  # noqa: E402
+from webapp.regions import ensure_indexes as ensure_region_indexes  # noqa: E402
 
-# overpass api
-overpass_url = "https://overpass-api.de/api/interpreter"
-query = """
-[out:json][timeout:25];
-area["name"="City of New York"]["boundary"="administrative"]["admin_level"="5"]->.nyc;
-(
-  node["amenity"="toilets"](area.nyc);
-  way["amenity"="toilets"](area.nyc);
-  relation["amenity"="toilets"](area.nyc);
-);
-out center;
-"""
 
 # insert the bathrooms into mongo
-def fetch_and_insert_bathrooms():
-    try:
-        response = requests.post(overpass_url, data=query)
-        response.raise_for_status()
-        data = response.json()
-    except requests.RequestException as e:
-        print("Error fetching data from Overpass API:", e)
-        return
+def fetch_and_insert_bathrooms(
+    region_name=DEFAULT_REGION, workers=MAX_WORKERS, tile_degrees=TILE_DEGREES
+):
+    region = REGIONS[region_name]
+    report = import_region(
+        region,
+        checkpoint_path=os.path.join(os.getcwd(), f".overpass-{region.name}.checkpoint"),
+        tile_degrees=tile_degrees,
+        workers=workers,
+    )
+    print(
+        f"{region.label}: {report['fetched']} of {report['tiles']} tiles fetched"
+        f" ({report['skipped']} already done), {report['changed']} bathrooms inserted/updated."
+    )
+    for failure in report["failed"]:
+        print(f"  tile {failure['tile']} failed: {failure['error']}")
+    return not report["failed"]
 
-    elements = data.get("elements", [])
-    if not elements:
-        print("No bathrooms found from Overpass API.")
-        return
-
-    inserted_count = 0
-    for el in elements:
-        osm_id = el["id"]
-        lat = el.get("lat") or el.get("center", {}).get("lat")
-        lon = el.get("lon") or el.get("center", {}).get("lon")
-        if lat is None or lon is None:
-            continue
-
-        doc = {
-            "osm_id": osm_id,
-            "lat": lat,
-            "lon": lon,
-            "tags": el.get("tags", {})
-        }
-
-        result = collection.update_one(
-            {"osm_id": osm_id},
-            {"$set": doc},
-            upsert=True
-        )
-
-        if result.upserted_id or result.modified_count:
-            inserted_count += 1
-
-    print(f"Inserted/Updated {inserted_count} bathrooms into MongoDB.")
 
 if __name__ == "__main__":
-    fetch_and_insert_bathrooms()
+    parser = argparse.ArgumentParser(description="Import bathrooms from OpenStreetMap")
+    parser.add_argument("regions", nargs="*", default=[DEFAULT_REGION], choices=sorted(REGIONS))
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--tile-degrees", type=float, default=TILE_DEGREES)
+    args = parser.parse_args()
+
+    # bathrooms get their boroughs/neighborhoods as they are written
+    load_areas(AREAS_PATH)
+    # addresses are looked up by the app's worker (or update_addresses.py)
+    enrichment_queue.autostart = False
+    # every region runs even if an earlier one left failed tiles
+    results = [
+        fetch_and_insert_bathrooms(name, args.workers, args.tile_degrees)
+        for name in args.regions
+    ]
+    ensure_indexes()
+    ensure_region_indexes()
+    ensure_image_indexes()
+    ensure_area_indexes()
+    backfill_regions()
+    # the change log already has the import as a diff; drop what it superseded
+    compact_changes()
+    if not all(results):
+        print("Some tiles failed; run the import again to retry them.")
+        sys.exit(1)
@@ -0,0 +1,28 @@
+# merge_duplicates.py
+import argparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# imported after load_dotenv so webapp.db sees MONGO_URI
+from webapp.duplicates import (  # noqa: E402
+    backfill_geocells,
+    ensure_indexes,
+    merge_duplicates,
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge near-duplicate bathrooms.")
+    parser.add_argument("--radius", type=float, help="max distance in meters")
+    parser.add_argument("--similarity", type=float, help="min name similarity, 0-1")
+    parser.add_argument("--dry-run", action="store_true", help="only list clusters")
+    args = parser.parse_args()
+
+    ensure_indexes()
+    backfill_geocells()
+    results = merge_duplicates(args.radius, args.similarity, dry_run=args.dry_run)
+    for result in results:
+        print(result)
+    verb = "Found" if args.dry_run else "Merged"
+    print(f"{verb} {len(results)} duplicate clusters.")
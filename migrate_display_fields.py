@@ -0,0 +1,12 @@
+# migrate_display_fields.py
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# imported after load_dotenv so webapp.db sees MONGO_URI
+from webapp.display import backfill_display_fields  # noqa: E402
+
+
+if __name__ == "__main__":
+    updated = backfill_display_fields()
+    print(f"Stored display fields and review dates on {updated} bathrooms.")
@@ -0,0 +1,21 @@
+# profile_token.py
+#
+#   python profile_token.py <path> [ttl_seconds]
+#
+# Prints an X-Profile header value, signed with PROFILE_SECRET, that
+# profiles requests to <path> (e.g. /api/bathrooms/recommendations) until
+# it expires. Profiles are listed at /admin/profiles.
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from webapp.profiling import PROFILE_SECRET, TOKEN_TTL_SECONDS, profile_token  # noqa: E402
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or not PROFILE_SECRET:
+        print("usage: python profile_token.py <path> [ttl_seconds] (needs PROFILE_SECRET)")
+        sys.exit(1)
+    ttl = int(sys.argv[2]) if len(sys.argv) > 2 else TOKEN_TTL_SECONDS
+    print(profile_token(sys.argv[1], ttl))
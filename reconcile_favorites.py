@@ -0,0 +1,12 @@
+# reconcile_favorites.py
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# imported after load_dotenv so webapp.db sees MONGO_URI
+from webapp.favorites import reconcile_favorite_counts  # noqa: E402
+
+
+if __name__ == "__main__":
+    fixed = reconcile_favorite_counts()
+    print(f"Reconciled favorite_count on {fixed} bathrooms.")
@@ -0,0 +1,100 @@
+import webapp.app as app_module
+from webapp.admission import EXPENSIVE_ENDPOINTS, AdmissionController, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+BUDGETS = {
+    ("cheap", "user"): (1.0, 2),
+    ("cheap", "ip"): (10.0, 4),
+    ("expensive", "user"): (0.5, 1),
+    ("expensive", "ip"): (1.0, 2),
+}
+
+
+def controller(**kwargs):
+    clock = FakeClock()
+    return AdmissionController(budgets=BUDGETS, enabled=True, clock=clock, **kwargs), clock
+
+
+def admit_and_release(ctl, *args):
+    refused = ctl.admit(*args)
+    if refused is None:
+        ctl.release()
+    return refused
+
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(rate=2.0, capacity=3, now=0.0)
+    bucket.tokens = 0
+    assert bucket.wait_time() == 0.5
+    bucket.refill(10.0)
+    assert bucket.tokens == 3
+    assert bucket.wait_time() == 0
+
+
+def test_user_budget_and_retry_after():
+    ctl, clock = controller()
+    assert admit_and_release(ctl, "cheap", "1.1.1.1", "a@x") is None
+    assert admit_and_release(ctl, "cheap", "1.1.1.1", "a@x") is None
+    assert admit_and_release(ctl, "cheap", "1.1.1.1", "a@x") == (429, "throttled", 1)
+    # another user behind the same IP still has their own budget
+    assert admit_and_release(ctl, "cheap", "1.1.1.1", "b@x") is None
+    clock.now += 1.0
+    assert admit_and_release(ctl, "cheap", "1.1.1.1", "a@x") is None
+    assert ctl.stats()["throttled_user"] == 1
+
+
+def test_ip_budget_applies_to_anonymous_clients():
+    ctl, _ = controller()
+    results = [admit_and_release(ctl, "cheap", "2.2.2.2") for _ in range(5)]
+    assert results[:4] == [None] * 4
+    assert results[4][0] == 429
+    assert ctl.stats()["throttled_ip"] == 1
+
+
+def test_refusal_does_not_charge_other_buckets():
+    ctl, _ = controller()
+    assert admit_and_release(ctl, "expensive", "3.3.3.3", "a@x") is None
+    assert admit_and_release(ctl, "expensive", "3.3.3.3", "a@x")[0] == 429
+    # the IP bucket was only charged for the admitted request
+    assert admit_and_release(ctl, "expensive", "3.3.3.3", "b@x") is None
+    assert admit_and_release(ctl, "expensive", "3.3.3.3", "c@x")[0] == 429
+
+
+def test_expensive_endpoints_exist():
+    endpoints = {rule.endpoint for rule in app_module.app.url_map.iter_rules()}
+    assert EXPENSIVE_ENDPOINTS <= endpoints
+    assert "api.search_bathrooms" in EXPENSIVE_ENDPOINTS
+    # the listing fetched on every map pan
+    assert "api.get_bathrooms" in EXPENSIVE_ENDPOINTS
+
+
+def test_ranked_search_uses_expensive_budget():
+    ctl, _ = controller()
+    assert ctl.check("api.search_bathrooms", "8.8.8.8", "a@nyu.edu") == (True, None)
+    ctl.release()
+    admitted, refusal = ctl.check("api.search_bathrooms", "8.8.8.8", "a@nyu.edu")
+    assert not admitted and refusal[1] == 429
+    # the cheap budget for the same user is untouched
+    assert ctl.check("api.get_bathroom_detail", "8.8.8.8", "a@nyu.edu") == (True, None)
+
+
+def test_expensive_routes_are_shed_first():
+    ctl, _ = controller(max_in_flight=4)
+    for _ in range(3):
+        assert ctl.admit("cheap", "4.4.4.%d" % _) is None
+    assert ctl.admit("expensive", "5.5.5.5") == (503, "shed", 1)
+    assert ctl.admit("cheap", "6.6.6.6") is None
+    assert ctl.admit("cheap", "7.7.7.7") == (503, "shed", 1)
+    ctl.release()
+    assert ctl.admit("cheap", "7.7.7.7") is None
+    stats = ctl.stats()
+    assert stats["shed"] == 2
+    assert stats["in_flight"] == 4
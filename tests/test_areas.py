@@ -0,0 +1,135 @@
+import math
+import os
+import random
+import pytest
+import webapp.app as app_module
+import webapp.areas as areas_module
+import webapp.store as store_module
+from webapp.polygons import PreparedPolygon
+from webapp.regions import point_in_polygon
+from tests.test_backend import app_client, login, test_db  # noqa: F401
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "areas.geojson")
+
+DOCS = [
+    {"osm_id": 1, "lat": 40.67, "lon": -73.98, "tags": {"name": "In Park Slope"}},
+    {"osm_id": 2, "lat": 40.61, "lon": -73.95, "tags": {"name": "South Brooklyn"}},
+    {"osm_id": 3, "lat": 40.65, "lon": -73.95, "tags": {"name": "In the hole"}},
+    {"osm_id": 4, "lat": 40.61, "lon": -73.87, "tags": {"name": "Second part"}},
+    {"osm_id": 5, "lat": 40.75, "lon": -73.98, "tags": {"name": "Manhattan"}},
+]
+
+
+@pytest.fixture
+def areas(monkeypatch):
+    monkeypatch.setattr(areas_module, "AREAS", {})
+    areas_module.load_areas(FIXTURE)
+    return areas_module.AREAS
+
+
+def star(n, lat=40.7, lon=-73.9, spikes=7):
+    """A concave ring with ``n`` vertices."""
+    ring = []
+    for i in range(n):
+        t = 2 * math.pi * i / n
+        r = 0.1 * (0.5 + 0.5 * math.sin(spikes * t))
+        ring.append((lat + r * math.cos(t), lon + r * math.sin(t)))
+    return ring
+
+
+def test_prepared_polygon_matches_ray_casting():
+    random.seed(46)
+    ring = star(400)
+    hole = star(30, spikes=0)
+    hole = [(40.7 + (a - 40.7) / 10, -73.9 + (b + 73.9) / 10) for a, b in hole]
+    polygon = PreparedPolygon([ring, hole])
+    points = [
+        (random.uniform(40.58, 40.82), random.uniform(-74.02, -73.78)) for _ in range(5000)
+    ]
+    expected = [
+        point_in_polygon(lat, lon, ring) != point_in_polygon(lat, lon, hole)
+        for lat, lon in points
+    ]
+    got = polygon.contains_many([p[0] for p in points], [p[1] for p in points])
+    assert got.tolist() == expected
+    assert any(expected) and not all(expected)
+    assert polygon.contains(40.72, -73.91) == point_in_polygon(40.72, -73.91, ring)
+    assert not polygon.contains(40.7, -73.9)  # in the hole
+
+
+def test_prepared_polygon_rejects_degenerate_rings():
+    with pytest.raises(ValueError):
+        PreparedPolygon([[(0, 0), (1, 1)]])
+
+
+def test_load_areas(areas):
+    assert sorted(areas) == ["brooklyn", "park-slope"]
+    assert areas["park-slope"].name == "Park Slope"
+    assert areas_module.areas_for_point(40.67, -73.98) == ["brooklyn", "park-slope"]
+    assert areas_module.areas_for_point(40.65, -73.95) == []  # in the hole
+    assert areas_module.areas_for_point(40.61, -73.87) == ["brooklyn"]
+    assert areas_module.load_areas("missing.geojson") == 0
+
+
+def test_parse_polygon():
+    polygon = areas_module.parse_polygon("40.6,-74,40.7,-74,40.7,-73.9")
+    assert polygon.contains(40.69, -73.99)
+    for bad in ("40.6,-74,40.7,-74", "40.6,-74,40.7", "a,b,c,d,e,f", "91,0,0,1,1,1"):
+        with pytest.raises(ValueError):
+            areas_module.parse_polygon(bad)
+
+
+def test_assign_areas(areas, test_db, monkeypatch):
+    monkeypatch.setattr(areas_module, "bathrooms_collection", test_db["bathrooms"])
+    test_db["bathrooms"].insert_many([dict(doc) for doc in DOCS])
+    assert areas_module.assign_areas() == len(DOCS)
+    assigned = {doc["osm_id"]: doc["areas"] for doc in test_db["bathrooms"].find()}
+    assert assigned == {
+        1: ["brooklyn", "park-slope"],
+        2: ["brooklyn"],
+        3: [],
+        4: ["brooklyn"],
+        5: [],
+    }
+    assert areas_module.assign_areas() == 0
+
+
+def bathroom_ids(app_client, query):
+    resp = app_client.get(f"/api/bathrooms?{query}")
+    assert resp.status_code == 200, resp.get_json()
+    return sorted(row["osm_id"] for row in resp.get_json()["bathrooms"])
+
+
+def test_region_and_polygon_queries(app_client, test_db, areas, monkeypatch):
+    monkeypatch.setattr(areas_module, "bathrooms_collection", test_db["bathrooms"])
+    test_db["bathrooms"].insert_many([dict(doc, region="nyc") for doc in DOCS])
+    areas_module.assign_areas()
+
+    assert bathroom_ids(app_client, "region=brooklyn") == [1, 2, 4]
+    assert bathroom_ids(app_client, "region=Park Slope") == [1]
+    assert bathroom_ids(app_client, "region=nyc") == [1, 2, 3, 4, 5]
+    clipped = "region=brooklyn&min_lat=40.6&max_lat=40.62&min_lon=-74&max_lon=-73.9"
+    assert bathroom_ids(app_client, clipped) == [2]
+    triangle = "40.6,-74,40.7,-74,40.7,-73.85"
+    assert bathroom_ids(app_client, f"polygon={triangle}") == [1, 3]
+    assert bathroom_ids(app_client, f"polygon={triangle}&limit=1") in ([1], [3])
+
+    for query in ("region=atlantis", f"region=nyc&polygon={triangle}", "polygon=1,2"):
+        assert app_client.get(f"/api/bathrooms?{query}").status_code == 400
+
+    # the read model answers from the polygons, not the stored assignment
+    store = store_module.BathroomStore(enabled=True)
+    monkeypatch.setattr(store_module, "bathrooms_collection", test_db["bathrooms"])
+    monkeypatch.setattr(app_module.api, "read_model", store)
+    assert bathroom_ids(app_client, "region=brooklyn") == [1, 2, 4]
+    assert bathroom_ids(app_client, f"polygon={triangle}") == [1, 3]
+
+
+def test_new_bathroom_gets_areas(app_client, test_db, areas):
+    login(app_client)
+    body = {"osm_id": 4601, "lat": 40.67, "lon": -73.98, "tags": {}, "force": True}
+    assert app_client.post("/api/bathrooms/add", json=body).status_code == 201
+    assert test_db["bathrooms"].find_one({"osm_id": 4601})["areas"] == [
+        "brooklyn",
+        "park-slope",
+    ]
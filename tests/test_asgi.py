@@ -0,0 +1,194 @@
+import asyncio
+import os
+from pymongo import AsyncMongoClient
+import webapp.asgi as asgi_module
+import webapp.ingest as ingest_module
+from webapp.duplicates import geocell
+from webapp.favorites import FavoriteCounter
+from webapp.profiling import profiler
+from webapp.routes import api_async
+from tests.test_backend import TEST_DB_NAME, app_client, login, test_db  # noqa: F401
+
+DOCS = [
+    {
+        "osm_id": 7001,
+        "lat": 40.7300,
+        "lon": -73.9950,
+        "tags": {"name": "Alpha", "wheelchair": "yes"},
+        "reviews": [],
+        "average_rating": 4.5,
+        "rating_count": 2,
+        "favorite_count": 3,
+    },
+    {
+        "osm_id": 7002,
+        "lat": 40.7310,
+        "lon": -73.9960,
+        "tags": {"name": "Beta", "fee": "no"},
+        "reviews": [],
+        "average_rating": None,
+        "rating_count": 0,
+        "favorite_count": 0,
+    },
+]
+
+PARITY_URLS = [
+    "/api/bathrooms?min_lat=40&max_lat=41&min_lon=-74&max_lon=-73&sort=name",
+    "/api/bathrooms?wheelchair=yes",
+    "/api/bathrooms?region=nyc",
+    "/api/bathrooms?format=compact&sort=name",
+    "/api/bathrooms?polygon=40.72,-74,40.74,-74,40.74,-73.99&limit=1",
+    "/api/bathrooms?region=atlantis",
+    "/api/bathrooms/7001",
+    "/api/bathrooms/7001/reviews",
+    "/api/bathrooms/nearby?lat=40.73&lon=-73.995&radius_m=2000",
+    "/api/bathrooms/recommendations?lat=40.73&lon=-73.995",
+    "/api/bathrooms/search?lat=40.73&lon=-73.995&q=alp&w_favorites=2",
+    "/api/bathrooms/facets",
+    "/api/bathrooms/changes",
+    "/api/bathrooms/full",
+    "/api/bathrooms/abc",
+    "/api/bathrooms/404",
+    "/api/bathrooms/nearby?lat=x&lon=1",
+]
+
+
+def run_async(monkeypatch, scenario):
+    """Run ``scenario(client)`` against the ASGI app on the test database."""
+
+    async def main():
+        mongo = AsyncMongoClient(os.environ.get("MONGO_URI"))
+        db = mongo[TEST_DB_NAME]
+        monkeypatch.setattr(api_async, "bathrooms_collection", db["bathrooms"])
+        monkeypatch.setattr(api_async, "users_collection", db["users"])
+        monkeypatch.setattr(api_async, "favorite_counter", FavoriteCounter(interval=3600))
+        asgi_module.app.testing = True
+        try:
+            return await scenario(asgi_module.app.test_client())
+        finally:
+            await mongo.close()
+
+    return asyncio.run(main())
+
+
+def test_async_api_matches_sync_api(app_client, test_db, monkeypatch):
+    test_db["bathrooms"].insert_many([dict(doc) for doc in DOCS])
+
+    expected = {}
+    for url in PARITY_URLS:
+        resp = app_client.get(url)
+        expected[url] = (resp.status_code, resp.get_json())
+
+    async def scenario(client):
+        results = {}
+        for url in PARITY_URLS:
+            resp = await client.get(url)
+            results[url] = (resp.status_code, await resp.get_json())
+        return results
+
+    assert run_async(monkeypatch, scenario) == expected
+
+
+def test_async_review_flow(app_client, test_db, monkeypatch):
+    test_db["bathrooms"].insert_many([dict(doc) for doc in DOCS])
+    test_db["users"].insert_one({"email": "async@nyu.edu", "favorites": []})
+
+    async def scenario(client):
+        async with client.session_transaction() as sess:
+            sess["user"] = {"email": "async@nyu.edu", "name": "Async"}
+        resp = await client.post("/api/bathrooms/7002/reviews", json={"rating": 4})
+        assert resp.status_code == 201
+        posted = await resp.get_json()
+        resp = await client.post("/api/users/favorites/7002")
+        assert resp.status_code == 200
+        resp = await client.post("/api/bathrooms/7002/reviews", json={"rating": 9})
+        assert resp.status_code == 400
+        return posted
+
+    posted = run_async(monkeypatch, scenario)
+    assert posted["rating_count"] == 1
+    assert posted["my_review"]["rating"] == 4
+
+    # written through the async driver, visible to the sync app
+    login(app_client, email="async@nyu.edu", name="Async")
+    detail = app_client.get("/api/bathrooms/7002").get_json()
+    assert detail["review_summary"]["histogram"] == [0, 0, 0, 0, 1, 0]
+    assert app_client.get("/api/users/favorites").get_json()["favorites"] == [7002]
+
+
+def test_async_bulk_ingest(app_client, test_db, monkeypatch):
+    monkeypatch.setattr(ingest_module, "bathrooms_collection", test_db["bathrooms"])
+    body = (
+        b'{"osm_id": 7100, "lat": 40.7, "lon": -73.9}\n'
+        b"nope\n"
+        b'{"osm_id": 7101, "lat": 40.8, "lon": -73.9}'
+    )
+
+    async def scenario(client):
+        assert (await client.post("/api/bathrooms/bulk", data=body)).status_code == 401
+        async with client.session_transaction() as sess:
+            sess["user"] = {"email": "async@nyu.edu", "name": "Async"}
+        resp = await client.post("/api/bathrooms/bulk", data=body)
+        return await resp.get_json()
+
+    report = run_async(monkeypatch, scenario)
+    assert report["accepted"] == 2
+    assert report["errors"] == [{"line": 2, "error": report["errors"][0]["error"]}]
+    assert test_db["bathrooms"].count_documents({"osm_id": {"$in": [7100, 7101]}}) == 2
+
+
+def test_async_add_bathroom_returns_duplicates(app_client, test_db, monkeypatch):
+    test_db["bathrooms"].insert_many(
+        [dict(doc, geocell=geocell(doc["lat"], doc["lon"])) for doc in DOCS]
+    )
+    body = {"osm_id": 7200, "lat": 40.73001, "lon": -73.99501, "tags": {"name": "alpha"}}
+
+    async def scenario(client):
+        async with client.session_transaction() as sess:
+            sess["user"] = {"email": "async@nyu.edu", "name": "Async"}
+        refused = await client.post("/api/bathrooms/add", json=body)
+        forced = await client.post("/api/bathrooms/add", json=dict(body, force=True))
+        return refused.status_code, await refused.get_json(), forced.status_code
+
+    status, refused, forced_status = run_async(monkeypatch, scenario)
+    assert status == 409
+    assert [c["osm_id"] for c in refused["candidates"]] == [7001]
+    assert forced_status == 201
+
+
+def test_async_admission_stats_are_for_admins(app_client, test_db, monkeypatch):
+    monkeypatch.setattr(profiler, "admins", frozenset({"admin@nyu.edu"}))
+
+    async def scenario(client):
+        anonymous = await client.get("/api/admission")
+        async with client.session_transaction() as sess:
+            sess["user"] = {"email": "admin@nyu.edu", "name": "Admin"}
+        admin = await client.get("/api/admission")
+        return anonymous.status_code, admin.status_code, await admin.get_json()
+
+    anonymous, admin, stats = run_async(monkeypatch, scenario)
+    assert (anonymous, admin) == (403, 200)
+    assert "in_flight" in stats
+
+
+def test_async_stream_pushes_review_updates(app_client, test_db, monkeypatch):
+    test_db["bathrooms"].insert_one(
+        {"osm_id": 7300, "lat": 40.7, "lon": -73.9, "tags": {}, "reviews": []}
+    )
+    url = "/api/stream?min_lat=40&max_lat=41&min_lon=-74.5&max_lon=-73.5"
+
+    async def scenario(client):
+        async with client.request(url) as connection:
+            await connection.send_complete()
+            first = await connection.receive()
+            async with client.session_transaction() as sess:
+                sess["user"] = {"email": "live@nyu.edu", "name": "Live"}
+            await client.post("/api/bathrooms/7300/reviews", json={"rating": 3})
+            update = await asyncio.wait_for(connection.receive(), 5)
+            await connection.disconnect()
+        return first, update
+
+    first, update = run_async(monkeypatch, scenario)
+    assert first.startswith(b"retry:")
+    assert update.startswith(b"event: bathrooms")
+    assert b'"rating_count": 1' in update
@@ -1,9 +1,24 @@
+import io
 import os
 import json
+from datetime import datetime, timedelta
 import pytest
 from pymongo import MongoClient
 from dotenv import load_dotenv
 import webapp.app as app_module
+import webapp.changes as changes_module
+import webapp.display as display_module
+import webapp.duplicates as duplicates_module
+import webapp.enrichment as enrichment_module
+import webapp.facets as facets_module
+import webapp.favorites as favorites_module
+import webapp.ingest as ingest_module
+import webapp.overpass as overpass_module
+import webapp.regions as regions_module
+import webapp.reviews as reviews_module
+import webapp.snapshot as snapshot_module
+import webapp.store as store_module
+from webapp import routing as routing_module
 
 
 load_dotenv(".env.test")
@@ -22,6 +37,10 @@ def test_db():
     db = get_test_db()
     db["bathrooms"].delete_many({})
     db["users"].delete_many({})
+    db["changes"].delete_many({})
+    db["counters"].delete_many({})
+    db["enrichment_jobs"].delete_many({})
+    db["merged_bathrooms"].delete_many({})
     return db
 
 
@@ -29,7 +48,28 @@ def test_db():
 def app_client(test_db, monkeypatch):
     monkeypatch.setattr(app_module.api, "bathrooms_collection", test_db["bathrooms"])
     monkeypatch.setattr(app_module.api, "users_collection", test_db["users"])
+    monkeypatch.setattr(app_module.main, "bathrooms_collection", test_db["bathrooms"])
     monkeypatch.setattr(app_module.auth, "users_collection", test_db["users"])
+    monkeypatch.setattr(changes_module, "changes_collection", test_db["changes"])
+    monkeypatch.setattr(changes_module, "counters_collection", test_db["counters"])
+    monkeypatch.setattr(favorites_module, "bathrooms_collection", test_db["bathrooms"])
+    monkeypatch.setattr(favorites_module, "counters_collection", test_db["counters"])
+    monkeypatch.setattr(duplicates_module, "bathrooms_collection", test_db["bathrooms"])
+    monkeypatch.setattr(duplicates_module, "users_collection", test_db["users"])
+    monkeypatch.setattr(duplicates_module, "merged_collection", test_db["merged_bathrooms"])
+    monkeypatch.setattr(favorites_module, "users_collection", test_db["users"])
+    # a private buffer per test, flushed explicitly rather than on a timer
+    monkeypatch.setattr(
+        app_module.api, "favorite_counter", favorites_module.FavoriteCounter(interval=3600)
+    )
+    # jobs are queued on the test database and only run when a test drains them
+    queue = enrichment_module.enrichment_queue
+    monkeypatch.setattr(queue, "collection", test_db["enrichment_jobs"])
+    monkeypatch.setattr(queue, "autostart", False)
+    monkeypatch.setattr(enrichment_module, "bathrooms_collection", test_db["bathrooms"])
+    # seqs restart with the counter, so cached facet indexes must not outlive it
+    monkeypatch.setattr(facets_module, "_partitions", {})
+    app_module.admission.reset()
     app_module.app.testing = True
     with app_module.app.test_client() as client:
         yield client
@@ -90,7 +130,10 @@ def test_get_bathroom_detail_serializes_fields(app_client, test_db):
     data = resp.get_json()
     assert data["osm_id"] == 123
     assert data["tags"]["name"] == "Detail Bathroom"
-    assert data["reviews"][0]["comment"] == "nice"
+    assert "reviews" not in data
+    assert data["review_summary"]["histogram"] == [0, 0, 0, 0, 1, 0]
+    assert data["review_summary"]["recent"][0]["comment"] == "nice"
+    assert data["my_review"] is None
     assert data["images"] == ["img1"]
     assert data["average_rating"] == 4.0
     assert data["rating_count"] == 1
@@ -405,6 +448,8 @@ def test_favorites_add_and_remove(app_client, test_db):
 
     user_doc = test_db["users"].find_one({"email": "fav@nyu.edu"})
     assert user_doc["favorites"] == [870]
+    assert app_module.api.favorite_counter.pending(870) == 1
+    assert app_module.api.favorite_counter.flush() == 1
     bathroom_doc = test_db["bathrooms"].find_one({"osm_id": 870})
     assert bathroom_doc.get("favorite_count") == 1
 
@@ -416,6 +461,7 @@ def test_favorites_add_and_remove(app_client, test_db):
     assert resp.status_code == 200
     user_doc = test_db["users"].find_one({"email": "fav@nyu.edu"})
     assert user_doc["favorites"] == []
+    app_module.api.favorite_counter.flush()
     bathroom_doc = test_db["bathrooms"].find_one({"osm_id": 870})
     assert bathroom_doc.get("favorite_count") == 0
 
@@ -432,3 +478,777 @@ def test_recommendations_returns_sections_even_when_empty(app_client, test_db):
     assert data["top_rated"] == []
     assert data["most_favorited"] == []
     assert data["nearest"] == []
+
+
+def test_changes_without_replica_asks_for_reset(app_client, test_db):
+    resp = app_client.get("/api/bathrooms/changes?since=0")
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["reset"] is True
+    assert data["upserts"] == []
+
+
+def test_changes_returns_only_writes_since_seq(app_client, test_db):
+    app_client.post("/api/bathrooms/add", json={"osm_id": 900, "lat": 40.0, "lon": -73.0})
+    seq = app_client.get("/api/bathrooms").get_json()["seq"]
+    assert seq >= 1
+
+    app_client.post("/api/bathrooms/add", json={"osm_id": 901, "lat": 40.1, "lon": -73.1})
+    login(app_client, email="sync@nyu.edu", name="Sync")
+    app_client.post("/api/bathrooms/900/reviews", json={"rating": 4})
+
+    data = app_client.get(f"/api/bathrooms/changes?since={seq}").get_json()
+    assert data["reset"] is False
+    assert sorted(b["osm_id"] for b in data["upserts"]) == [900, 901]
+    reviewed = next(b for b in data["upserts"] if b["osm_id"] == 900)
+    assert reviewed["rating_count"] == 1
+    assert data["deletions"] == []
+
+    data = app_client.get(f"/api/bathrooms/changes?since={data['seq']}").get_json()
+    assert data["upserts"] == []
+    assert data["has_more"] is False
+
+
+def test_changes_pages_with_limit(app_client, test_db):
+    for osm_id in (910, 911, 912):
+        app_client.post(
+            "/api/bathrooms/add", json={"osm_id": osm_id, "lat": 0, "lon": 0, "force": True}
+        )
+
+    data = app_client.get("/api/bathrooms/changes?since=1&limit=1").get_json()
+    assert data["has_more"] is True
+    assert [b["osm_id"] for b in data["upserts"]] == [911]
+    assert data["seq"] == 2
+
+
+def test_compaction_drops_tombstones_and_forces_reset(app_client, test_db):
+    changes_module.record_change(920, op="delete")
+    changes_module.record_changes([921, 922])
+
+    data = app_client.get("/api/bathrooms/changes?since=0&limit=10")
+    assert data.get_json()["reset"] is True
+    data = app_client.get("/api/bathrooms/changes?since=1").get_json()
+    assert data["deletions"] == []
+
+    assert changes_module.compact_changes(retention=1) == 1
+    assert changes_module.compacted_floor() == 2
+    assert test_db["changes"].count_documents({"op": "delete"}) == 0
+
+    data = app_client.get("/api/bathrooms/changes?since=1").get_json()
+    assert data["reset"] is True
+
+
+def test_changes_wait_for_writers_that_took_earlier_seqs(app_client, test_db):
+    changes_module.record_change(940)
+    # writer A takes seq 2, then writer B takes seq 3 and finishes first
+    first, token = changes_module.allocate_seqs(1)
+    changes_module.record_change(942)
+    assert first == 2 and changes_module.head_seq() == 3
+
+    # B's row is held back, so a reader's cursor can't pass A's
+    assert changes_module.current_seq() == 1
+    data = app_client.get("/api/bathrooms/changes?since=1").get_json()
+    assert (data["seq"], data["upserts"], data["deletions"]) == (1, [], [])
+
+    test_db["changes"].insert_one({"osm_id": 941, "seq": first, "op": "delete"})
+    changes_module.release_seqs(token)
+    data = app_client.get("/api/bathrooms/changes?since=1").get_json()
+    assert data["seq"] == 3 and data["deletions"] == [941]
+
+    # a writer that died stops holding the log back once it times out
+    changes_module.allocate_seqs(1)
+    changes_module.record_change(943)
+    assert changes_module.current_seq() == 3
+    later = datetime.utcnow() + timedelta(seconds=changes_module.IN_FLIGHT_TIMEOUT_SECONDS)
+    assert changes_module.current_seq(now=later) == 5
+    assert changes_module.release_abandoned(now=later) == 1
+    assert changes_module.current_seq() == 5
+
+
+def test_stream_is_not_served_by_the_wsgi_app(app_client, test_db):
+    resp = app_client.get("/api/stream?min_lat=40&max_lat=41&min_lon=-74.5&max_lon=-73.5")
+    assert resp.status_code == 501
+    assert "ASGI" in resp.get_json()["error"]
+
+
+def test_favorite_toggles_coalesce_before_flush(app_client, test_db):
+    test_db["bathrooms"].insert_one({"osm_id": 940, "lat": 0, "lon": 0, "favorite_count": 3})
+    test_db["users"].insert_one({"email": "toggle@nyu.edu", "favorites": []})
+    login(app_client, email="toggle@nyu.edu", name="Toggle")
+
+    app_client.post("/api/users/favorites/940")
+    app_client.delete("/api/users/favorites/940")
+
+    counter = app_module.api.favorite_counter
+    assert counter.pending(940) == 0
+    assert counter.flush() == 0
+    assert test_db["bathrooms"].find_one({"osm_id": 940})["favorite_count"] == 3
+
+
+def test_reconcile_favorite_counts(app_client, test_db):
+    test_db["bathrooms"].insert_many(
+        [
+            {"osm_id": 950, "favorite_count": 7},
+            {"osm_id": 951, "favorite_count": 0},
+            {"osm_id": 952, "favorite_count": 2},
+        ]
+    )
+    test_db["users"].insert_many(
+        [
+            {"email": "a@nyu.edu", "favorites": [950, 951]},
+            {"email": "b@nyu.edu", "favorites": [950]},
+        ]
+    )
+
+    assert favorites_module.reconcile_favorite_counts() == 3
+    counts = {
+        d["osm_id"]: d["favorite_count"] for d in test_db["bathrooms"].find()
+    }
+    assert counts == {950: 2, 951: 1, 952: 0}
+
+
+def test_failed_flush_keeps_deltas_without_recursing(app_client, test_db, monkeypatch):
+    class Down:
+        def bulk_write(self, ops, ordered=True):
+            raise ConnectionError("mongo is down")
+
+    monkeypatch.setattr(favorites_module, "bathrooms_collection", Down())
+    counter = favorites_module.FavoriteCounter(interval=0)
+
+    for _ in range(3):
+        try:
+            counter.add(945, 1)
+        except ConnectionError:
+            pass
+    assert counter.pending(945) == 3
+
+
+def test_reconcile_is_not_undone_by_another_workers_flush(app_client, test_db):
+    test_db["bathrooms"].insert_one({"osm_id": 955, "lat": 0, "lon": 0, "favorite_count": 9})
+    # another worker favorited it and hasn't flushed yet
+    test_db["users"].insert_one({"email": "c@nyu.edu", "favorites": [955]})
+    other_worker = favorites_module.FavoriteCounter(interval=3600)
+    other_worker.add(955, 1)
+    since = changes_module.current_seq()
+
+    assert favorites_module.reconcile_favorite_counts() == 1
+    assert test_db["bathrooms"].find_one({"osm_id": 955})["favorite_count"] == 1
+    assert [row["osm_id"] for row in test_db["changes"].find({"seq": {"$gt": since}})] == [955]
+
+    other_worker.flush()
+    assert test_db["bathrooms"].find_one({"osm_id": 955})["favorite_count"] == 1
+
+
+def test_snapshot_catch_up_applies_newer_writes(app_client, test_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_module, "bathrooms_collection", test_db["bathrooms"])
+    app_client.post("/api/bathrooms/add", json={"osm_id": 960, "lat": 40.0, "lon": -73.0})
+    app_client.post("/api/bathrooms/add", json={"osm_id": 961, "lat": 40.1, "lon": -73.1})
+    # kept out of the file, and read from Mongo when seeding
+    app_client.post("/api/bathrooms/add", json={"osm_id": "s1", "lat": 40.3, "lon": -73.3})
+
+    path = tmp_path / "bathrooms.snap"
+    assert snapshot_module.export_snapshot(path) == 2
+
+    login(app_client, email="snap@nyu.edu", name="Snap")
+    app_client.post("/api/bathrooms/960/reviews", json={"rating": 5})
+    app_client.post("/api/bathrooms/add", json={"osm_id": 962, "lat": 40.2, "lon": -73.2})
+    changes_module.record_change(961, op="delete")
+
+    monkeypatch.setattr(snapshot_module, "loaded", None)
+    snap = snapshot_module.warm_start(str(path))
+    rows, seq = snapshot_module.seed_rows(snap)
+    by_id = {row["osm_id"]: row for row in rows}
+    assert sorted(by_id, key=str) == [960, 962, "s1"]
+    assert by_id[960]["rating_count"] == 1
+    assert seq == changes_module.current_seq()
+
+
+def test_snapshot_too_old_to_catch_up(app_client, test_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_module, "bathrooms_collection", test_db["bathrooms"])
+    path = tmp_path / "bathrooms.snap"
+    snapshot_module.export_snapshot(path)
+    changes_module.record_changes([1, 2, 3])
+    changes_module.compact_changes(retention=1)
+
+    assert snapshot_module.seed_rows(snapshot_module.Snapshot(path)) is None
+
+
+def test_get_bathrooms_served_from_read_model(app_client, test_db, monkeypatch):
+    monkeypatch.setattr(store_module, "bathrooms_collection", test_db["bathrooms"])
+    store = store_module.BathroomStore(enabled=True)
+    monkeypatch.setattr(app_module.api, "read_model", store)
+    test_db["bathrooms"].insert_many(
+        [
+            {"osm_id": 970, "lat": 40.70, "lon": -73.90, "tags": {"name": "RM A"}, "average_rating": 2, "rating_count": 1},
+            {"osm_id": 971, "lat": 40.71, "lon": -73.91, "tags": {"name": "RM B"}, "average_rating": 5, "rating_count": 3},
+        ]
+    )
+
+    data = app_client.get("/api/bathrooms?sort=rating").get_json()
+    assert [b["osm_id"] for b in data["bathrooms"]] == [971, 970]
+    assert store.loaded
+
+    # local writes land immediately
+    login(app_client, email="rm@nyu.edu", name="RM")
+    app_client.post("/api/bathrooms/970/reviews", json={"rating": 5})
+    assert store.get(970).average_rating == 5
+
+    # writes from other processes arrive through the change sequence
+    test_db["bathrooms"].insert_one({"osm_id": 972, "lat": 40.7, "lon": -73.9, "tags": {}})
+    changes_module.record_change(972)
+    store.refresh()
+    assert store.get(972) is not None
+    assert store.verify() == {"missing": [], "extra": [], "stale": []}
+
+    test_db["bathrooms"].update_one({"osm_id": 971}, {"$set": {"rating_count": 4}})
+    assert store.verify()["stale"] == [971]
+
+
+def test_nearby_returns_distances_within_radius(app_client, test_db):
+    test_db["bathrooms"].insert_many(
+        [
+            {"osm_id": 980, "lat": 40.7490, "lon": -73.9855, "tags": {}},
+            {"osm_id": 981, "lat": 40.7580, "lon": -73.9855, "tags": {}},
+            {"osm_id": 982, "lat": 40.8500, "lon": -73.9000, "tags": {}},
+        ]
+    )
+    resp = app_client.get("/api/bathrooms/nearby?lat=40.7488&lon=-73.9854&radius_m=1500")
+    assert resp.status_code == 200
+    bathrooms = resp.get_json()["bathrooms"]
+    assert [b["osm_id"] for b in bathrooms] == [980, 981]
+    assert bathrooms[0]["distance_m"] < bathrooms[1]["distance_m"] <= 1500
+
+
+def test_nearby_validates_params(app_client, test_db):
+    assert app_client.get("/api/bathrooms/nearby?lat=x&lon=1").status_code == 400
+    resp = app_client.get("/api/bathrooms/nearby?lat=40&lon=-73&radius_m=-5")
+    assert resp.status_code == 400
+
+
+def test_recommendations_nearest_includes_distance(app_client, test_db):
+    test_db["bathrooms"].insert_many(
+        [
+            {"osm_id": 990, "lat": 40.70, "lon": -73.90, "tags": {}},
+            {"osm_id": 991, "lat": 41.70, "lon": -73.90, "tags": {}},
+        ]
+    )
+    data = app_client.get("/api/bathrooms/recommendations?lat=40.7&lon=-73.9").get_json()
+    assert [b["osm_id"] for b in data["nearest"]] == [990, 991]
+    assert data["nearest"][0]["distance_m"] == 0
+
+
+def test_walking_nearest_not_configured(app_client, test_db):
+    resp = app_client.get("/api/bathrooms/nearest-walk?lat=40.7&lon=-74")
+    assert resp.status_code == 503
+
+
+def test_walking_nearest_and_recommendations(app_client, test_db, monkeypatch):
+    fixture = os.path.join(os.path.dirname(__file__), "fixtures", "small_graph.osm")
+    engine = routing_module.WalkingEngine(
+        routing_module.StreetGraph(*routing_module.read_osm_xml(fixture)), landmarks=1
+    )
+    monkeypatch.setattr(routing_module, "engine", engine)
+    test_db["bathrooms"].insert_many(
+        [
+            {"osm_id": 1000, "lat": 40.702, "lon": -74.000, "tags": {}},
+            {"osm_id": 1001, "lat": 40.700, "lon": -73.994, "tags": {}},
+        ]
+    )
+
+    resp = app_client.get("/api/bathrooms/nearest-walk?lat=40.700&lon=-74.000&k=2")
+    assert resp.status_code == 200
+    bathrooms = resp.get_json()["bathrooms"]
+    assert [b["osm_id"] for b in bathrooms] == [1001, 1000]
+    assert bathrooms[0]["walk_seconds"] < bathrooms[1]["walk_seconds"]
+
+    data = app_client.get("/api/bathrooms/recommendations?lat=40.700&lon=-74.000").get_json()
+    assert data["nearest"][0]["osm_id"] == 1001
+
+    # the open filter only looks at bathrooms within walking reach
+    test_db["bathrooms"].insert_one(
+        {"osm_id": 1002, "lat": 41.8781, "lon": -87.6298, "tags": {}}
+    )
+    resp = app_client.get(
+        "/api/bathrooms/nearest-walk?lat=40.700&lon=-74.000&k=5&open_at=2025-01-06T09:00:00"
+    )
+    assert [b["osm_id"] for b in resp.get_json()["bathrooms"]] == [1001, 1000]
+
+    # off the street graph's extract: straight-line results instead of none
+    resp = app_client.get("/api/bathrooms/recommendations?lat=41.8781&lon=-87.6298")
+    data = resp.get_json()
+    assert data["nearest"][0]["osm_id"] == 1002
+    assert data["nearest"][0]["distance_m"] == 0
+
+
+def insert_facet_bathrooms(test_db):
+    test_db["bathrooms"].insert_many(
+        [
+            {"osm_id": 1010, "lat": 40.70, "lon": -73.90, "tags": {"wheelchair": "yes", "fee": "no"}},
+            {"osm_id": 1011, "lat": 40.71, "lon": -73.91, "tags": {"wheelchair": "no", "fee": "no"}},
+            {"osm_id": 1012, "lat": 40.72, "lon": -73.92, "tags": {"wheelchair": "yes", "fee": "yes"}},
+            {"osm_id": 1013, "lat": 40.73, "lon": -73.93, "tags": {}},
+        ]
+    )
+
+
+def test_get_bathrooms_facet_filters(app_client, test_db):
+    insert_facet_bathrooms(test_db)
+    data = app_client.get("/api/bathrooms?wheelchair=yes&fee=no").get_json()
+    assert [b["osm_id"] for b in data["bathrooms"]] == [1010]
+    data = app_client.get("/api/bathrooms?fee=unknown").get_json()
+    assert [b["osm_id"] for b in data["bathrooms"]] == [1013]
+
+
+def test_facet_counts_endpoint(app_client, test_db):
+    insert_facet_bathrooms(test_db)
+    resp = app_client.get(
+        "/api/bathrooms/facets?min_lat=40.69&max_lat=40.715&min_lon=-73.95&max_lon=-73.85"
+    )
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["total"] == 2
+    assert data["facets"]["wheelchair"] == {"yes": 1, "no": 1}
+    assert data["facets"]["fee"] == {"no": 2}
+
+
+def test_facet_values_ignore_case_without_read_model(app_client, test_db):
+    insert_facet_bathrooms(test_db)
+    tags = {"wheelchair": " Yes", "fee": ""}
+    test_db["bathrooms"].insert_one({"osm_id": 1014, "lat": 40.74, "lon": -73.94, "tags": tags})
+    data = app_client.get("/api/bathrooms?wheelchair=yes&sort=name").get_json()
+    assert sorted(b["osm_id"] for b in data["bathrooms"]) == [1010, 1012, 1014]
+    data = app_client.get("/api/bathrooms?fee=unknown").get_json()
+    assert sorted(b["osm_id"] for b in data["bathrooms"]) == [1013, 1014]
+
+
+def test_facet_counts_are_cached_until_a_change(app_client, test_db):
+    insert_facet_bathrooms(test_db)
+    viewport = "min_lat=40.69&max_lat=40.8&min_lon=-74&max_lon=-73.85"
+    assert app_client.get(f"/api/bathrooms/facets?{viewport}").get_json()["total"] == 4
+    # written behind the change log's back: the cached index is still served
+    test_db["bathrooms"].insert_one({"osm_id": 1015, "lat": 40.74, "lon": -73.9})
+    assert app_client.get(f"/api/bathrooms/facets?{viewport}").get_json()["total"] == 4
+
+    app_client.post(
+        "/api/bathrooms/add",
+        json={"osm_id": 1016, "lat": 40.75, "lon": -73.9, "tags": {}, "force": True},
+    )
+    data = app_client.get(f"/api/bathrooms/facets?{viewport}").get_json()
+    assert data["total"] == 6 and data["facets"]["fee"]["unknown"] == 3
+
+
+def test_facets_from_read_model(app_client, test_db, monkeypatch):
+    monkeypatch.setattr(store_module, "bathrooms_collection", test_db["bathrooms"])
+    monkeypatch.setattr(app_module.api, "read_model", store_module.BathroomStore(enabled=True))
+    insert_facet_bathrooms(test_db)
+
+    data = app_client.get("/api/bathrooms?wheelchair=yes&sort=name").get_json()
+    assert sorted(b["osm_id"] for b in data["bathrooms"]) == [1010, 1012]
+    data = app_client.get("/api/bathrooms/facets?wheelchair=yes").get_json()
+    assert data["total"] == 2
+    assert data["facets"]["fee"] == {"no": 1, "yes": 1}
+
+
+def insert_hours_bathrooms(app_client):
+    for osm_id, hours in ((1020, "Mo-Fr 08:00-18:00"), (1021, "Sa,Su 10:00-16:00"), (1022, "whenever")):
+        app_client.post(
+            "/api/bathrooms/add",
+            json={
+                "osm_id": osm_id,
+                "lat": 40.7,
+                "lon": -73.9,
+                "tags": {"opening_hours": hours},
+                "force": True,
+            },
+        )
+
+
+def test_add_bathroom_compiles_opening_hours(app_client, test_db):
+    insert_hours_bathrooms(app_client)
+    weekday = test_db["bathrooms"].find_one({"osm_id": 1020})
+    assert len(weekday["open_intervals"]) == 5
+    assert test_db["bathrooms"].find_one({"osm_id": 1022})["open_intervals"] is None
+
+
+def test_open_at_filter(app_client, test_db):
+    insert_hours_bathrooms(app_client)
+    # Monday morning: the weekday one plus the unparseable one
+    data = app_client.get("/api/bathrooms?open_at=2025-01-06T09:00:00").get_json()
+    assert sorted(b["osm_id"] for b in data["bathrooms"]) == [1020, 1022]
+
+    data = app_client.get(
+        "/api/bathrooms/recommendations?lat=40.7&lon=-73.9&open_at=2025-01-11T11:00:00"
+    ).get_json()
+    assert sorted(b["osm_id"] for b in data["nearest"]) == [1021, 1022]
+
+    assert app_client.get("/api/bathrooms?open_at=tomorrow").status_code == 400
+
+
+def test_open_at_filter_from_read_model(app_client, test_db, monkeypatch):
+    monkeypatch.setattr(store_module, "bathrooms_collection", test_db["bathrooms"])
+    monkeypatch.setattr(app_module.api, "read_model", store_module.BathroomStore(enabled=True))
+    insert_hours_bathrooms(app_client)
+
+    data = app_client.get("/api/bathrooms?open_at=2025-01-06T09:00:00").get_json()
+    assert sorted(b["osm_id"] for b in data["bathrooms"]) == [1020, 1022]
+    data = app_client.get(
+        "/api/bathrooms/recommendations?lat=40.7&lon=-73.9&open_at=2025-01-11T11:00:00"
+    ).get_json()
+    assert sorted(b["osm_id"] for b in data["nearest"]) == [1021, 1022]
+
+
+def test_open_at_uses_region_time_zone(app_client, test_db):
+    app_client.post(
+        "/api/bathrooms/add",
+        json={
+            "osm_id": 1030,
+            "lat": 41.8781,
+            "lon": -87.6298,
+            "tags": {"opening_hours": "Mo 09:00-10:00"},
+            "force": True,
+        },
+    )
+    # 15:30 UTC is 09:30 in Chicago but 10:30 in New York
+    query = "lat=41.8781&lon=-87.6298&open_at=2025-01-06T15:30:00Z"
+    data = app_client.get(f"/api/bathrooms/recommendations?{query}").get_json()
+    assert [b["osm_id"] for b in data["nearest"]] == [1030]
+    data = app_client.get(
+        "/api/bathrooms?min_lat=41.8&max_lat=41.9&min_lon=-87.7&max_lon=-87.6"
+        "&open_at=2025-01-06T15:30:00Z"
+    ).get_json()
+    assert [b["osm_id"] for b in data["bathrooms"]] == [1030]
+
+
+def test_review_summary_stays_constant_size(app_client, test_db):
+    test_db["bathrooms"].insert_one(
+        {"osm_id": 310, "lat": 40.0, "lon": -73.0, "reviews": [], "rating_count": 0}
+    )
+    for i, rating in enumerate([5, 4, 4, 2, 1]):
+        login(app_client, email=f"user{i}@nyu.edu", name=f"User {i}")
+        app_client.post("/api/bathrooms/310/reviews", json={"rating": rating, "comment": f"c{i}"})
+
+    # user4 changes their 1 into a 3, then user0 deletes theirs
+    app_client.post("/api/bathrooms/310/reviews", json={"rating": 3, "comment": "changed"})
+    login(app_client, email="user0@nyu.edu", name="User 0")
+    resp = app_client.delete("/api/bathrooms/310/reviews")
+    summary = resp.get_json()["review_summary"]
+    assert summary["histogram"] == [0, 0, 1, 1, 2, 0]
+    assert [r["comment"] for r in summary["recent"]] == ["changed", "c3", "c2"]
+    assert summary["last_review_at"] == summary["recent"][0]["created_at"]
+
+    login(app_client, email="user2@nyu.edu", name="User 2")
+    data = app_client.get("/api/bathrooms/310").get_json()
+    assert data["review_summary"] == summary
+    assert data["my_review"]["comment"] == "c2"
+    assert data["rating_count"] == 4
+
+
+def test_backfill_review_summaries(test_db, monkeypatch):
+    monkeypatch.setattr(reviews_module, "bathrooms_collection", test_db["bathrooms"])
+    test_db["bathrooms"].insert_many(
+        [
+            {"osm_id": 320, "reviews": [{"rating": 4, "comment": "ok"}]},
+            {"osm_id": 321},
+        ]
+    )
+    assert reviews_module.backfill_review_summaries() == 2
+    doc = test_db["bathrooms"].find_one({"osm_id": 320})
+    assert doc["review_summary"]["histogram"] == [0, 0, 0, 0, 1, 0]
+
+
+def test_expensive_routes_are_throttled_per_user(app_client, test_db, monkeypatch):
+    test_db["bathrooms"].insert_one({"osm_id": 1280, "lat": 40.0, "lon": -73.0})
+    login(app_client, email="scraper@nyu.edu")
+    statuses = [app_client.get("/api/bathrooms/full").status_code for _ in range(12)]
+    assert statuses[:10] == [200] * 10
+    assert statuses[-1] == 429
+
+    resp = app_client.get("/api/bathrooms/full")
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) >= 1
+    # the map listing shares the expensive budget; detail popups don't
+    assert app_client.get("/api/bathrooms").status_code == 429
+    assert app_client.get("/api/bathrooms/1280").status_code == 200
+
+    # the counters are for admins only
+    assert app_client.get("/api/admission").status_code == 403
+    monkeypatch.setattr(app_module.api.profiler, "admins", frozenset({"scraper@nyu.edu"}))
+    stats = app_client.get("/api/admission").get_json()
+    assert stats["throttled_user"] >= 4
+    assert stats["in_flight"] == 0
+
+
+def test_load_is_shed_when_too_much_is_in_flight(app_client, test_db, monkeypatch):
+    monkeypatch.setattr(app_module.admission, "in_flight", app_module.admission.max_in_flight)
+    resp = app_client.get("/api/bathrooms")
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+    assert app_module.admission.stats()["shed"] == 1
+
+
+def test_add_bathroom_rejects_duplicate_osm_id(app_client, test_db):
+    body = {"osm_id": 1100, "lat": 40.0, "lon": -73.0}
+    assert app_client.post("/api/bathrooms/add", json=body).status_code == 201
+    assert app_client.post("/api/bathrooms/add", json=body).status_code == 409
+    assert test_db["bathrooms"].count_documents({"osm_id": 1100}) == 1
+
+
+def test_bulk_ingest_requires_login(app_client, test_db):
+    resp = app_client.post("/api/bathrooms/bulk", data=b'{"osm_id": 1}\n')
+    assert resp.status_code == 401
+
+
+def test_bulk_ingest_upserts_and_reports_errors(app_client, test_db, monkeypatch):
+    monkeypatch.setattr(ingest_module, "bathrooms_collection", test_db["bathrooms"])
+    monkeypatch.setattr(ingest_module, "BATCH_SIZE", 2)
+    test_db["bathrooms"].insert_one(
+        {"osm_id": 1200, "lat": 1.0, "lon": 1.0, "rating_count": 3, "average_rating": 4.0}
+    )
+    lines = [
+        {"osm_id": 1200, "lat": 40.1, "lon": -73.1, "tags": {"name": "Renamed"}},
+        {"osm_id": 1201, "lat": 40.2, "lon": -73.2},
+        "not json",
+        {"osm_id": 1202, "lat": 400, "lon": -73.2},
+        {"osm_id": 1203, "lat": 40.3, "lon": -73.3, "tags": {"opening_hours": "24/7"}},
+        {"osm_id": 1201, "lat": 40.25, "lon": -73.25},
+    ]
+    body = "\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+    login(app_client)
+    resp = app_client.post(
+        "/api/bathrooms/bulk", data=body, content_type="application/x-ndjson"
+    )
+    assert resp.status_code == 200
+    report = resp.get_json()
+    assert report["lines"] == 6
+    assert report["accepted"] == 4
+    assert [e["line"] for e in report["errors"]] == [3, 4]
+    assert "lat" in report["errors"][1]["error"]
+    assert report["records_per_second"] > 0
+
+    existing = test_db["bathrooms"].find_one({"osm_id": 1200})
+    assert existing["tags"]["name"] == "Renamed"
+    assert existing["rating_count"] == 3  # reviews/ratings are left alone
+    new = test_db["bathrooms"].find_one({"osm_id": 1203})
+    assert new["rating_count"] == 0 and new["reviews"] == []
+    assert new["open_intervals"] == [{"s": 0, "e": 10080}]
+    assert test_db["bathrooms"].count_documents({"osm_id": 1201}) == 1
+
+    # two batches of two; 1201 is written by both
+    changes = app_client.get("/api/bathrooms/changes?since=1").get_json()
+    assert changes["seq"] == 4
+    assert {b["osm_id"] for b in changes["upserts"]} == {1201, 1203}
+
+
+def test_add_bathroom_returns_nearby_duplicates(app_client, test_db):
+    test_db["bathrooms"].insert_many(
+        [
+            {"osm_id": 1300, "lat": 40.73000, "lon": -73.99000, "geocell": duplicates_module.geocell(40.73, -73.99), "tags": {"name": "Bryant Park Restroom"}},
+            {"osm_id": 1301, "lat": 40.73005, "lon": -73.99005, "geocell": duplicates_module.geocell(40.73005, -73.99005), "tags": {"name": "Starbucks"}},
+        ]
+    )
+    body = {"osm_id": 1302, "lat": 40.73010, "lon": -73.99010, "tags": {"name": "Bryant Park Public Toilets"}}
+    resp = app_client.post("/api/bathrooms/add", json=body)
+    assert resp.status_code == 409
+    candidates = resp.get_json()["candidates"]
+    assert [c["osm_id"] for c in candidates] == [1300]
+    assert candidates[0]["distance_m"] < 25
+
+    # far enough away, or insisted on, it goes in
+    far = dict(body, osm_id=1303, lat=40.7350)
+    assert app_client.post("/api/bathrooms/add", json=far).status_code == 201
+    assert app_client.post("/api/bathrooms/add", json=dict(body, force=True)).status_code == 201
+    added = test_db["bathrooms"].find_one({"osm_id": 1302})
+    assert added["source"] == "user"
+    assert added["geocell"] == duplicates_module.geocell(40.73010, -73.99010)
+
+
+def test_duplicate_check_backfills_geocells(app_client, test_db, monkeypatch):
+    monkeypatch.setattr(duplicates_module, "_geocells", {"ready": False})
+    test_db["bathrooms"].insert_one(
+        {"osm_id": 1310, "lat": 40.73, "lon": -73.99, "tags": {"name": "Cafe"}}
+    )
+    body = {"osm_id": 1311, "lat": 40.73001, "lon": -73.99001, "tags": {"name": "cafe"}}
+    resp = app_client.post("/api/bathrooms/add", json=body)
+    assert resp.status_code == 409
+    assert [c["osm_id"] for c in resp.get_json()["candidates"]] == [1310]
+    stored = test_db["bathrooms"].find_one({"osm_id": 1310})
+    assert stored["geocell"] == duplicates_module.geocell(40.73, -73.99)
+
+
+def test_merge_duplicates_folds_reviews_and_favorites(test_db, monkeypatch):
+    monkeypatch.setattr(duplicates_module, "bathrooms_collection", test_db["bathrooms"])
+    monkeypatch.setattr(duplicates_module, "users_collection", test_db["users"])
+    monkeypatch.setattr(changes_module, "changes_collection", test_db["changes"])
+    monkeypatch.setattr(changes_module, "counters_collection", test_db["counters"])
+    test_db["bathrooms"].insert_many(
+        [
+            {
+                "osm_id": 1400, "lat": 40.7, "lon": -73.9, "tags": {"name": "Cafe"},
+                "reviews": [{"rating": 5, "user_email": "a@x", "created_at": "2024-01-01"}],
+                "rating_count": 1, "images": ["one"],
+            },
+            {
+                "osm_id": 1401, "lat": 40.70001, "lon": -73.90001, "source": "user",
+                "tags": {"name": "cafe", "wheelchair": "yes"},
+                "reviews": [
+                    {"rating": 1, "user_email": "a@x", "created_at": "2024-06-01"},
+                    {"rating": 3, "user_email": "b@x", "created_at": "2024-02-01"},
+                ],
+                "rating_count": 2, "images": ["one", "two"],
+            },
+            {"osm_id": 1402, "lat": 40.8, "lon": -73.9, "tags": {"name": "Cafe"}},
+        ]
+    )
+    test_db["users"].insert_many(
+        [{"email": "a@x", "favorites": [1401]}, {"email": "b@x", "favorites": [1400, 1401]}]
+    )
+
+    assert duplicates_module.merge_duplicates(dry_run=True) == [{"osm_ids": [1400, 1401]}]
+    assert duplicates_module.merge_duplicates() == [{"survivor": 1400, "merged": [1401]}]
+
+    merged = test_db["bathrooms"].find_one({"osm_id": 1400})
+    assert test_db["bathrooms"].count_documents({"osm_id": 1401}) == 0
+    assert merged["tags"] == {"name": "Cafe", "wheelchair": "yes"}
+    assert merged["images"] == ["one", "two"]
+    # a@x keeps only their newer review
+    assert [(r["user_email"], r["rating"]) for r in merged["reviews"]] == [("b@x", 3), ("a@x", 1)]
+    assert merged["average_rating"] == 2 and merged["rating_count"] == 2
+    assert merged["favorite_count"] == 2
+    assert [u["favorites"] for u in test_db["users"].find({}, {"favorites": 1})] == [[1400], [1400]]
+    ops = {c["osm_id"]: c["op"] for c in test_db["changes"].find()}
+    assert ops == {1400: "upsert", 1401: "delete"}
+
+
+def test_merged_bathrooms_stay_merged_on_reimport(test_db, monkeypatch):
+    monkeypatch.setattr(duplicates_module, "bathrooms_collection", test_db["bathrooms"])
+    monkeypatch.setattr(duplicates_module, "users_collection", test_db["users"])
+    monkeypatch.setattr(duplicates_module, "merged_collection", test_db["merged_bathrooms"])
+    monkeypatch.setattr(changes_module, "changes_collection", test_db["changes"])
+    monkeypatch.setattr(changes_module, "counters_collection", test_db["counters"])
+    monkeypatch.setattr(ingest_module, "bathrooms_collection", test_db["bathrooms"])
+    monkeypatch.setattr(overpass_module, "bathrooms_collection", test_db["bathrooms"])
+    test_db["bathrooms"].insert_many(
+        [
+            {"osm_id": 1410, "lat": 40.7, "lon": -73.9, "tags": {"name": "Cafe"}},
+            {"osm_id": 1411, "lat": 40.7, "lon": -73.9, "tags": {"name": "Cafe"}},
+            {"osm_id": 1412, "lat": 40.7, "lon": -73.9, "tags": {}, "source": "user"},
+        ]
+    )
+    duplicates_module.merge_cluster([1411, 1412])
+    duplicates_module.merge_cluster([1410, 1411])
+    # the earlier tombstone follows its survivor into the second merge
+    tombstones = {d["_id"]: d["merged_into"] for d in test_db["merged_bathrooms"].find()}
+    assert tombstones == {1411: 1410, 1412: 1410}
+
+    element = {"type": "node", "id": 1411, "lat": 40.7, "lon": -73.9, "tags": {"name": "Cafe"}}
+    assert overpass_module.upsert_elements([element, {**element, "id": 1413}]) == [1413]
+    lines = [{"osm_id": 1412, "lat": 40.7, "lon": -73.9}, {"osm_id": 1414, "lat": 1, "lon": 1}]
+    report = ingest_module.ingest_ndjson(
+        io.BytesIO("\n".join(json.dumps(line) for line in lines).encode())
+    )
+    assert (report["accepted"], report["merged"]) == (1, 1)
+    remaining = sorted(d["osm_id"] for d in test_db["bathrooms"].find())
+    assert remaining == [1410, 1413, 1414]
+
+
+def test_my_reviews_page_reads_stored_display_fields(app_client, test_db, monkeypatch):
+    monkeypatch.setattr(display_module, "bathrooms_collection", test_db["bathrooms"])
+    test_db["bathrooms"].insert_many(
+        [
+            {
+                "osm_id": 1500,
+                "lat": 40.71234,
+                "lon": -73.98765,
+                "tags": {"addr:housenumber": "5", "addr:street": "Main St"},
+                "reviews": [
+                    {"rating": 4, "comment": "ok", "user_email": "tester@nyu.edu",
+                     "created_at": "2025-03-04T05:06:07Z"},
+                    {"rating": 1, "comment": "bad", "user_email": "other@nyu.edu",
+                     "created_at": "2025-03-05T00:00:00Z"},
+                ],
+            },
+            {"osm_id": 1501, "lat": 40.8, "lon": -73.9, "tags": {}, "reviews": []},
+        ]
+    )
+    assert display_module.backfill_display_fields() == 2
+    assert display_module.backfill_display_fields() == 0
+
+    stored = test_db["bathrooms"].find_one({"osm_id": 1500})
+    assert stored["display_name"] == "Main St"
+    assert stored["location_label"] == "5, Main St"
+    assert stored["reviews"][0]["created_at"] == datetime(2025, 3, 4, 5, 6, 7)
+    assert stored["review_summary"]["last_review_at"] == datetime(2025, 3, 5)
+    assert test_db["bathrooms"].find_one({"osm_id": 1501})["display_name"] == "Bathroom #1501"
+
+    login(app_client)
+    page = app_client.get("/my-reviews").get_data(as_text=True)
+    assert "Main St" in page and "Location: 5, Main St" in page
+    assert "Mar 04, 2025 05:06 UTC" in page
+    assert "bad" not in page
+
+    # stored dates still go out over the API as ISO strings
+    reviews = app_client.get("/api/my-reviews").get_json()["reviews"]
+    assert reviews[0]["created_at"] == "2025-03-04T05:06:07Z"
+
+
+def test_my_reviews_page_before_migration(app_client, test_db, monkeypatch):
+    monkeypatch.setattr(display_module, "bathrooms_collection", test_db["bathrooms"])
+    review = {"rating": 3, "user_email": "tester@nyu.edu", "created_at": "last spring"}
+    test_db["bathrooms"].insert_one(
+        {
+            "osm_id": 1502,
+            "lat": 40.7,
+            "lon": -73.9,
+            "tags": {"name": "Corner Cafe", "addr:street": "Bleecker St"},
+            "reviews": [review],
+        }
+    )
+    login(app_client)
+    page = app_client.get("/my-reviews").get_data(as_text=True)
+    assert "Corner Cafe" in page and "Location: Bleecker St" in page
+    assert "last spring" in page
+
+    # dates the migration can't read are kept as they were
+    assert display_module.backfill_display_fields() == 1
+    stored = test_db["bathrooms"].find_one({"osm_id": 1502})
+    assert stored["reviews"][0]["created_at"] == "last spring"
+    assert stored["display_name"] == "Corner Cafe"
+
+
+def test_writes_store_display_fields_and_dates(app_client, test_db):
+    login(app_client)
+    body = {"osm_id": 1510, "lat": 40.1, "lon": -73.1, "tags": {"name": "Kiosk"}}
+    assert app_client.post("/api/bathrooms/add", json=body).status_code == 201
+    resp = app_client.post("/api/bathrooms/1510/reviews", json={"rating": 5})
+    assert resp.get_json()["my_review"]["created_at"].endswith("Z")
+
+    doc = test_db["bathrooms"].find_one({"osm_id": 1510})
+    assert doc["display_name"] == "Kiosk"
+    assert doc["location_label"] == "40.1, -73.1"
+    assert isinstance(doc["reviews"][0]["created_at"], datetime)
+
+
+def test_queries_are_routed_to_regions(app_client, test_db, monkeypatch):
+    monkeypatch.setattr(regions_module, "bathrooms_collection", test_db["bathrooms"])
+    test_db["bathrooms"].insert_many(
+        [
+            {"osm_id": 1600, "lat": 40.73, "lon": -73.99, "average_rating": 3.0},
+            {"osm_id": 1601, "lat": 41.88, "lon": -87.63, "average_rating": 5.0},
+            {"osm_id": 1602, "lat": 0.5, "lon": 0.5, "average_rating": 4.0},
+        ]
+    )
+    assert regions_module.backfill_regions() == 3
+    regions = {d["osm_id"]: d["region"] for d in test_db["bathrooms"].find()}
+    assert regions == {1600: "nyc", 1601: "chicago", 1602: None}
+
+    resp = app_client.get("/api/bathrooms/recommendations?lat=40.74&lon=-73.99")
+    # Chicago's better-rated bathroom isn't in New York's rankings
+    assert [b["osm_id"] for b in resp.get_json()["top_rated"]] == [1602, 1600]
+
+    resp = app_client.post(
+        "/api/bathrooms/add", json={"osm_id": 1603, "lat": 41.9, "lon": -87.7, "force": True}
+    )
+    assert resp.status_code == 201
+    assert test_db["bathrooms"].find_one({"osm_id": 1603})["region"] == "chicago"
+    url = "/api/bathrooms?min_lat=41.8&max_lat=42&min_lon=-88&max_lon=-87.5"
+    assert [b["osm_id"] for b in app_client.get(url).get_json()["bathrooms"]] == [1601, 1603]
@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+from webapp.display import (
+    display_name,
+    format_timestamp,
+    isoformat,
+    location_label,
+    parse_timestamp,
+)
+
+
+def test_display_name_fallbacks():
+    assert display_name({"name": "Cafe", "addr:street": "Main St"}, 1) == "Cafe"
+    assert display_name({"addr:street": "Main St"}, 1) == "Main St"
+    assert display_name({"addr:neighbourhood": "SoHo"}, 1) == "SoHo"
+    assert display_name(None, 7) == "Bathroom #7"
+
+
+def test_location_label():
+    tags = {"addr:housenumber": "12", "addr:street": "Main St", "addr:city": "New York"}
+    assert location_label(tags, 40.1, -73.2) == "12, Main St, New York"
+    assert location_label({}, 40.123456, -73.98765) == "40.1235, -73.9877"
+    assert location_label({}, None, None) is None
+
+
+def test_timestamps():
+    assert parse_timestamp("2025-01-02T03:04:05Z") == datetime(2025, 1, 2, 3, 4, 5)
+    aware = datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert parse_timestamp(aware) == datetime(2025, 1, 2, 3, 4, 5)
+    assert parse_timestamp("yesterday") is None
+    assert parse_timestamp(None) is None
+    assert isoformat(datetime(2025, 1, 2, 3, 4, 5, 678900)) == "2025-01-02T03:04:05.678900Z"
+    assert isoformat(aware) == "2025-01-02T03:04:05Z"
+    assert format_timestamp(datetime(2025, 1, 2, 3, 4)) == "Jan 02, 2025 03:04 UTC"
+    assert format_timestamp("2025-01-02") == "2025-01-02"
+    assert format_timestamp(None) is None
@@ -0,0 +1,71 @@
+from webapp.duplicates import (
+    duplicate_clusters,
+    geocell,
+    name_similarity,
+    neighbor_cells,
+    rank_candidates,
+)
+
+
+def test_geocell_and_neighbors():
+    assert geocell(40.7305, -73.9905) == "40730:-73991"
+    cells = neighbor_cells(40.7305, -73.9905, 25)
+    assert len(cells) == 9 and geocell(40.7305, -73.9905) in cells
+    # a wider radius needs more rings, and more of them east-west
+    wide = neighbor_cells(40.7305, -73.9905, 200)
+    assert len(wide) == 5 * 7
+
+
+def test_points_near_a_cell_edge_are_found():
+    lat, lon = 40.7309999, -73.9900001
+    other = (lat + 0.0001, lon + 0.0001)  # in the next cell over on both axes
+    assert geocell(*other) != geocell(lat, lon)
+    assert geocell(*other) in neighbor_cells(lat, lon, 25)
+
+
+def test_name_similarity_ignores_generic_words():
+    assert name_similarity("Bryant Park Restroom", "bryant park public toilets") == 1.0
+    assert name_similarity("Starbucks", "Bryant Park") < 0.5
+    assert name_similarity("Restroom", "Cafe") is None
+    assert name_similarity(None, "Cafe") is None
+
+
+def test_rank_candidates():
+    doc = {"osm_id": 1, "lat": 40.7, "lon": -73.9, "tags": {"name": "Cafe Luna"}}
+    others = [
+        {"osm_id": 1, "lat": 40.7, "lon": -73.9},
+        {"osm_id": 2, "lat": 40.70010, "lon": -73.9, "tags": {"name": "cafe luna"}},
+        {"osm_id": 3, "lat": 40.70005, "lon": -73.9},
+        {"osm_id": 4, "lat": 40.70001, "lon": -73.9, "tags": {"name": "Pizza Hut"}},
+        {"osm_id": 5, "lat": 40.71, "lon": -73.9, "tags": {"name": "Cafe Luna"}},
+    ]
+    candidates = rank_candidates(doc, others, radius_m=25)
+    assert [c["osm_id"] for c in candidates] == [3, 2]
+    assert candidates[0]["name_similarity"] is None
+    assert candidates[1]["name_similarity"] == 1.0
+
+
+def test_duplicate_clusters_match_the_anchor_only():
+    docs = [
+        {"osm_id": 1, "lat": 40.70000, "lon": -73.9, "source": "user"},
+        {"osm_id": 2, "lat": 40.70015, "lon": -73.9, "tags": {"name": "Cafe"}},
+        {"osm_id": 3, "lat": 40.70030, "lon": -73.9, "source": "user"},
+        {"osm_id": 4, "lat": 40.80000, "lon": -73.9},
+        {"osm_id": 5, "lat": None, "lon": None},
+    ]
+    # 2 (OSM) anchors 1 and 3; 1 and 3 are 33 m apart and both match it
+    assert duplicate_clusters(docs, radius_m=20) == [[1, 2, 3]]
+    # without the anchor in the middle nothing chains
+    assert duplicate_clusters([docs[0], docs[2]], radius_m=20) == []
+
+
+def test_unnamed_osm_bathrooms_are_not_merged():
+    docs = [
+        {"osm_id": 1, "lat": 40.70000, "lon": -73.9},
+        {"osm_id": 2, "lat": 40.70010, "lon": -73.9},
+        {"osm_id": 3, "lat": 40.70020, "lon": -73.9, "tags": {"name": "Cafe"}},
+    ]
+    assert duplicate_clusters(docs, radius_m=25) == []
+    # a user submission without a name still folds into the OSM node
+    docs.append({"osm_id": 4, "lat": 40.70001, "lon": -73.9, "source": "user"})
+    assert duplicate_clusters(docs, radius_m=25) == [[1, 4]]
@@ -0,0 +1,222 @@
+import io
+import time
+from datetime import datetime, timedelta
+import pytest
+import webapp.changes as changes_module
+import webapp.enrichment as enrichment_module
+from webapp.enrichment import (
+    FAILED,
+    LEASED,
+    QUEUED,
+    GeocodeError,
+    LocalProvider,
+    nominatim_tags,
+)
+from webapp.ingest import ingest_ndjson
+from tests.test_backend import app_client, test_db  # noqa: F401
+
+NOW = datetime(2026, 1, 5, 12, 0)
+ADDRESS = {
+    "addr:housenumber": "70",
+    "addr:street": "Washington Square South",
+    "addr:city": "New York",
+}
+
+
+class FakeProvider:
+    def __init__(self, result=ADDRESS, error=None):
+        self.result = result
+        self.error = error
+        self.calls = []
+
+    def reverse(self, lat, lon):
+        self.calls.append((lat, lon))
+        if self.error:
+            raise self.error
+        return dict(self.result) if self.result else None
+
+
+@pytest.fixture
+def queue(test_db, monkeypatch):
+    queue = enrichment_module.enrichment_queue
+    monkeypatch.setattr(queue, "collection", test_db["enrichment_jobs"])
+    monkeypatch.setattr(queue, "autostart", False)
+    monkeypatch.setattr(enrichment_module, "bathrooms_collection", test_db["bathrooms"])
+    monkeypatch.setattr(changes_module, "changes_collection", test_db["changes"])
+    monkeypatch.setattr(changes_module, "counters_collection", test_db["counters"])
+    monkeypatch.setattr(queue, "provider", FakeProvider())
+    return queue
+
+
+def bathroom(osm_id, lat=40.7295, lon=-73.9965, tags=None):
+    return {"osm_id": osm_id, "lat": lat, "lon": lon, "tags": tags or {}}
+
+
+def test_nominatim_tags():
+    address = {"road": "Broadway", "city_district": "Manhattan", "postcode": "10012"}
+    assert nominatim_tags(address) == {
+        "addr:street": "Broadway",
+        "addr:city": "Manhattan",
+        "addr:postcode": "10012",
+    }
+    assert nominatim_tags({"town": "Hoboken", "city_district": "x"}) == {
+        "addr:city": "Hoboken"
+    }
+
+
+def test_enqueue_dedups_and_skips_addressed(queue, test_db):
+    jobs = test_db["enrichment_jobs"]
+    addressed = bathroom(2, tags={"addr:street": "Broadway", "addr:housenumber": "1"})
+    assert queue.enqueue_many([bathroom(1), addressed, bathroom(3, lat=None)], now=NOW) == 1
+    # queued again after moving: still one job, at the new coordinates
+    queue.enqueue_many([bathroom(1, lat=40.75)], now=NOW)
+    assert jobs.count_documents({}) == 1
+    job = jobs.find_one({"_id": 1})
+    assert (job["lat"], job["state"], job["attempts"]) == (40.75, QUEUED, 0)
+
+
+def test_worker_fills_address_and_derived_fields(app_client, queue, test_db):
+    doc = bathroom(10, tags={"name": "", "addr:city": "NYC"})
+    test_db["bathrooms"].insert_one({**doc, "display_name": "Bathroom #10"})
+    queue.enqueue(bathroom(10))
+
+    assert queue.drain() == 1
+    doc = test_db["bathrooms"].find_one({"osm_id": 10})
+    # tags it already had are kept
+    assert doc["tags"]["addr:city"] == "NYC"
+    assert doc["tags"]["addr:street"] == "Washington Square South"
+    assert doc["display_name"] == "Washington Square South"
+    assert doc["location_label"] == "70, Washington Square South, NYC"
+    assert doc["geocell"] and doc["region"] == "nyc"
+    assert test_db["changes"].find_one({"osm_id": 10})
+    assert test_db["enrichment_jobs"].count_documents({}) == 0
+    assert queue.drain() == 0
+
+
+def test_derived_fields_without_an_address(queue, test_db, monkeypatch):
+    monkeypatch.setattr(queue, "provider", FakeProvider(result=None))
+    # moved into NYC from somewhere else, with stale derived fields
+    test_db["bathrooms"].insert_one({**bathroom(15), "region": "sf", "geocell": "x"})
+    queue.enqueue(bathroom(15))
+
+    assert queue.drain() == 1
+    doc = test_db["bathrooms"].find_one({"osm_id": 15})
+    assert doc["region"] == "nyc" and doc["geocell"] != "x"
+    assert doc["display_name"] and doc["tags"] == {}
+    change = test_db["changes"].find_one({"osm_id": 15})
+    assert change
+
+    # nothing left to update: no write and no new change
+    queue.enqueue(bathroom(15))
+    assert queue.drain() == 1
+    assert test_db["changes"].find_one({"osm_id": 15})["seq"] == change["seq"]
+
+
+def test_failures_back_off_then_fail(queue, test_db, monkeypatch):
+    monkeypatch.setattr(queue, "provider", FakeProvider(error=GeocodeError("503")))
+    monkeypatch.setattr(queue, "max_attempts", 2)
+    test_db["bathrooms"].insert_one(bathroom(20))
+    queue.enqueue_many([bathroom(20)], now=NOW)
+    jobs = test_db["enrichment_jobs"]
+
+    assert queue.work_once(NOW)
+    job = jobs.find_one({"_id": 20})
+    assert (job["state"], job["attempts"], job["error"]) == (QUEUED, 1, "GeocodeError: 503")
+    assert job["run_after"] > NOW and "lease" not in job
+    # not due yet
+    assert not queue.work_once(NOW)
+
+    later = NOW + timedelta(hours=1)
+    assert queue.work_once(later)
+    assert jobs.find_one({"_id": 20})["state"] == FAILED
+    assert not queue.work_once(later + timedelta(days=1))
+
+
+def test_expired_lease_is_taken_over(queue, test_db):
+    test_db["bathrooms"].insert_one(bathroom(30))
+    queue.enqueue_many([bathroom(30)], now=NOW)
+    # a worker leases the job and dies
+    assert queue.lease(NOW)["state"] == LEASED
+    assert queue.lease(NOW) is None
+
+    expired = NOW + timedelta(seconds=queue.lease_seconds)
+    assert queue.work_once(expired)
+    assert test_db["bathrooms"].find_one({"osm_id": 30})["tags"] == ADDRESS
+
+
+def test_move_during_lookup_is_not_overwritten(queue, test_db):
+    test_db["bathrooms"].insert_one(bathroom(40))
+    queue.enqueue_many([bathroom(40)], now=NOW)
+    job = queue.lease(NOW)
+
+    # the bathroom moves while its old position is being geocoded
+    test_db["bathrooms"].update_one({"osm_id": 40}, {"$set": {"lat": 40.8}})
+    queue.enqueue_many([bathroom(40, lat=40.8)], now=NOW)
+    assert queue.enrich(job) is None
+    queue.complete(job)
+
+    requeued = test_db["enrichment_jobs"].find_one({"_id": 40})
+    assert requeued["state"] == QUEUED and requeued["lat"] == 40.8
+    assert queue.drain(now=NOW) == 1
+    assert queue.provider.calls[-1] == (40.8, -73.9965)
+    assert test_db["bathrooms"].find_one({"osm_id": 40})["tags"] == ADDRESS
+
+
+def test_app_starts_worker_for_old_jobs(app_client, queue, test_db, monkeypatch):
+    # queued by an earlier process, one of them waiting for a retry
+    test_db["bathrooms"].insert_many([bathroom(60), bathroom(61)])
+    queue.enqueue_many([bathroom(60), bathroom(61)], now=NOW)
+    test_db["enrichment_jobs"].update_one({"_id": 61}, {"$set": {"attempts": 1}})
+    monkeypatch.setattr(queue, "autostart", True)
+    monkeypatch.setattr(queue, "poll_seconds", 0.01)
+    try:
+        app_client.get("/api/bathrooms")
+        deadline = time.monotonic() + 5
+        jobs = test_db["enrichment_jobs"]
+        while jobs.count_documents({}) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        queue.stop(timeout=5)
+    assert test_db["enrichment_jobs"].count_documents({}) == 0
+    for osm_id in (60, 61):
+        assert test_db["bathrooms"].find_one({"osm_id": osm_id})["tags"] == ADDRESS
+
+
+def test_local_provider(tmp_path):
+    path = tmp_path / "addresses.csv"
+    path.write_text(
+        "LON,LAT,NUMBER,STREET,UNIT,CITY,REGION,POSTCODE\n"
+        "-73.99650,40.72950,70,Washington Square South,,New York,NY,10012\n"
+        "-73.98000,40.75000,1,Far Street,,New York,NY,10018\n"
+        "bad,row,,,,,,\n"
+    )
+    provider = LocalProvider(str(path))
+    assert len(provider.addresses) == 2
+    assert provider.reverse(40.7296, -73.9966) == {
+        "addr:housenumber": "70",
+        "addr:street": "Washington Square South",
+        "addr:city": "New York",
+        "addr:state": "NY",
+        "addr:postcode": "10012",
+    }
+    # nothing within LOCAL_MAX_DISTANCE_M
+    assert provider.reverse(40.70, -74.02) is None
+
+
+def test_add_and_ingest_enqueue(app_client, queue, test_db):
+    resp = app_client.post(
+        "/api/bathrooms/add", json={**bathroom(50), "tags": {"name": "Cafe"}, "force": True}
+    )
+    assert resp.status_code == 201
+    body = (
+        b'{"osm_id": 51, "lat": 40.73, "lon": -73.99}\n'
+        b'{"osm_id": 52, "lat": 40.73, "lon": -73.99, "tags": '
+        b'{"addr:street": "Broadway", "addr:housenumber": "2"}}\n'
+    )
+    assert ingest_ndjson(io.BytesIO(body))["accepted"] == 2
+    queued = sorted(job["_id"] for job in test_db["enrichment_jobs"].find())
+    assert queued == [50, 51]
+
+    assert queue.drain() == 2
+    doc = test_db["bathrooms"].find_one({"osm_id": 50})
+    assert doc["display_name"] == "Cafe" and doc["tags"]["addr:housenumber"] == "70"
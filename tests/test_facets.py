@@ -0,0 +1,56 @@
+from werkzeug.datastructures import MultiDict
+from webapp.facets import FacetIndex, mongo_facet_query, parse_facet_args
+
+ROWS = [
+    {"osm_id": 1, "lat": 40.70, "lon": -73.90, "tags": {"wheelchair": "yes", "fee": "no"}},
+    {"osm_id": 2, "lat": 40.71, "lon": -73.91, "tags": {"wheelchair": "no", "fee": "no"}},
+    {"osm_id": 3, "lat": 40.72, "lon": -73.92, "tags": {"wheelchair": "Yes", "fee": "yes"}},
+    {"osm_id": 4, "lat": 41.50, "lon": -73.90, "tags": {"wheelchair": "limited"}},
+]
+
+
+def test_parse_facet_args_is_repeatable():
+    args = MultiDict([("wheelchair", "yes"), ("wheelchair", "Limited"), ("fee", "no"), ("q", "x")])
+    assert parse_facet_args(args) == {"wheelchair": ["yes", "limited"], "fee": ["no"]}
+
+
+def test_mongo_query_matches_values_like_the_index():
+    wanted = mongo_facet_query({"fee": ["no", "unknown"]})["tags.fee"]["$in"]
+    assert None in wanted
+
+    def matches(value):
+        return any(p.match(value) for p in wanted if p is not None)
+
+    assert all(matches(v) for v in ("no", "No", " NO ", "", "  ", "Unknown"))
+    assert not any(matches(v) for v in ("yes", "nope", "no-ish"))
+
+
+def test_filter_is_and_across_or_within():
+    index = FacetIndex(ROWS)
+    bits = index.filter_bits({"wheelchair": ["yes", "limited"]})
+    assert sorted(index.ids_of(bits)) == [1, 3, 4]
+    bits = index.filter_bits({"wheelchair": ["yes", "limited"], "fee": ["no"]})
+    assert index.ids_of(bits) == [1]
+
+
+def test_bbox_and_counts():
+    index = FacetIndex(ROWS)
+    base = index.bbox_bits(40.6, 40.8, -74.0, -73.8)
+    assert sorted(index.ids_of(base)) == [1, 2, 3]
+
+    counts = index.counts(base, {"fee": ["no"]})
+    # the fee filter narrows other facets but not its own counts
+    assert counts["wheelchair"] == {"yes": 1, "no": 1}
+    assert counts["fee"] == {"no": 2, "yes": 1}
+    assert counts["unisex"] == {"unknown": 2}
+
+
+def test_many_rows_round_trip():
+    rows = [
+        {"osm_id": i, "lat": i * 0.001, "lon": 0.0, "tags": {"fee": "yes" if i % 3 else "no"}}
+        for i in range(1000)
+    ]
+    index = FacetIndex(rows)
+    free = index.ids_of(index.filter_bits({"fee": ["no"]}))
+    assert free == list(range(0, 1000, 3))
+    assert index.count(index.all) == 1000
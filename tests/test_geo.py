@@ -0,0 +1,46 @@
+import math
+import numpy as np
+from webapp.geo import PointIndex, bbox_around, haversine_m
+
+# Empire State Building and Times Square
+ESB = (40.748817, -73.985428)
+TSQ = (40.758000, -73.985500)
+
+
+def test_haversine_known_distance():
+    dist = haversine_m(*ESB, np.array([TSQ[0]]), np.array([TSQ[1]]))
+    assert math.isclose(dist[0], 1021, rel_tol=0.01)
+    assert haversine_m(*ESB, np.array([ESB[0]]), np.array([ESB[1]]))[0] == 0
+
+
+def test_bbox_around_contains_radius():
+    min_lat, max_lat, min_lon, max_lon = bbox_around(*ESB, 1000)
+    north = haversine_m(*ESB, np.array([max_lat]), np.array([ESB[1]]))[0]
+    east = haversine_m(*ESB, np.array([ESB[0]]), np.array([max_lon]))[0]
+    assert math.isclose(north, 1000, rel_tol=1e-3)
+    assert math.isclose(east, 1000, rel_tol=1e-3)
+
+
+def test_nearest_orders_by_true_distance():
+    # 0.01 deg of longitude is shorter than 0.01 deg of latitude at NYC,
+    # so planar squared degrees would call these two a tie.
+    index = PointIndex(["north", "east"], [ESB[0] + 0.01, ESB[0]], [ESB[1], ESB[1] + 0.01])
+    hits = index.nearest(*ESB, 2)
+    assert [osm_id for osm_id, _ in hits] == ["east", "north"]
+    assert hits[0][1] < hits[1][1]
+
+
+def test_radius_prunes_and_limits():
+    lats = [ESB[0] + 0.001 * i for i in range(50)]
+    index = PointIndex(list(range(50)), lats, [ESB[1]] * 50)
+
+    hits = index.nearest(*ESB, 100, radius_m=500)
+    assert [osm_id for osm_id, _ in hits] == list(range(5))
+    assert all(dist <= 500 for _, dist in hits)
+
+    assert [osm_id for osm_id, _ in index.nearest(*ESB, 3, radius_m=500)] == [0, 1, 2]
+
+
+def test_empty_index():
+    assert PointIndex([], [], []).nearest(*ESB, 5) == []
+    assert PointIndex.from_docs([{"osm_id": 1, "lat": None, "lon": 0}]).nearest(*ESB, 5) == []
@@ -0,0 +1,120 @@
+import io
+import pytest
+from gridfs import GridFSBucket
+import webapp.images as images_module
+from webapp.images import ImageUpload, UploadError, store_image
+from tests.test_asgi import run_async
+from tests.test_backend import app_client, login, test_db  # noqa: F401
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 1000  # ~256 KB, several chunks
+JPEG = b"\xff\xd8\xff\xe0" + b"jpeg" * 100
+
+
+@pytest.fixture
+def images(test_db, monkeypatch):  # noqa: F811
+    test_db["images.files"].delete_many({})
+    test_db["images.chunks"].delete_many({})
+    monkeypatch.setattr(images_module, "images_bucket", GridFSBucket(test_db, "images"))
+    monkeypatch.setattr(images_module, "image_files_collection", test_db["images.files"])
+    return test_db
+
+
+def test_store_image_streams_and_deduplicates(images):
+    first = store_image(io.BytesIO(PNG), "image/png", len(PNG), {"osm_id": 1})
+    assert first["length"] == len(PNG) and not first["duplicate"]
+    assert first["url"] == f"/api/images/{first['sha256']}"
+    assert images["images.chunks"].count_documents({}) == 4  # 64 KB chunks
+
+    again = store_image(io.BytesIO(PNG), "image/png; charset=binary")
+    assert again["duplicate"] and again["sha256"] == first["sha256"]
+    assert images["images.files"].count_documents({}) == 1
+    assert images["images.chunks"].count_documents({}) == 4
+
+    grid_out = images_module.open_image(first["sha256"])
+    assert grid_out.read() == PNG
+    assert images_module.image_type(grid_out) == "image/png"
+    assert images_module.open_image("0" * 64) is None
+
+
+def test_uploads_are_refused_early(images, monkeypatch):
+    with pytest.raises(UploadError) as exc:
+        ImageUpload("application/pdf")
+    assert exc.value.status == 415
+    with pytest.raises(UploadError) as exc:
+        ImageUpload("image/png", content_length=images_module.MAX_IMAGE_BYTES + 1)
+    assert exc.value.status == 413
+    with pytest.raises(UploadError) as exc:
+        store_image(io.BytesIO(JPEG), "image/png")
+    assert exc.value.status == 415
+    with pytest.raises(UploadError) as exc:
+        store_image(io.BytesIO(b""), "image/png")
+    assert exc.value.status == 400
+
+    # no declared length: cut off while streaming, and nothing is left behind
+    monkeypatch.setattr(images_module, "MAX_IMAGE_BYTES", 100_000)
+    with pytest.raises(UploadError) as exc:
+        store_image(io.BytesIO(PNG), "image/png")
+    assert exc.value.status == 413
+    assert images["images.files"].count_documents({}) == 0
+    assert images["images.chunks"].count_documents({}) == 0
+
+
+def test_small_writes_are_sniffed_once_enough_has_arrived(images):
+    upload = ImageUpload("image/jpeg")
+    for byte in JPEG[:20]:
+        upload.write(bytes([byte]))
+    upload.write(JPEG[20:])
+    assert upload.finish()["length"] == len(JPEG)
+
+
+def test_upload_endpoints(app_client, images):
+    images["bathrooms"].insert_one({"osm_id": 870, "lat": 40.7, "lon": -73.9, "images": []})
+    url = "/api/bathrooms/870/images"
+    assert app_client.post(url, data=PNG, content_type="image/png").status_code == 401
+
+    login(app_client)
+    resp = app_client.post(url, data=PNG, content_type="image/png")
+    assert resp.status_code == 201
+    image_url = resp.get_json()["images"][0]
+    resp = app_client.post(
+        url,
+        data={"image": (io.BytesIO(PNG), "photo.png", "image/png")},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 201
+    # the same bytes twice: one stored image, one reference
+    assert resp.get_json()["images"] == [image_url]
+    assert images["images.files"].count_documents({}) == 1
+
+    resp = app_client.post(url, data=b"%PDF-1.4", content_type="application/pdf")
+    assert resp.status_code == 415
+    resp = app_client.post(url, data={}, content_type="multipart/form-data")
+    assert resp.status_code == 400
+
+    resp = app_client.get(image_url)
+    assert resp.status_code == 200
+    assert resp.data == PNG
+    assert resp.mimetype == "image/png"
+    assert "immutable" in resp.headers["Cache-Control"]
+    etag = resp.headers["ETag"]
+    assert app_client.get(image_url, headers={"If-None-Match": etag}).status_code == 304
+    assert app_client.get("/api/images/" + "0" * 64).status_code == 404
+
+
+def test_async_upload_endpoints(app_client, images, monkeypatch):
+    images["bathrooms"].insert_one({"osm_id": 871, "lat": 40.7, "lon": -73.9, "images": []})
+
+    async def scenario(client):
+        async with client.session_transaction() as sess:
+            sess["user"] = {"email": "async@nyu.edu", "name": "Async"}
+        resp = await client.post(
+            "/api/bathrooms/871/images", data=JPEG, headers={"Content-Type": "image/jpeg"}
+        )
+        assert resp.status_code == 201
+        image_url = (await resp.get_json())["images"][0]
+        resp = await client.get(image_url)
+        return image_url, await resp.get_data()
+
+    image_url, body = run_async(monkeypatch, scenario)
+    assert body == JPEG
+    assert app_client.get(image_url).data == JPEG
@@ -0,0 +1,46 @@
+import io
+from webapp.ingest import ChunkLines, iter_lines, validate_record
+
+
+def test_validate_record():
+    fields, error = validate_record(
+        {"osm_id": 5, "lat": 40, "lon": -73.5, "tags": {"opening_hours": "24/7"}}
+    )
+    assert error is None
+    assert fields["lat"] == 40.0
+    assert fields["open_intervals"] == [{"s": 0, "e": 7 * 24 * 60}]
+
+    bad = [
+        [1, 2],
+        {"osm_id": "5", "lat": 1, "lon": 1},
+        {"osm_id": True, "lat": 1, "lon": 1},
+        {"osm_id": 5, "lat": 91, "lon": 1},
+        {"osm_id": 5, "lat": 1, "lon": float("nan")},
+        {"osm_id": 5, "lat": 1},
+        {"osm_id": 5, "lat": 1, "lon": 1, "tags": {"a": 1}},
+    ]
+    for record in bad:
+        fields, error = validate_record(record)
+        assert fields is None and error
+
+
+BODY = b'{"a": 1}\n' + b"x" * 50 + b"\n\n" + b'{"b": 2}'
+
+
+def test_iter_lines_caps_line_length():
+    lines = list(iter_lines(io.BytesIO(BODY), max_bytes=20))
+    assert lines == [(1, b'{"a": 1}\n'), (2, None), (3, b"\n"), (4, b'{"b": 2}')]
+
+
+def test_chunk_lines_matches_iter_lines():
+    for size in (1, 3, 7, 100):
+        splitter = ChunkLines(max_bytes=20)
+        out = []
+        for i in range(0, len(BODY), size):
+            out.extend(splitter.feed(BODY[i : i + size]))
+        out.extend(splitter.finish())
+        assert [n for n, _ in out] == [1, 2, 3, 4]
+        assert out[1] == (2, None)
+        assert [line.strip() if line else line for _, line in out] == [
+            b'{"a": 1}', None, b"", b'{"b": 2}'
+        ]
@@ -0,0 +1,63 @@
+from datetime import datetime
+import numpy as np
+import pytest
+from bson import ObjectId
+import webapp.json_provider as json_provider
+from webapp.app import app
+from webapp.routes.api import (
+    FULL_DEFAULTS,
+    LISTING_DEFAULTS,
+    serialize_bathroom,
+    serialize_listing,
+    wire_rows,
+)
+
+PAYLOAD = {
+    "at": datetime(2025, 1, 2, 3, 4, 5, 678000),
+    "id": ObjectId("65a1b2c3d4e5f60718293a4b"),
+    "distance_m": np.float64(12.5),
+    "name": "Café",
+}
+EXPECTED = {
+    "at": "2025-01-02T03:04:05.678000Z",
+    "id": "65a1b2c3d4e5f60718293a4b",
+    "distance_m": 12.5,
+    "name": "Café",
+}
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_provider_encodes_dates_and_object_ids(fast, monkeypatch):
+    if not fast:
+        monkeypatch.setattr(json_provider, "orjson", None)
+    with app.test_request_context():
+        resp = app.json.response(PAYLOAD)
+        assert resp.mimetype == "application/json"
+        assert app.json.loads(resp.get_data()) == EXPECTED
+        assert app.json.loads(app.json.dumps(PAYLOAD)) == EXPECTED
+
+
+def test_unknown_types_still_fail():
+    with pytest.raises(TypeError):
+        json_provider.dumps_bytes({"x": object()})
+
+
+def test_wire_rows_match_serializers():
+    docs = [
+        {"osm_id": 1, "lat": 40.0, "lon": -73.0},
+        {
+            "osm_id": 2,
+            "lat": 41.0,
+            "lon": -74.0,
+            "tags": {"name": "x"},
+            "rating_count": 3,
+            "average_rating": 4.0,
+            "reviews": [{"rating": 4}],
+            "images": ["a"],
+        },
+    ]
+    listings = [{k: d[k] for k in d if k not in ("reviews", "images")} for d in docs]
+    assert wire_rows(listings, LISTING_DEFAULTS) == [serialize_listing(d) for d in docs]
+    assert wire_rows([dict(d) for d in docs], FULL_DEFAULTS) == [
+        serialize_bathroom(d) for d in docs
+    ]
@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+from werkzeug.datastructures import MultiDict
+from webapp.opening_hours import (
+    MINUTES_PER_WEEK,
+    compile_opening_hours,
+    is_open,
+    minute_of_week,
+    parse_open_args,
+)
+
+MONDAY_9AM = 9 * 60
+SATURDAY_9AM = 5 * 24 * 60 + 9 * 60
+
+
+def spans(value):
+    return [(iv["s"], iv["e"]) for iv in compile_opening_hours(value)]
+
+
+def test_always_open():
+    assert spans("24/7") == [(0, MINUTES_PER_WEEK)]
+
+
+def test_weekday_ranges_and_lists():
+    intervals = compile_opening_hours("Mo-Fr 08:00-18:00; Sa,Su 10:00-16:00")
+    assert len(intervals) == 7
+    assert is_open(intervals, MONDAY_9AM)
+    assert not is_open(intervals, SATURDAY_9AM)
+    assert is_open(intervals, SATURDAY_9AM + 60)
+
+
+def test_later_rules_override_days():
+    intervals = compile_opening_hours("Mo-Fr 08:00-12:00,13:00-17:00; We off")
+    wednesday_9am = 2 * 24 * 60 + 9 * 60
+    assert not is_open(intervals, wednesday_9am)
+    assert not is_open(intervals, 12 * 60 + 30)  # Monday lunch break
+    assert is_open(intervals, MONDAY_9AM)
+
+
+def test_past_midnight_wraps_into_next_day_and_week():
+    assert spans("Su 23:00-01:00") == [(0, 60), (MINUTES_PER_WEEK - 60, MINUTES_PER_WEEK)]
+    assert spans("Fr-Mo 10:00-11:00")[0] == (600, 660)
+
+
+def test_times_without_days_apply_every_day():
+    assert len(spans("08:00-20:00")) == 7
+
+
+def test_holiday_rules_are_skipped():
+    assert spans("Mo-Fr 08:00-18:00; PH off") == spans("Mo-Fr 08:00-18:00")
+
+
+def test_unsupported_values_are_unknown():
+    for value in ("sunrise-sunset", "Jan-Mar Mo 08:00-10:00", "Mo 25:00-26:00", "", None, 5):
+        assert compile_opening_hours(value) is None
+    assert is_open(None, MONDAY_9AM) is None
+
+
+def test_minute_of_week_uses_local_time():
+    # 2025-01-06 is a Monday; 14:00 UTC is 09:00 in New York
+    moment = datetime(2025, 1, 6, 14, 0, tzinfo=timezone.utc)
+    assert minute_of_week(moment) == MONDAY_9AM
+    assert minute_of_week(datetime(2025, 1, 6, 9, 0)) == MONDAY_9AM
+
+
+def test_parse_open_args():
+    assert parse_open_args(MultiDict()) == (None, None)
+    assert parse_open_args(MultiDict({"open_at": "2025-01-06T09:00:00"})) == (MONDAY_9AM, None)
+    minute, error = parse_open_args(MultiDict({"open_at": "not a date"}))
+    assert minute is None and error
+    minute, error = parse_open_args(MultiDict({"open_now": "1"}))
+    assert 0 <= minute < MINUTES_PER_WEEK and error is None
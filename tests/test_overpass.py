@@ -0,0 +1,151 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote_plus
+import pytest
+import webapp.changes as changes_module
+import webapp.enrichment as enrichment_module
+import webapp.overpass as overpass_module
+from webapp.overpass import Checkpoint, OverpassError, fetch_tile, import_region, tiles
+from webapp.regions import Region
+from tests.test_backend import test_db  # noqa: F401
+
+REGION = Region("box", "Box", [(40.0, -74.0), (40.2, -74.0), (40.2, -73.8), (40.0, -73.8)])
+BBOX_RE = re.compile(r"\(([-\d.]+),([-\d.]+),([-\d.]+),([-\d.]+)\);")
+
+ELEMENTS = [
+    {"type": "node", "id": 1, "lat": 40.05, "lon": -73.95, "tags": {"name": "One"}},
+    {"type": "node", "id": 2, "lat": 40.15, "lon": -73.95, "tags": {}},
+    {"type": "node", "id": 3, "lat": 40.05, "lon": -73.85},
+    {"type": "way", "id": 4, "center": {"lat": 40.15, "lon": -73.85}, "tags": {"fee": "no"}},
+    {"type": "node", "id": 5, "lat": 41.0, "lon": -73.85},  # outside the region
+]
+
+
+class FakeOverpass(ThreadingHTTPServer):
+    """Answers Overpass-style queries from ELEMENTS, filtered to the bbox."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeOverpassHandler)
+        self.requests = []
+        self.failures = {}  # tile "s,w" -> responses to fail before answering
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api/interpreter"
+
+
+class FakeOverpassHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = unquote_plus(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        south, west, north, east = map(float, BBOX_RE.search(body).groups())
+        key = f"{south},{west}"
+        with self.server.lock:
+            self.server.requests.append(key)
+            failures = self.server.failures.get(key, 0)
+            if failures:
+                self.server.failures[key] = failures - 1
+        if failures:
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        def inside(el):
+            point = el.get("center", el)
+            return south <= point["lat"] <= north and west <= point["lon"] <= east
+
+        payload = json.dumps({"elements": [el for el in ELEMENTS if inside(el)]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def overpass(test_db, monkeypatch):  # noqa: F811
+    monkeypatch.setattr(overpass_module, "bathrooms_collection", test_db["bathrooms"])
+    monkeypatch.setattr(changes_module, "changes_collection", test_db["changes"])
+    monkeypatch.setattr(changes_module, "counters_collection", test_db["counters"])
+    # imports queue address lookups, which only run when a test drains them
+    queue = enrichment_module.enrichment_queue
+    monkeypatch.setattr(queue, "collection", test_db["enrichment_jobs"])
+    monkeypatch.setattr(queue, "autostart", False)
+    server = FakeOverpass()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_tiles_cover_the_bbox():
+    assert tiles((40.0, 40.2, -74.0, -73.85), 0.1) == [
+        (40.0, -74.0, 40.1, -73.9),
+        (40.0, -73.9, 40.1, -73.85),
+        (40.1, -74.0, 40.2, -73.9),
+        (40.1, -73.9, 40.2, -73.85),
+    ]
+
+
+def test_import_fetches_every_tile(overpass, test_db, tmp_path):
+    checkpoint = tmp_path / "box.checkpoint"
+    report = import_region(
+        REGION, overpass.url, str(checkpoint), tile_degrees=0.1, workers=3, backoff=0
+    )
+    assert report == {"tiles": 4, "skipped": 0, "fetched": 4, "changed": 4, "failed": []}
+    assert sorted(d["osm_id"] for d in test_db["bathrooms"].find()) == [1, 2, 3, 4]
+    way = test_db["bathrooms"].find_one({"osm_id": 4})
+    assert (way["lat"], way["lon"], way["tags"]) == (40.15, -73.85, {"fee": "no"})
+    assert test_db["changes"].count_documents({}) == 4
+    # none of them has an address yet
+    assert sorted(job["_id"] for job in test_db["enrichment_jobs"].find()) == [1, 2, 3, 4]
+    assert not checkpoint.exists()
+
+    # unchanged data: nothing to record the second time round
+    report = import_region(REGION, overpass.url, str(checkpoint), tile_degrees=0.1, backoff=0)
+    assert report["changed"] == 0
+
+
+def test_failed_tiles_are_retried(overpass, test_db):
+    overpass.failures = {"40.0,-74.0": 2}
+    report = import_region(REGION, overpass.url, tile_degrees=0.1, attempts=3, backoff=0)
+    assert report["failed"] == []
+    assert overpass.requests.count("40.0,-74.0") == 3
+
+
+def test_interrupted_import_resumes_from_checkpoint(overpass, test_db, tmp_path):
+    checkpoint = tmp_path / "box.checkpoint"
+    overpass.failures = {"40.1,-73.9": 10}
+    report = import_region(
+        REGION, overpass.url, str(checkpoint), tile_degrees=0.1, attempts=2, backoff=0
+    )
+    assert [f["tile"] for f in report["failed"]] == ["40.100000,-73.900000,40.200000,-73.800000"]
+    assert test_db["bathrooms"].count_documents({}) == 3
+    assert len(json.loads(checkpoint.read_text())["done"]) == 3
+
+    overpass.failures = {}
+    overpass.requests.clear()
+    report = import_region(REGION, overpass.url, str(checkpoint), tile_degrees=0.1, backoff=0)
+    assert (report["skipped"], report["fetched"], report["failed"]) == (3, 1, [])
+    assert overpass.requests == ["40.1,-73.9"]
+    assert test_db["bathrooms"].count_documents({}) == 4
+    assert not checkpoint.exists()
+
+
+def test_checkpoint_for_other_tiling_is_ignored(tmp_path):
+    path = str(tmp_path / "cp")
+    Checkpoint(path, "box", 0.1).mark("a")
+    assert Checkpoint(path, "box", 0.1).done == {"a"}
+    assert Checkpoint(path, "box", 0.05).done == set()
+    assert Checkpoint(path, "other", 0.1).done == set()
+
+
+def test_fetch_tile_gives_up(overpass):
+    overpass.failures = {"1.0,2.0": 5}
+    with pytest.raises(OverpassError, match="503"):
+        fetch_tile(overpass.url, "(1.0,2.0,3.0,4.0);", attempts=2, backoff=0)
@@ -0,0 +1,109 @@
+from types import SimpleNamespace
+import pytest
+import webapp.routes.admin as admin_module
+from webapp import profiling
+from tests.test_backend import app_client, login, test_db  # noqa: F401
+
+SECRET = "test-profile-secret"
+RECOMMENDATIONS = "/api/bathrooms/recommendations"
+
+
+@pytest.fixture
+def profiler(test_db, monkeypatch):
+    monkeypatch.setattr(profiling.profiler, "secret", SECRET)
+    monkeypatch.setattr(profiling.profiler, "admins", frozenset({"admin@nyu.edu"}))
+    monkeypatch.setattr(profiling.profiler, "collection", test_db["profiles"])
+    monkeypatch.setattr(admin_module, "profiles_collection", test_db["profiles"])
+    test_db["profiles"].delete_many({})
+    return profiling.profiler
+
+
+def test_profile_token():
+    token = profiling.profile_token(RECOMMENDATIONS, ttl=60, secret=SECRET, now=1000)
+    assert profiling.token_valid(token, RECOMMENDATIONS, SECRET, now=1059)
+    assert not profiling.token_valid(token, RECOMMENDATIONS, SECRET, now=1061)
+    assert not profiling.token_valid(token, "/my-reviews", SECRET, now=1000)
+    assert not profiling.token_valid(token, RECOMMENDATIONS, "other", now=1000)
+    assert not profiling.token_valid(token, RECOMMENDATIONS, "", now=1000)
+    assert not profiling.token_valid("1", RECOMMENDATIONS, SECRET, now=1000)
+    assert not profiling.token_valid("x.y", RECOMMENDATIONS, SECRET, now=1000)
+
+
+def test_command_timeline_only_records_profiled_requests():
+    def event(request_id, **extra):
+        return SimpleNamespace(
+            request_id=request_id,
+            command_name="find",
+            database_name="bathrooms",
+            command={"find": "bathrooms", "filter": {}},
+            duration_micros=1500,
+            **extra,
+        )
+
+    listener = profiling.command_timeline
+    listener.started(event(1))  # outside a profiled request: ignored
+    recording = profiling.Recording()
+    token = profiling._recording.set(recording)
+    try:
+        listener.started(event(2))
+        listener.started(event(3))
+        listener.succeeded(event(2))
+        listener.failed(event(3))
+        listener.succeeded(event(1))
+    finally:
+        profiling._recording.reset(token)
+    assert [(e["collection"], e["duration_ms"], e["ok"]) for e in recording.timeline] == [
+        ("bathrooms", 1.5, True),
+        ("bathrooms", 1.5, False),
+    ]
+
+
+def test_unprofiled_requests_store_nothing(app_client, profiler, test_db):
+    resp = app_client.get(f"{RECOMMENDATIONS}?lat=40.73&lon=-73.99")
+    assert resp.status_code == 200 and "X-Profile-Id" not in resp.headers
+    # a bad token, a token for another path, or "1" from a non-admin are ignored
+    for value in ("garbage", profiling.profile_token("/my-reviews", secret=SECRET), "1"):
+        resp = app_client.get(
+            f"{RECOMMENDATIONS}?lat=40.73&lon=-73.99", headers={"X-Profile": value}
+        )
+        assert resp.status_code == 200 and "X-Profile-Id" not in resp.headers
+    assert test_db["profiles"].count_documents({}) == 0
+
+
+def test_signed_header_profiles_one_request(app_client, profiler, test_db):
+    token = profiling.profile_token(RECOMMENDATIONS, secret=SECRET)
+    resp = app_client.get(
+        f"{RECOMMENDATIONS}?lat=40.73&lon=-73.99", headers={"X-Profile": token}
+    )
+    assert resp.status_code == 200
+    doc = test_db["profiles"].find_one()
+    assert str(doc["_id"]) == resp.headers["X-Profile-Id"]
+    assert doc["endpoint"] == "api.get_recommendations"
+    assert doc["trigger"] == "token" and doc["status"] == 200
+    assert doc["query_string"] == "lat=40.73&lon=-73.99"
+    assert isinstance(doc["timeline"], list)
+    assert doc["mongo"]["commands"] == len(doc["timeline"])
+    functions = [row["function"] for row in doc["functions"]]
+    assert any("get_recommendations" in name for name in functions)
+    # profiling ends with the request
+    assert "X-Profile-Id" not in app_client.get(f"{RECOMMENDATIONS}?lat=1&lon=1").headers
+
+
+def test_admin_profiles_pages_and_lists_them(app_client, profiler, test_db):
+    login(app_client, email="someone@nyu.edu")
+    assert app_client.get("/admin/profiles").status_code == 403
+    assert "X-Profile-Id" not in app_client.get("/my-reviews?_profile=1").headers
+
+    login(app_client, email="Admin@nyu.edu")
+    resp = app_client.get("/my-reviews?_profile=1")
+    assert resp.status_code == 200
+    profile_id = resp.headers["X-Profile-Id"]
+
+    listing = app_client.get("/admin/profiles").get_json()["profiles"]
+    assert [p["_id"] for p in listing] == [profile_id]
+    assert listing[0]["endpoint"] == "main.my_reviews_page"
+    assert "functions" not in listing[0] and "timeline" not in listing[0]
+
+    detail = app_client.get(f"/admin/profiles/{profile_id}").get_json()
+    assert detail["trigger"] == "admin" and detail["functions"]
+    assert app_client.get("/admin/profiles/nope").status_code == 404
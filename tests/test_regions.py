@@ -0,0 +1,68 @@
+import pytest
+from webapp.regions import (
+    REGIONS,
+    Region,
+    bbox_partition_query,
+    point_in_polygon,
+    point_partition_query,
+    region_for_point,
+    regions_for_bbox,
+    register,
+    timezone_for_bbox,
+    timezone_for_point,
+)
+
+SQUARE = [(0, 0), (0, 10), (10, 10), (10, 0)]
+
+
+def test_point_in_polygon():
+    assert point_in_polygon(5, 5, SQUARE)
+    assert not point_in_polygon(11, 5, SQUARE)
+    # concave: an L shape with the top-right quadrant cut out
+    ell = [(0, 0), (10, 0), (10, 5), (5, 5), (5, 10), (0, 10)]
+    assert point_in_polygon(2, 8, ell)
+    assert not point_in_polygon(8, 8, ell)
+
+
+@pytest.mark.parametrize(
+    "point, region",
+    [
+        ((40.7306, -73.9866), "nyc"),  # Manhattan
+        ((40.5795, -74.1502), "nyc"),  # Staten Island
+        ((40.7178, -74.0431), None),  # Jersey City
+        ((41.8781, -87.6298), "chicago"),
+        ((37.7749, -122.4194), "sf"),
+        ((0, 0), None),
+    ],
+)
+def test_region_for_point(point, region):
+    assert region_for_point(*point) == region
+
+
+def test_queries_touch_only_intersecting_partitions(monkeypatch):
+    monkeypatch.setitem(REGIONS, "square", Region("square", "Square", SQUARE))
+    assert regions_for_bbox((40.7, 40.8, -74.0, -73.9)) == ["nyc"]
+    assert bbox_partition_query((1, 2, 1, 2)) == {"region": {"$in": ["square", None]}}
+    assert bbox_partition_query((-50, -40, 50, 60)) == {"region": {"$in": [None]}}
+    assert point_partition_query(40.73, -73.99) == {"region": {"$in": ["nyc", None]}}
+    # nowhere near a region: nothing to narrow down to
+    assert point_partition_query(-45, 170) == {}
+
+
+def test_timezones():
+    assert timezone_for_point(41.8781, -87.6298) == "America/Chicago"
+    assert timezone_for_point(37.7749, -122.4194) == "America/Los_Angeles"
+    # just outside the NYC polygon, and nowhere near any region
+    assert timezone_for_point(40.7178, -74.0431) == "America/New_York"
+    assert timezone_for_point(0, 0) == "America/New_York"
+    assert timezone_for_bbox((37.7, 37.8, -122.5, -122.4)) == "America/Los_Angeles"
+    assert timezone_for_bbox((None, None, None, None)) == "America/New_York"
+
+
+def test_register():
+    region = Region("test-region", "Test", [(50, 50), (50, 51), (51, 51), (51, 50)])
+    try:
+        register(region)
+        assert region_for_point(50.5, 50.5) == "test-region"
+    finally:
+        REGIONS.pop("test-region")
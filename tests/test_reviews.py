@@ -0,0 +1,47 @@
+from webapp.reviews import (
+    SNIPPET_CHARS,
+    star_bucket,
+    summarize_reviews,
+    update_summary,
+)
+
+
+def review(rating, comment="", at=None):
+    return {"rating": rating, "comment": comment, "user_name": "u", "created_at": at}
+
+
+def test_star_bucket_rounds_and_clamps():
+    assert [star_bucket(r) for r in (0, 0.4, 0.5, 3.49, 4.5, 5, 7, -1)] == [0, 0, 1, 3, 5, 5, 5, 0]
+    assert star_bucket(None) == 0
+
+
+def test_summarize_reviews():
+    reviews = [review(5, "a", "t1"), review(3, "b", "t2"), review(3, "c", "t3"), review(1, "d", "t4")]
+    summary = summarize_reviews(reviews)
+    assert summary["histogram"] == [0, 1, 0, 2, 0, 1]
+    assert [r["comment"] for r in summary["recent"]] == ["d", "c", "b"]
+    assert summary["last_review_at"] == "t4"
+    assert summarize_reviews(None) == {"histogram": [0] * 6, "recent": [], "last_review_at": None}
+
+
+def test_snippets_are_truncated():
+    summary = summarize_reviews([review(4, "x" * (SNIPPET_CHARS * 2))])
+    assert len(summary["recent"][0]["comment"]) == SNIPPET_CHARS
+
+
+def test_update_summary_matches_rebuild():
+    reviews = [review(5, "a", "t1"), review(2, "b", "t2")]
+    summary = summarize_reviews(reviews)
+
+    edited = review(4, "b2", "t3")
+    reviews = [reviews[0], edited]
+    summary = update_summary(summary, reviews, added=edited, removed=review(2))
+    assert summary == summarize_reviews(reviews)
+
+    summary = update_summary(summary, reviews[1:], removed=reviews[0])
+    assert summary == summarize_reviews(reviews[1:])
+
+
+def test_update_summary_rebuilds_missing_summary():
+    reviews = [review(1), review(2)]
+    assert update_summary(None, reviews, added=reviews[-1]) == summarize_reviews(reviews)
@@ -0,0 +1,91 @@
+import os
+from webapp.routing import StreetGraph, WalkingEngine, load_engine, read_graph, read_osm_xml
+from webapp.routing import write_graph
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "small_graph.osm")
+
+# South bank street (lat 40.700) and north bank street (lat 40.702) are
+# joined only by a footbridge at the east end; the west motorway and the
+# private path do not count as walkable.
+START = (40.700, -74.000)
+ACROSS_THE_RIVER = {"osm_id": "A", "lat": 40.702, "lon": -74.000}
+DOWN_THE_BANK = {"osm_id": "B", "lat": 40.700, "lon": -73.994}
+BATHROOMS = [ACROSS_THE_RIVER, DOWN_THE_BANK]
+
+
+def load():
+    return WalkingEngine(StreetGraph(*read_osm_xml(FIXTURE)), landmarks=2)
+
+
+def test_reads_only_walkable_ways():
+    coords, ways = read_osm_xml(FIXTURE)
+    assert len(ways) == 3
+    assert [1, 11] not in ways
+    graph = StreetGraph(coords, ways)
+    assert len(graph) == 12
+
+
+def test_nearest_by_walking_time_not_distance():
+    engine = load()
+    engine.set_bathrooms([ACROSS_THE_RIVER, DOWN_THE_BANK])
+
+    hits = engine.nearest_bathrooms(*START, k=2)
+    assert [osm_id for osm_id, _ in hits] == ["B", "A"]
+    down_the_bank, across = (seconds for _, seconds in hits)
+    # ~506 m along the bank vs ~1.9 km via the bridge
+    assert 330 < down_the_bank < 390
+    assert 1300 < across < 1450
+
+
+def test_nearest_stops_at_k_and_respects_cutoff():
+    engine = load()
+    engine.set_bathrooms([ACROSS_THE_RIVER, DOWN_THE_BANK])
+    assert [osm_id for osm_id, _ in engine.nearest_bathrooms(*START, k=1)] == ["B"]
+    hits = engine.nearest_bathrooms(*START, k=2, max_seconds=600)
+    assert [osm_id for osm_id, _ in hits] == ["B"]
+
+
+def test_target_bound_never_overestimates():
+    engine = load()
+    engine.set_bathrooms([ACROSS_THE_RIVER, DOWN_THE_BANK])
+    graph = engine.graph
+    target_nodes = [graph.snap(b["lat"], b["lon"])[0] for b in BATHROOMS]
+    for u in range(len(graph)):
+        tree = graph.shortest_tree(u)
+        closest = min(tree[t] for t in target_nodes)
+        assert engine.target_bound(u) <= closest + 1e-6
+    # bathrooms on both banks: the bound is 0 at each and positive between them
+    assert engine.target_bound(target_nodes[0]) == 0
+    assert any(engine.target_bound(u) > 0 for u in range(len(graph)))
+
+
+def test_graph_file_round_trip(tmp_path):
+    engine = load()
+    path = str(tmp_path / "streets.graph")
+    write_graph(path, engine)
+    mapped = read_graph(path)
+    assert len(mapped.graph) == len(engine.graph)
+    trees = [list(t) for t in engine.landmark_trees]
+    assert [list(t) for t in mapped.landmark_trees] == trees
+
+    mapped.set_bathrooms([ACROSS_THE_RIVER, DOWN_THE_BANK])
+    engine.set_bathrooms([ACROSS_THE_RIVER, DOWN_THE_BANK])
+    assert mapped.nearest_bathrooms(*START, k=2) == engine.nearest_bathrooms(*START, k=2)
+
+    # the XML itself (or anything else) is not a graph file
+    assert load_engine(FIXTURE) is None
+    assert load_engine(str(tmp_path / "missing.graph")) is None
+    assert mapped.walking_seconds(*START, 40.702, -74.000) is not None
+
+
+def test_astar_with_landmarks_matches_dijkstra():
+    engine = load()
+    graph = engine.graph
+    source, _ = graph.snap(*START)
+    tree = graph.shortest_tree(source)
+    for target in range(len(graph)):
+        assert engine.lower_bound(source, target) <= tree[target] + 1e-6
+
+    seconds = engine.walking_seconds(*START, 40.702, -74.000)
+    target, _ = graph.snap(40.702, -74.000)
+    assert abs(seconds - tree[target]) < 1e-6
@@ -0,0 +1,136 @@
+import pytest
+import webapp.app as app_module
+import webapp.store as store_module
+from webapp import search
+from tests.test_backend import app_client, test_db  # noqa: F401
+
+LAT, LON = 40.7300, -73.9950
+# 0.001 degrees of latitude is about 111 m
+DOCS = [
+    {
+        "osm_id": 1,
+        "lat": LAT,
+        "lon": LON,
+        "tags": {"name": "Corner Deli"},
+        "average_rating": 2.0,
+        "rating_count": 10,
+        "favorite_count": 0,
+    },
+    {
+        "osm_id": 2,
+        "lat": LAT + 0.002,
+        "lon": LON,
+        "tags": {"name": "Starbucks Reserve"},
+        "average_rating": 4.8,
+        "rating_count": 40,
+        "favorite_count": 30,
+    },
+    {
+        "osm_id": 3,
+        "lat": LAT + 0.001,
+        "lon": LON,
+        "tags": {"name": "Starbucks"},
+        "average_rating": 5.0,
+        "rating_count": 1,
+        "favorite_count": 0,
+    },
+    {"osm_id": 4, "lat": LAT + 0.05, "lon": LON, "tags": {"name": "Starbucks"}},
+]
+
+
+def test_text_score():
+    words = search._words("starb")
+    assert search.text_score(search._words("bryant park"), "Bryant Park Restroom") == 1.0
+    assert search.text_score(words, "Starbucks Coffee") == pytest.approx(0.9)
+    assert search.text_score(words, "Pizza Hut") < search.MIN_TEXT_SCORE
+    assert search.text_score(words, None) == 0.0
+
+
+def test_rating_signal_needs_reviews_to_move():
+    prior = search.rating_signal(None, 0)
+    assert prior == search.rating_signal(5.0, 0)
+    one_five = search.rating_signal(5.0, 1)
+    many_high = search.rating_signal(4.8, 40)
+    assert prior < one_five < many_high <= 1
+    assert search.rating_signal(2.0, 10) < prior
+
+
+def test_parse_weights():
+    assert search.parse_weights("rating=2, text=0")["rating"] == 2.0
+    assert search.parse_weights("")["distance"] == search.DEFAULT_WEIGHTS["distance"]
+    for bad in ("speed=1", "rating=-1", "rating=x", "rating=nan"):
+        with pytest.raises(ValueError):
+            search.parse_weights(bad)
+
+
+def test_rank_blends_signals():
+    def ids(**kwargs):
+        return [doc["osm_id"] for doc, _, _ in search.rank(DOCS, LAT, LON, 10, **kwargs)]
+
+    distance_only = {"distance": 1, "rating": 0, "favorites": 0, "text": 0}
+    assert ids(weights=distance_only) == [1, 3, 2, 4]
+    # well reviewed and favorited beats closer; one 5-star review doesn't
+    assert ids()[0] == 2
+    # names that don't match are dropped; radius drops the far one
+    assert ids(q="starbucks", radius_m=1000) == [2, 3]
+    assert ids(q="starbucks")[-1] == 4
+
+
+def test_rank_top_k_matches_full_sort():
+    docs = [
+        dict(doc, osm_id=doc["osm_id"] * 100 + i, lat=doc["lat"] + i * 1e-4)
+        for doc in DOCS
+        for i in range(25)
+    ]
+    everything = search.rank(docs, LAT, LON, len(docs), q="star")
+    top = search.rank(docs, LAT, LON, 7, q="star")
+    assert [d["osm_id"] for d, _, _ in top] == [d["osm_id"] for d, _, _ in everything[:7]]
+    scores = [s for _, s, _ in everything]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_search_route(app_client, test_db):
+    test_db["bathrooms"].insert_many([dict(doc) for doc in DOCS])
+
+    resp = app_client.get(f"/api/bathrooms/search?lat={LAT}&lon={LON}&q=starbucks")
+    assert resp.status_code == 200
+    rows = resp.get_json()["bathrooms"]
+    assert [row["osm_id"] for row in rows] == [2, 3]
+    assert set(rows[0]) == {
+        "osm_id",
+        "lat",
+        "lon",
+        "tags",
+        "average_rating",
+        "rating_count",
+        "favorite_count",
+        "distance_m",
+        "score",
+    }
+    assert rows[0]["distance_m"] == pytest.approx(222.4, abs=0.5)
+    assert rows[0]["score"] > rows[1]["score"]
+
+    # weights are per request
+    resp = app_client.get(
+        f"/api/bathrooms/search?lat={LAT}&lon={LON}&q=starbucks&w_rating=0&w_favorites=0"
+    )
+    assert [row["osm_id"] for row in resp.get_json()["bathrooms"]] == [3, 2]
+
+    for query in ("lat=x&lon=1", "lat=1&lon=1&radius_m=0", "lat=1&lon=1&w_text=-1"):
+        assert app_client.get(f"/api/bathrooms/search?{query}").status_code == 400
+    resp = app_client.get(
+        f"/api/bathrooms/search?lat={LAT}&lon={LON}"
+        "&w_distance=0&w_rating=0&w_favorites=0&w_text=0"
+    )
+    assert resp.status_code == 400
+
+
+def test_search_from_read_model(app_client, test_db, monkeypatch):
+    test_db["bathrooms"].insert_many([dict(doc) for doc in DOCS])
+    url = f"/api/bathrooms/search?lat={LAT}&lon={LON}&radius_m=10000"
+    expected = app_client.get(url).get_json()
+
+    store = store_module.BathroomStore(enabled=True)
+    monkeypatch.setattr(store_module, "bathrooms_collection", test_db["bathrooms"])
+    monkeypatch.setattr(app_module.api, "read_model", store)
+    assert app_client.get(url).get_json() == expected
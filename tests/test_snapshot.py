@@ -0,0 +1,99 @@
+import math
+import webapp.snapshot as snapshot_module
+from webapp.snapshot import HEADER, MAGIC, Snapshot, warm_start, write_snapshot
+
+
+DOCS = [
+    {
+        "osm_id": 1,
+        "lat": 40.7128,
+        "lon": -74.006,
+        "tags": {"name": "City Hall", "wheelchair": "yes"},
+        "average_rating": 4.5,
+        "rating_count": 2,
+        "favorite_count": 3,
+        "open_intervals": [{"s": 480, "e": 1080}, {"s": 1920, "e": 2520}],
+    },
+    {
+        "osm_id": 9876543210,
+        "lat": 40.75,
+        "lon": -73.98,
+        "tags": {"name": "Bryant Park", "wheelchair": "yes", "fee": "no"},
+        "average_rating": None,
+        "rating_count": 0,
+        "open_intervals": [],
+    },
+    {"osm_id": 3, "lat": None, "lon": -73.9, "tags": {}},
+]
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "bathrooms.snap"
+    assert write_snapshot(path, DOCS, seq=42) == 2
+
+    snap = Snapshot(path)
+    assert snap.count == 2
+    assert snap.seq == 42
+    assert list(snap.osm_id) == [1, 9876543210]
+    assert snap.lat[0] == 40.7128
+    assert math.isnan(snap.average_rating[1])
+
+    first, second = list(snap.rows())
+    assert first["tags"] == {"name": "City Hall", "wheelchair": "yes"}
+    assert first["favorite_count"] == 3
+    assert first["open_intervals"] == DOCS[0]["open_intervals"]
+    assert second["average_rating"] is None
+    # never open is not the same as unknown
+    assert second["open_intervals"] == []
+    assert second["tags"]["fee"] == "no"
+
+
+def test_tag_strings_are_interned(tmp_path):
+    path = tmp_path / "bathrooms.snap"
+    write_snapshot(path, DOCS)
+    snap = Snapshot(path)
+    assert snap.strings.count("wheelchair") == 1
+    assert snap.strings.count("yes") == 1
+
+
+def test_empty_snapshot(tmp_path):
+    path = tmp_path / "empty.snap"
+    write_snapshot(path, [])
+    snap = Snapshot(path)
+    assert snap.count == 0
+    assert list(snap.rows()) == []
+
+
+def test_missing_hours_stay_unknown(tmp_path):
+    path = tmp_path / "bathrooms.snap"
+    write_snapshot(path, [{"osm_id": 5, "lat": 1.0, "lon": 2.0}])
+    assert Snapshot(path).row(0)["open_intervals"] is None
+
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / "junk.snap"
+    path.write_bytes(b"\0" * 64)
+    try:
+        Snapshot(path)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_ids_the_column_cant_hold_are_left_out(tmp_path):
+    path = tmp_path / "bathrooms.snap"
+    docs = [{**DOCS[0], "osm_id": "user-7"}, {**DOCS[0], "osm_id": True}, DOCS[1]]
+    assert write_snapshot(path, docs) == 1
+    assert list(Snapshot(path).osm_id) == [9876543210]
+
+
+def test_warm_start_ignores_unreadable_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_module, "loaded", None)
+    old = tmp_path / "v1.snap"
+    old.write_bytes(HEADER.pack(MAGIC, 1, 0, 0, 0.0, 0, 0, 0) + bytes(8))
+    truncated = tmp_path / "truncated.snap"
+    truncated.write_bytes(MAGIC)
+    assert warm_start(str(old)) is None
+    assert warm_start(str(truncated)) is None
+    assert snapshot_module.loaded is None
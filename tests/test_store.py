@@ -0,0 +1,65 @@
+from webapp.store import BathroomStore, Listing
+
+
+def make_store(rows):
+    store = BathroomStore(enabled=True)
+    store.loaded = True
+    for row in rows:
+        store.upsert(row)
+    return store
+
+
+ROWS = [
+    {"osm_id": 1, "lat": 40.70, "lon": -73.90, "tags": {"name": "Beta"}, "average_rating": 3.0, "rating_count": 4},
+    {"osm_id": 2, "lat": 40.71, "lon": -73.91, "tags": {"name": "alpha"}, "average_rating": 5.0, "rating_count": 1},
+    {"osm_id": 3, "lat": 40.72, "lon": -73.95, "tags": {}, "average_rating": None, "rating_count": 0},
+    {"osm_id": 4, "lat": 41.50, "lon": -73.90, "tags": {"name": "Far Away"}, "average_rating": 4.0, "rating_count": 9},
+]
+
+
+def ids(listings):
+    return [listing.osm_id for listing in listings]
+
+
+def test_listing_uses_slots():
+    listing = Listing(ROWS[0])
+    assert not hasattr(listing, "__dict__")
+    assert listing.to_dict()["tags"] == {"name": "Beta"}
+
+
+def test_bbox_query():
+    store = make_store(ROWS)
+    assert sorted(ids(store.query((40.69, 40.715, -73.92, -73.89)))) == [1, 2]
+    assert ids(store.query((40.0, 40.1, -74.0, -73.0))) == []
+
+
+def test_sorts_match_mongo_null_ordering():
+    store = make_store(ROWS)
+    assert ids(store.query(sort="rating")) == [2, 4, 1, 3]
+    assert ids(store.query(sort="reviews")) == [4, 1, 2, 3]
+    # Mongo compares bytes, and null sorts first
+    assert ids(store.query(sort="name")) == [3, 1, 4, 2]
+    assert ids(store.query(sort="rating", limit=2)) == [2, 4]
+
+
+def test_keyword_is_case_insensitive():
+    store = make_store(ROWS)
+    assert ids(store.query(keyword="ALPHA")) == [2]
+    # an invalid regex is matched literally instead of raising
+    assert ids(store.query(keyword="(")) == []
+
+
+def test_upsert_and_remove_invalidate_bbox_index():
+    store = make_store(ROWS)
+    bbox = (40.69, 40.715, -73.92, -73.89)
+    assert len(store.query(bbox)) == 2
+
+    store.upsert({"osm_id": 5, "lat": 40.705, "lon": -73.905})
+    store.remove(1)
+    assert sorted(ids(store.query(bbox))) == [2, 5]
+
+
+def test_upsert_is_ignored_until_loaded():
+    store = BathroomStore(enabled=True)
+    store.upsert(ROWS[0])
+    assert len(store) == 0
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+from webapp.stream import Publisher, Subscription, async_event_stream
+
+
+def make_doc(osm_id, lat=40.7, lon=-73.9, rating=None, count=0, favorites=0):
+    return {
+        "osm_id": osm_id,
+        "lat": lat,
+        "lon": lon,
+        "average_rating": rating,
+        "rating_count": count,
+        "favorite_count": favorites,
+    }
+
+
+def test_publish_filters_by_viewport():
+    pub = Publisher()
+    inside = pub.subscribe((40.0, 41.0, -74.5, -73.5))
+    outside = pub.subscribe((10.0, 11.0, 10.0, 11.0))
+    everything = pub.subscribe(None)
+
+    pub.publish(make_doc(1, rating=4.0, count=1))
+
+    assert [u["osm_id"] for u in inside.drain(0)[0]] == [1]
+    assert outside.drain(0)[0] == []
+    assert [u["osm_id"] for u in everything.drain(0)[0]] == [1]
+
+
+def test_updates_are_coalesced_per_bathroom():
+    pub = Publisher()
+    sub = pub.subscribe()
+
+    pub.publish(make_doc(1, rating=5.0, count=1))
+    pub.publish(make_doc(2, favorites=1))
+    pub.publish(make_doc(1, rating=4.0, count=2))
+
+    updates, overflowed = sub.drain(0)
+    assert not overflowed
+    assert len(updates) == 2
+    latest = next(u for u in updates if u["osm_id"] == 1)
+    assert latest["average_rating"] == 4.0
+    assert latest["rating_count"] == 2
+
+
+def test_slow_consumer_is_told_to_resync():
+    sub = Subscription(max_pending=2)
+    for osm_id in (1, 2, 3):
+        sub.offer({"osm_id": osm_id, "lat": 0, "lon": 0})
+
+    updates, overflowed = sub.drain(0)
+    assert overflowed
+    assert updates == []
+    assert sub.drain(0) == ([], False)
+
+
+def test_subscriber_cap():
+    pub = Publisher(max_subscribers=1)
+    first = pub.subscribe()
+    assert pub.subscribe() is None
+    pub.unsubscribe(first)
+    assert pub.subscribe() is not None
+
+
+def test_event_stream_frames():
+    async def scenario():
+        sub = Subscription()
+        frames = async_event_stream(sub, heartbeat=0)
+        assert (await anext(frames)).startswith("retry:")
+        assert await anext(frames) == ": keep-alive\n\n"
+
+        sub.offer({"osm_id": 7, "lat": 0, "lon": 0})
+        frame = await anext(frames)
+        assert frame.startswith("event: bathrooms\n")
+        assert '"osm_id": 7' in frame
+        await frames.aclose()
+        assert sub.closed
+
+    asyncio.run(scenario())
+
+
+def test_event_stream_wakes_on_offer_from_another_thread():
+    async def scenario():
+        sub = Subscription()
+        frames = async_event_stream(sub, heartbeat=60)
+        await anext(frames)
+        waiting = asyncio.ensure_future(anext(frames))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+
+        update = {"osm_id": 8, "lat": 0, "lon": 0}
+        offer = threading.Thread(target=sub.offer, args=(update,))
+        offer.start()
+        frame = await asyncio.wait_for(waiting, 1)
+        offer.join()
+        assert '"osm_id": 8' in frame
+        await frames.aclose()
+
+    asyncio.run(scenario())
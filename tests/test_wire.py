@@ -0,0 +1,74 @@
+import webapp.app as app_module
+import webapp.store as store_module
+from webapp.wire import MAP_TAGS, SCALE, compact_listings, expand
+from tests.test_backend import app_client, test_db  # noqa: F401
+
+DOCS = [
+    {
+        "osm_id": 4801,
+        "lat": 40.730123456,
+        "lon": -73.990512345,
+        "tags": {"name": "Cafe", "addr:street": "Broadway", "fee": "no"},
+        "average_rating": 4.333333,
+        "rating_count": 3,
+    },
+    {
+        "osm_id": 4802,
+        "lat": 40.7402,
+        "lon": -73.9801,
+        "tags": {"name": "Cafe", "fee": "no"},
+        "average_rating": None,
+        "rating_count": 0,
+    },
+    {"osm_id": 4803, "lat": 40.75, "lon": -73.97},
+]
+
+
+def test_compact_round_trip():
+    payload = compact_listings(DOCS)
+    # keys and values are interned once each
+    assert payload["strings"] == ["name", "Cafe", "addr:street", "Broadway"]
+    assert payload["tags"] == [[0, 1, 2, 3], [0, 1], []]
+    assert payload["lat"][0] == 4073012 and payload["scale"] == SCALE
+    assert payload["average_rating"] == [4.33, None, None]
+    assert payload["rating_count"] == [3, 0, 0]
+
+    rows = expand(payload)
+    assert [row["osm_id"] for row in rows] == [4801, 4802, 4803]
+    assert rows[0]["lat"] == 40.73012 and rows[0]["lon"] == -73.99051
+    assert rows[0]["tags"] == {"name": "Cafe", "addr:street": "Broadway"}
+    assert rows[2]["tags"] == {}
+
+    everything = expand(compact_listings(DOCS, tag_keys=None))
+    assert everything[1]["tags"] == {"name": "Cafe", "fee": "no"}
+    assert compact_listings([])["osm_id"] == []
+
+
+def test_compact_from_listings():
+    listings = [store_module.Listing(doc) for doc in DOCS]
+    assert compact_listings(listings) == compact_listings(DOCS)
+
+
+def test_compact_format_route(app_client, test_db, monkeypatch):
+    test_db["bathrooms"].insert_many([dict(doc) for doc in DOCS])
+
+    rows = app_client.get("/api/bathrooms").get_json()["bathrooms"]
+    resp = app_client.get("/api/bathrooms?format=compact")
+    assert resp.status_code == 200
+    payload = resp.get_json()
+    assert payload["format"] == "compact" and "seq" in payload
+    compact_rows = expand(payload)
+    assert [r["osm_id"] for r in compact_rows] == [r["osm_id"] for r in rows]
+    for full, compact in zip(rows, compact_rows):
+        assert abs(full["lat"] - compact["lat"]) < 1 / SCALE
+        assert compact["tags"] == {k: v for k, v in full["tags"].items() if k in MAP_TAGS}
+
+    everything = expand(app_client.get("/api/bathrooms?format=compact&tags=all").get_json())
+    assert everything[0]["tags"] == DOCS[0]["tags"]
+    assert app_client.get("/api/bathrooms?format=xml").status_code == 400
+
+    # same payload from the read model
+    monkeypatch.setattr(store_module, "bathrooms_collection", test_db["bathrooms"])
+    monkeypatch.setattr(app_module.api, "read_model", store_module.BathroomStore(enabled=True))
+    from_store = app_client.get("/api/bathrooms?format=compact").get_json()
+    assert expand(from_store) == compact_rows
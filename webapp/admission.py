@@ -0,0 +1,209 @@
+"""In-process admission control for the ``/api`` blueprint.
+
+Every API request draws from a token bucket for its client IP and, when
+logged in, one for the session email. Routes in ``EXPENSIVE_ENDPOINTS``
+(the map listing, full dumps, geo searches, aggregations, image bytes)
+draw from a separate, much smaller budget than cheap point reads, so
+panning the map can't starve detail popups and a scraper on
+``/bathrooms/full`` runs dry quickly. An empty bucket answers ``429`` with
+``Retry-After``.
+
+Independently of the buckets, the number of API requests in flight (each
+one is a unit of database work) is capped at ``MAX_IN_FLIGHT``. Past that
+the app sheds with ``503``; expensive routes are shed first, once
+``SHED_EXPENSIVE_AT`` of the cap is in use. The live stream is exempt as it
+has its own subscriber cap and holds a connection open by design.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import g, jsonify, request, session
+
+ENABLED = os.environ.get("ADMISSION_CONTROL", "1") != "0"
+MAX_IN_FLIGHT = int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", "32"))
+SHED_EXPENSIVE_AT = 0.75
+MAX_TRACKED_CLIENTS = 10000
+
+# (tokens per second, burst) for each (route class, client kind)
+BUDGETS = {
+    ("cheap", "user"): (10.0, 40),
+    ("cheap", "ip"): (30.0, 120),
+    # room for a few quick pans and the images of the popup they end on
+    ("expensive", "user"): (1.0, 10),
+    ("expensive", "ip"): (3.0, 30),
+}
+
+EXPENSIVE_ENDPOINTS = frozenset(
+    {
+        "api.get_bathrooms",
+        "api.get_bathrooms_full",
+        "api.bulk_ingest_bathrooms",
+        "api.get_bathroom_facets",
+        "api.get_nearby_bathrooms",
+        "api.get_walking_nearest",
+        "api.get_recommendations",
+        "api.search_bathrooms",
+        # streams GridFS chunks; repeat views are answered by the browser cache
+        "api.get_image",
+    }
+)
+EXEMPT_ENDPOINTS = frozenset({"api.stream_updates", "api.get_admission_stats"})
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def wait_time(self, cost=1.0):
+        """Seconds until ``cost`` tokens are available (0 if they are now)."""
+        missing = cost - self.tokens
+        return 0.0 if missing <= 0 else missing / self.rate
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        budgets=None,
+        max_in_flight=MAX_IN_FLIGHT,
+        enabled=ENABLED,
+        clock=time.monotonic,
+    ):
+        self.budgets = dict(BUDGETS if budgets is None else budgets)
+        self.max_in_flight = max_in_flight
+        self.enabled = enabled
+        self.clock = clock
+        self.in_flight = 0
+        self.counters = {
+            "admitted": 0,
+            "throttled_user": 0,
+            "throttled_ip": 0,
+            "shed": 0,
+        }
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def _bucket(self, route_class, kind, key, now):
+        bucket_key = (route_class, kind, key)
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            rate, burst = self.budgets[(route_class, kind)]
+            bucket = self._buckets[bucket_key] = TokenBucket(rate, burst, now)
+            if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                # the least recently seen client has long since refilled
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(bucket_key)
+        bucket.refill(now)
+        return bucket
+
+    def admit(self, route_class, ip, user=None):
+        """Returns ``None`` if admitted, else ``(status, reason, retry_after)``.
+
+        An admitted caller must call ``release()`` when its work is done.
+        """
+        with self._lock:
+            limit = self.max_in_flight
+            if route_class == "expensive":
+                limit = max(1, int(limit * SHED_EXPENSIVE_AT))
+            if self.in_flight >= limit:
+                self.counters["shed"] += 1
+                return 503, "shed", 1
+
+            now = self.clock()
+            clients = [("ip", ip)]
+            if user:
+                clients.append(("user", user))
+            buckets = [
+                (kind, self._bucket(route_class, kind, key, now)) for kind, key in clients
+            ]
+            # only charge once every bucket can pay, so a refusal costs nothing
+            for kind, bucket in buckets:
+                wait = bucket.wait_time()
+                if wait:
+                    self.counters["throttled_" + kind] += 1
+                    return 429, "throttled", max(1, math.ceil(wait))
+            for _, bucket in buckets:
+                bucket.tokens -= 1
+
+            self.in_flight += 1
+            self.counters["admitted"] += 1
+            return None
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+            self.in_flight = 0
+            for name in self.counters:
+                self.counters[name] = 0
+
+    def release(self):
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self.counters,
+                in_flight=self.in_flight,
+                max_in_flight=self.max_in_flight,
+                tracked_clients=len(self._buckets),
+            )
+
+    def check(self, endpoint, ip, user=None):
+        """Admission for one API request by Flask endpoint name.
+
+        Returns ``(admitted, refusal)``; ``refusal`` is a JSON body and
+        headers to answer with, or None.
+        """
+        if not self.enabled or endpoint in EXEMPT_ENDPOINTS:
+            return False, None
+        route_class = "expensive" if endpoint in EXPENSIVE_ENDPOINTS else "cheap"
+        refused = self.admit(route_class, ip or "unknown", user)
+        if refused is None:
+            return True, None
+        status, reason, retry_after = refused
+        message = "Too many requests" if status == 429 else "Server busy, try again shortly"
+        return False, (
+            {"error": message, "reason": reason},
+            status,
+            {"Retry-After": str(retry_after)},
+        )
+
+    def _before_request(self):
+        if request.blueprint != "api":
+            return None
+        user = (session.get("user") or {}).get("email")
+        admitted, refusal = self.check(request.endpoint, request.remote_addr, user)
+        if admitted:
+            g.admission_controller = self
+        if refusal is None:
+            return None
+        body, status, headers = refusal
+        return jsonify(body), status, headers
+
+    @staticmethod
+    def _teardown_request(exc=None):
+        controller = g.pop("admission_controller", None)
+        if controller is not None:
+            controller.release()
+
+
+admission = AdmissionController()
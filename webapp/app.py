@@ -1,9 +1,24 @@
 import os
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from webapp.admission import admission
+from webapp.db import profiles_collection
+from webapp.enrichment import enrichment_queue
+from webapp.json_provider import FastJSONMixin
 from webapp.extensions import oauth
-from webapp.routes import auth, api, main
+from webapp.profiling import profiler
+from webapp.routes import admin, auth, api, main
+from webapp.areas import load_areas
+from webapp.routing import load_engine
+from webapp.snapshot import warm_start
+
+
+class JSONProvider(FastJSONMixin, DefaultJSONProvider):
+    pass
+
 
 app = Flask(__name__)
+app.json = JSONProvider(app)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev_key")
 
 # OAuth Configuration
@@ -20,6 +35,21 @@ oauth.register(
 app.register_blueprint(auth.bp)
 app.register_blueprint(api.bp)
 app.register_blueprint(main.bp)
+app.register_blueprint(admin.bp)
+
+# Per-client token buckets and load shedding for /api
+admission.init_app(app)
+# Opt-in per-request profiles (signed X-Profile header or an admin session)
+profiler.init_app(app, profiles_collection)
+# Address enrichment worker, including jobs left queued by an earlier run
+enrichment_queue.init_app(app)
+
+# Optional columnar snapshot (see export_snapshot.py) to warm in-memory data
+warm_start(os.environ.get("SNAPSHOT_PATH"))
+# Optional prebuilt street graph (build_street_graph.py), mapped read-only
+load_engine(os.environ.get("STREET_GRAPH_PATH"))
+# Optional borough/neighborhood GeoJSON for region= queries
+load_areas(os.environ.get("AREAS_PATH"))
 
 if __name__ == "__main__":
     app.run(debug=True)
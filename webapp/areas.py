@@ -0,0 +1,179 @@
+"""Boroughs and neighborhoods loaded from a local GeoJSON file.
+
+``AREAS_PATH`` names a FeatureCollection of Polygons/MultiPolygons (e.g.
+the NYC borough or neighborhood tabulation area exports). Each feature is
+an Area keyed by a slug of its name. Bathrooms store the keys of every
+area containing them in ``areas``, assigned when they are written and by
+``assign_areas``, so ``GET /api/bathrooms?region=brooklyn`` is an indexed
+match. ``region=`` also takes a metro from webapp.regions, and
+``polygon=`` an ad-hoc ring, answered with a bbox query filtered by a
+PreparedPolygon.
+"""
+
+import json
+import os
+import re
+from functools import lru_cache
+from pymongo import UpdateOne
+from webapp.db import bathrooms_collection
+from webapp.polygons import PreparedPolygon
+from webapp.regions import REGIONS
+
+AREAS_PATH = os.environ.get("AREAS_PATH")
+# the first of these a feature has is its name
+NAME_PROPERTIES = ("name", "ntaname", "NTAName", "boro_name", "BoroName")
+MAX_POLYGON_VERTICES = 500
+
+AREAS = {}
+
+
+def slug(name):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+class Area:
+    def __init__(self, key, name, polygon):
+        self.key = key
+        self.name = name
+        self.polygon = polygon
+
+
+def geojson_rings(geometry):
+    """(lat, lon) rings of a Polygon or MultiPolygon (GeoJSON is lon, lat)."""
+    if geometry["type"] == "Polygon":
+        polygons = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        polygons = geometry["coordinates"]
+    else:
+        raise ValueError(f"Unsupported geometry type: {geometry['type']}")
+    return [[(lat, lon) for lon, lat, *_ in ring] for rings in polygons for ring in rings]
+
+
+def load_areas(path):
+    """Replace the loaded areas with those in ``path``; returns how many."""
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        collection = json.load(f)
+    areas = {}
+    for feature in collection.get("features", []):
+        props = feature.get("properties") or {}
+        name = next((props[k] for k in NAME_PROPERTIES if props.get(k)), None)
+        if not name or not feature.get("geometry"):
+            continue
+        key = slug(name)
+        areas[key] = Area(key, name, PreparedPolygon(geojson_rings(feature["geometry"])))
+    AREAS.clear()
+    AREAS.update(areas)
+    return len(AREAS)
+
+
+def areas_for_point(lat, lon):
+    return [key for key, area in AREAS.items() if area.polygon.contains(lat, lon)]
+
+
+def area_fields(lat, lon):
+    """``areas`` for a bathroom being written; nothing when no areas are loaded."""
+    return {"areas": areas_for_point(lat, lon)} if AREAS else {}
+
+
+def ensure_indexes():
+    bathrooms_collection.create_index("areas")
+
+
+def assign_areas():
+    """Recompute ``areas`` for every bathroom. Returns how many changed."""
+    docs = list(
+        bathrooms_collection.find(
+            {"lat": {"$ne": None}, "lon": {"$ne": None}}, {"lat": 1, "lon": 1, "areas": 1}
+        )
+    )
+    if not docs:
+        return 0
+    lats = [doc["lat"] for doc in docs]
+    lons = [doc["lon"] for doc in docs]
+    assigned = [[] for _ in docs]
+    # one vectorized pass per area rather than one lookup per bathroom
+    for key, area in AREAS.items():
+        for i, inside in enumerate(area.polygon.contains_many(lats, lons)):
+            if inside:
+                assigned[i].append(key)
+    ops = [
+        UpdateOne({"_id": doc["_id"]}, {"$set": {"areas": keys}})
+        for doc, keys in zip(docs, assigned)
+        if doc.get("areas") != keys
+    ]
+    if not ops:
+        return 0
+    return bathrooms_collection.bulk_write(ops, ordered=False).modified_count
+
+
+def parse_polygon(spec):
+    """PreparedPolygon from ``"lat,lon,lat,lon,..."``; raises ValueError."""
+    values = [float(v) for v in spec.split(",")]
+    if len(values) % 2 or not 3 <= len(values) // 2 <= MAX_POLYGON_VERTICES:
+        raise ValueError
+    ring = list(zip(values[::2], values[1::2]))
+    if not all(-90 <= lat <= 90 and -180 <= lon <= 180 for lat, lon in ring):
+        raise ValueError
+    return PreparedPolygon([ring])
+
+
+@lru_cache(maxsize=None)
+def _metro_polygon(region):
+    return PreparedPolygon([region.polygon])
+
+
+class AreaFilter:
+    """A ``region=`` or ``polygon=`` restriction on a listing query."""
+
+    def __init__(self, polygon, query=None):
+        self.polygon = polygon
+        # matches the stored assignment; None means filter with the polygon
+        self.query = query
+
+    def clip(self, bbox):
+        """``bbox`` (entries may be None) narrowed to the shape's box."""
+        min_lat, max_lat, min_lon, max_lon = self.polygon.bbox
+        if None in bbox:
+            return (min_lat, max_lat, min_lon, max_lon)
+        return (
+            max(bbox[0], min_lat),
+            min(bbox[1], max_lat),
+            max(bbox[2], min_lon),
+            min(bbox[3], max_lon),
+        )
+
+    def filter(self, rows):
+        """The rows (dicts or listings) inside the shape."""
+        rows = list(rows)
+        if not rows:
+            return rows
+        get = (lambda r, f: r[f]) if isinstance(rows[0], dict) else getattr
+        inside = self.polygon.contains_many(
+            [get(r, "lat") for r in rows], [get(r, "lon") for r in rows]
+        )
+        return [row for row, keep in zip(rows, inside) if keep]
+
+
+def parse_area_args(args):
+    """``(AreaFilter or None, error)`` from ``region=`` or ``polygon=``."""
+    name, spec = args.get("region"), args.get("polygon")
+    if name and spec:
+        return None, "Use either region or polygon, not both"
+    if spec:
+        try:
+            return AreaFilter(parse_polygon(spec)), None
+        except ValueError:
+            return None, (
+                "polygon must be lat,lon pairs for 3 to "
+                f"{MAX_POLYGON_VERTICES} vertices"
+            )
+    if not name:
+        return None, None
+    key = slug(name)
+    if key in REGIONS:
+        return AreaFilter(_metro_polygon(REGIONS[key]), {"region": key}), None
+    if key in AREAS:
+        return AreaFilter(AREAS[key].polygon, {"areas": key}), None
+    return None, f"Unknown region: {name}"
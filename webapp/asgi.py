@@ -0,0 +1,55 @@
+"""ASGI entry point serving the API with asyncio handlers.
+
+Run with an ASGI server, e.g. ``hypercorn webapp.asgi:app``. Only ``/api``
+is served here; pages and Google sign-in stay on the WSGI app
+(``webapp.app``), whose session cookie this app reads with the same
+``FLASK_SECRET_KEY``.
+"""
+
+import os
+from quart import Quart, g, request, session
+from quart.json.provider import DefaultJSONProvider
+from webapp.admission import admission
+from webapp.enrichment import enrichment_queue
+from webapp.json_provider import FastJSONMixin
+from webapp.routes import api_async
+from webapp.areas import load_areas
+from webapp.routing import load_engine
+from webapp.snapshot import warm_start
+
+
+class JSONProvider(FastJSONMixin, DefaultJSONProvider):
+    pass
+
+
+app = Quart(__name__)
+app.json = JSONProvider(app)
+app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev_key")
+
+app.register_blueprint(api_async.bp)
+# Address enrichment worker, including jobs left queued by an earlier run
+enrichment_queue.init_app(app)
+
+
+@app.before_request
+async def admit_request():
+    if request.blueprint != "api":
+        return None
+    user = (session.get("user") or {}).get("email")
+    admitted, refusal = admission.check(request.endpoint, request.remote_addr, user)
+    if admitted:
+        g.admitted = True
+    if refusal is not None:
+        return refusal
+
+
+@app.teardown_request
+async def release_request(exc=None):
+    if g.pop("admitted", False):
+        admission.release()
+
+
+warm_start(os.environ.get("SNAPSHOT_PATH"))
+load_engine(os.environ.get("STREET_GRAPH_PATH"))
+# Optional borough/neighborhood GeoJSON for region= queries
+load_areas(os.environ.get("AREAS_PATH"))
@@ -0,0 +1,172 @@
+"""Change sequence backing the delta sync endpoint.
+
+Every write to a bathroom records its ``osm_id`` in the ``changes``
+collection under a monotonically increasing sequence number. There is one
+row per bathroom (the latest change wins), so upserts compact themselves;
+only deletion tombstones need to be expired by ``compact_changes``.
+
+Taking sequence numbers and writing the rows are two steps, so a writer
+that took seq 5 can finish after one that took seq 6. A reader that saw 6
+first would move its cursor past 5 and never see it. Each reservation is
+therefore recorded as in flight on the counter, in the same update that
+takes the numbers, until its rows are written. Readers only see rows up
+to ``current_seq``, the last seq below the oldest reservation still in
+flight.
+"""
+
+import uuid
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from webapp.db import changes_collection, counters_collection
+
+SEQ_COUNTER_ID = "bathroom_changes"
+
+# Tombstones this many sequence numbers behind the head are dropped; clients
+# whose replica is older than that are told to reset.
+TOMBSTONE_RETENTION = 50000
+
+# A reservation still in flight after this long belongs to a writer that
+# died, and stops holding back the ones after it.
+IN_FLIGHT_TIMEOUT_SECONDS = 30
+
+
+def allocate_seqs(count=1, now=None):
+    """Reserve ``count`` consecutive sequence numbers.
+
+    Returns ``(first, token)``. The numbers, and every later one, stay
+    hidden from readers until ``release_seqs(token)``.
+    """
+    token = uuid.uuid4().hex
+    now = now or datetime.utcnow()
+    while True:
+        counter = counters_collection.find_one({"_id": SEQ_COUNTER_ID})
+        head = (counter or {}).get("seq", 0)
+        entry = {"first": head + 1, "at": now}
+        if counter is None:
+            try:
+                counters_collection.insert_one(
+                    {"_id": SEQ_COUNTER_ID, "seq": count, "in_flight": {token: entry}}
+                )
+                return head + 1, token
+            except DuplicateKeyError:
+                continue
+        # compare-and-swap, so ``first`` is known in the update that takes it
+        expected = head if "seq" in counter else {"$exists": False}
+        result = counters_collection.update_one(
+            {"_id": SEQ_COUNTER_ID, "seq": expected},
+            {"$set": {"seq": head + count, f"in_flight.{token}": entry}},
+        )
+        if result.matched_count:
+            return head + 1, token
+
+
+def release_seqs(token):
+    counters_collection.update_one(
+        {"_id": SEQ_COUNTER_ID}, {"$unset": {f"in_flight.{token}": ""}}
+    )
+
+
+def _abandoned_before(now):
+    return (now or datetime.utcnow()) - timedelta(seconds=IN_FLIGHT_TIMEOUT_SECONDS)
+
+
+def release_abandoned(now=None):
+    """Forget reservations whose writers timed out. Returns how many."""
+    counter = counters_collection.find_one({"_id": SEQ_COUNTER_ID}) or {}
+    cutoff = _abandoned_before(now)
+    stale = [
+        token
+        for token, entry in (counter.get("in_flight") or {}).items()
+        if entry["at"] <= cutoff
+    ]
+    if stale:
+        counters_collection.update_one(
+            {"_id": SEQ_COUNTER_ID},
+            {"$unset": {f"in_flight.{token}": "" for token in stale}},
+        )
+    return len(stale)
+
+
+def visible_seq(counter, now=None):
+    """Highest seq below every live reservation on ``counter``."""
+    cutoff = _abandoned_before(now)
+    live = [
+        entry["first"]
+        for entry in (counter.get("in_flight") or {}).values()
+        if entry["at"] > cutoff
+    ]
+    head = counter.get("seq", 0)
+    return min(head, min(live) - 1) if live else head
+
+
+def head_seq():
+    """The last sequence number handed out, committed or not."""
+    counter = counters_collection.find_one({"_id": SEQ_COUNTER_ID}) or {}
+    return counter.get("seq", 0)
+
+
+def current_seq(now=None):
+    """The last sequence number readers may see: every row up to it is written."""
+    counter = counters_collection.find_one({"_id": SEQ_COUNTER_ID}) or {}
+    return visible_seq(counter, now)
+
+
+def compacted_floor():
+    """Oldest ``since`` value that can still be answered with a diff."""
+    counter = counters_collection.find_one({"_id": SEQ_COUNTER_ID}) or {}
+    return counter.get("floor", 0)
+
+
+def record_change(osm_id, op="upsert"):
+    return record_changes([osm_id], op)
+
+
+def record_changes(osm_ids, op="upsert"):
+    """Stamp each bathroom with a fresh sequence number. Returns the last one."""
+    osm_ids = list(dict.fromkeys(osm_ids))
+    if not osm_ids:
+        return current_seq()
+
+    first, token = allocate_seqs(len(osm_ids))
+    now = datetime.utcnow()
+    try:
+        changes_collection.bulk_write(
+            [
+                UpdateOne(
+                    {"osm_id": osm_id},
+                    {"$set": {"seq": first + i, "op": op, "changed_at": now}},
+                    upsert=True,
+                )
+                for i, osm_id in enumerate(osm_ids)
+            ],
+            ordered=False,
+        )
+    finally:
+        release_seqs(token)
+    return first + len(osm_ids) - 1
+
+
+def changes_since(since, limit, now=None):
+    """Change rows after ``since``, up to ``current_seq``, in seq order."""
+    upto = current_seq(now)
+    cursor = (
+        changes_collection.find({"seq": {"$gt": since, "$lte": upto}}, {"_id": 0})
+        .sort("seq", 1)
+        .limit(limit)
+    )
+    return list(cursor)
+
+
+def compact_changes(retention=TOMBSTONE_RETENTION):
+    """Drop old tombstones and raise the floor below which clients must reset."""
+    release_abandoned()
+    horizon = head_seq() - retention
+    if horizon <= 0:
+        return 0
+
+    result = changes_collection.delete_many({"op": "delete", "seq": {"$lte": horizon}})
+    counters_collection.update_one(
+        {"_id": SEQ_COUNTER_ID}, {"$max": {"floor": horizon}}
+    )
+    return result.deleted_count
@@ -1,8 +1,14 @@
 import os
 from pymongo import MongoClient
+from webapp.profiling import command_listeners
 
 mongo_uri = os.environ.get("MONGO_URI")
-client = MongoClient(mongo_uri)
+client = MongoClient(mongo_uri, event_listeners=command_listeners())
 db = client["bathrooms"]
 bathrooms_collection = db["bathrooms"]
 users_collection = db["users"]
+changes_collection = db["changes"]
+counters_collection = db["counters"]
+profiles_collection = db["profiles"]
+enrichment_jobs_collection = db["enrichment_jobs"]
+merged_collection = db["merged_bathrooms"]
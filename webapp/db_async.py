@@ -0,0 +1,10 @@
+import os
+from pymongo import AsyncMongoClient
+
+# Same database as webapp.db, through pymongo's native asyncio client; used
+# by the ASGI app (webapp.asgi). Connections are opened lazily on first use.
+mongo_uri = os.environ.get("MONGO_URI")
+client = AsyncMongoClient(mongo_uri)
+db = client["bathrooms"]
+bathrooms_collection = db["bathrooms"]
+users_collection = db["users"]
@@ -0,0 +1,108 @@
+"""Display fields stored with the data instead of derived on every render.
+
+Bathrooms carry ``display_name`` and ``location_label``, recomputed by every
+write that touches ``tags`` (import, address updates, add, bulk ingest,
+merges). Review ``created_at`` is a native BSON date. Pages then read these
+fields straight out of a projection. ``backfill_display_fields`` migrates
+bathrooms written before either existed.
+"""
+
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from webapp.db import bathrooms_collection
+from webapp.reviews import summarize_reviews
+
+NAME_TAGS = ("name", "addr:street", "addr:neighbourhood")
+ADDRESS_TAGS = ("addr:housenumber", "addr:street", "addr:neighbourhood", "addr:city")
+DATE_FORMAT = "%b %d, %Y %H:%M UTC"
+
+
+def display_name(tags, osm_id):
+    tags = tags or {}
+    return next((tags[t] for t in NAME_TAGS if tags.get(t)), None) or f"Bathroom #{osm_id}"
+
+
+def location_label(tags, lat, lon):
+    """Readable location from address tags, else the rounded coordinates."""
+    tags = tags or {}
+    parts = [tags[t] for t in ADDRESS_TAGS if tags.get(t)]
+    if parts:
+        return ", ".join(parts)
+    if lat is not None and lon is not None:
+        return f"{round(lat, 4)}, {round(lon, 4)}"
+    return None
+
+
+def display_fields(tags, osm_id, lat, lon):
+    return {
+        "display_name": display_name(tags, osm_id),
+        "location_label": location_label(tags, lat, lon),
+    }
+
+
+def parse_timestamp(value):
+    """A naive UTC datetime from a stored date or an ISO string, else None."""
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, str) and value:
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def isoformat(dt):
+    """``created_at`` as the API has always sent it: ISO 8601 in UTC with a Z."""
+    return parse_timestamp(dt).isoformat() + "Z"
+
+
+def format_timestamp(value):
+    # strings are reviews the migration hasn't reached yet; shown as stored
+    return value.strftime(DATE_FORMAT) if isinstance(value, datetime) else value
+
+
+def _migrated_reviews(reviews):
+    changed = False
+    out = []
+    for review in reviews or []:
+        created_at = review.get("created_at")
+        parsed = parse_timestamp(created_at) if isinstance(created_at, str) else None
+        # legacy strings that don't parse are kept as text rather than lost
+        if parsed is not None:
+            review = dict(review, created_at=parsed)
+            changed = True
+        out.append(review)
+    return out, changed
+
+
+def backfill_display_fields():
+    """Store display fields and convert string review dates. Returns the count."""
+    projection = {
+        "osm_id": 1,
+        "lat": 1,
+        "lon": 1,
+        "tags": 1,
+        "reviews": 1,
+        "display_name": 1,
+        "location_label": 1,
+    }
+    ops = []
+    for doc in bathrooms_collection.find({}, projection):
+        fields = display_fields(
+            doc.get("tags"), doc.get("osm_id"), doc.get("lat"), doc.get("lon")
+        )
+        update = {k: v for k, v in fields.items() if doc.get(k) != v}
+        reviews, changed = _migrated_reviews(doc.get("reviews"))
+        if changed:
+            update["reviews"] = reviews
+            update["review_summary"] = summarize_reviews(reviews)
+        if update:
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+    if not ops:
+        return 0
+    return bathrooms_collection.bulk_write(ops, ordered=False).modified_count
@@ -0,0 +1,309 @@
+"""Near-duplicate bathrooms: insert-time candidates and a merge job.
+
+Bathrooms carry a ``geocell``, a fixed grid bucket of ``CELL_DEGREES``
+on a side. A proximity check reads only the cells around the point, so
+``/bathrooms/add`` can look for something within ``DUPLICATE_RADIUS_M``
+with one indexed query; the first check in a process backfills cells on
+older bathrooms. A nearby bathroom counts as a likely duplicate when the
+names are similar enough or either side has no name.
+``merge_duplicates`` applies the rule to the whole collection, except that
+two OSM bathrooms must both be named, and folds each group around its
+anchor into one bathroom, together with its reviews, images and
+favorites. Each merged id keeps a ``merged_into`` tombstone in the
+``merged_bathrooms`` collection. The Overpass import and bulk ingest skip
+those ids, so a re-import doesn't bring the duplicates back.
+"""
+
+import math
+import os
+import re
+from datetime import datetime
+from difflib import SequenceMatcher
+from pymongo import UpdateOne
+from webapp.db import bathrooms_collection, merged_collection, users_collection
+from webapp.changes import record_changes
+from webapp.display import display_fields, parse_timestamp
+from webapp.geo import METERS_PER_DEGREE_LAT, haversine_m
+from webapp.reviews import summarize_reviews
+
+CELL_DEGREES = 0.001  # about 111 m of latitude
+DUPLICATE_RADIUS_M = float(os.environ.get("DUPLICATE_RADIUS_M", "25"))
+NAME_SIMILARITY = float(os.environ.get("DUPLICATE_NAME_SIMILARITY", "0.6"))
+
+# words every other bathroom name has, which would make any two look alike
+GENERIC_WORDS = {"public", "restroom", "restrooms", "toilet", "toilets", "bathroom", "wc"}
+
+CANDIDATE_PROJECTION = {"_id": 0, "osm_id": 1, "lat": 1, "lon": 1, "tags.name": 1}
+
+
+def _cell_index(lat, lon):
+    return math.floor(lat / CELL_DEGREES), math.floor(lon / CELL_DEGREES)
+
+
+def geocell(lat, lon):
+    i, j = _cell_index(lat, lon)
+    return f"{i}:{j}"
+
+
+def neighbor_cells(lat, lon, radius_m):
+    """Every cell a point within ``radius_m`` of (lat, lon) could fall in."""
+    i, j = _cell_index(lat, lon)
+    cell_m = CELL_DEGREES * METERS_PER_DEGREE_LAT
+    rings_lat = math.ceil(radius_m / cell_m)
+    # cells shrink east-west away from the equator
+    rings_lon = math.ceil(radius_m / (cell_m * max(math.cos(math.radians(lat)), 0.01)))
+    return [
+        f"{i + di}:{j + dj}"
+        for di in range(-rings_lat, rings_lat + 1)
+        for dj in range(-rings_lon, rings_lon + 1)
+    ]
+
+
+def normalize_name(name):
+    words = re.findall(r"[a-z0-9]+", (name or "").lower())
+    return " ".join(w for w in words if w not in GENERIC_WORDS)
+
+
+def name_similarity(a, b):
+    """0..1 similarity of two names, or None when either is missing."""
+    a, b = normalize_name(a), normalize_name(b)
+    if not a or not b:
+        return None
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def candidate_query(lat, lon, radius_m=None):
+    radius_m = DUPLICATE_RADIUS_M if radius_m is None else radius_m
+    return {"geocell": {"$in": neighbor_cells(lat, lon, radius_m)}}
+
+
+def rank_candidates(doc, others, radius_m=None, min_similarity=None):
+    """Likely duplicates of ``doc`` among ``others``, closest first."""
+    radius_m = DUPLICATE_RADIUS_M if radius_m is None else radius_m
+    min_similarity = NAME_SIMILARITY if min_similarity is None else min_similarity
+    others = [o for o in others if o.get("osm_id") != doc.get("osm_id")]
+    if not others:
+        return []
+    distances = haversine_m(
+        doc["lat"], doc["lon"], [o["lat"] for o in others], [o["lon"] for o in others]
+    )
+    name = (doc.get("tags") or {}).get("name")
+    candidates = []
+    for other, distance in zip(others, distances):
+        if distance > radius_m:
+            continue
+        similarity = name_similarity(name, (other.get("tags") or {}).get("name"))
+        if similarity is not None and similarity < min_similarity:
+            continue
+        candidates.append(
+            {
+                "osm_id": other["osm_id"],
+                "lat": other["lat"],
+                "lon": other["lon"],
+                "name": (other.get("tags") or {}).get("name"),
+                "distance_m": round(float(distance), 1),
+                "name_similarity": None if similarity is None else round(similarity, 2),
+            }
+        )
+    candidates.sort(key=lambda c: c["distance_m"])
+    return candidates
+
+
+def find_duplicates(doc, radius_m=None):
+    """Existing bathrooms ``doc`` likely duplicates (one indexed query)."""
+    ensure_geocells()
+    query = candidate_query(doc["lat"], doc["lon"], radius_m)
+    others = list(bathrooms_collection.find(query, CANDIDATE_PROJECTION))
+    return rank_candidates(doc, others, radius_m)
+
+
+def ensure_indexes():
+    bathrooms_collection.create_index("geocell")
+
+
+def backfill_geocells():
+    """Set ``geocell`` on bathrooms that don't have one. Returns the count."""
+    query = {"geocell": {"$exists": False}, "lat": {"$ne": None}, "lon": {"$ne": None}}
+    ops = [
+        UpdateOne({"_id": doc["_id"]}, {"$set": {"geocell": geocell(doc["lat"], doc["lon"])}})
+        for doc in bathrooms_collection.find(query, {"lat": 1, "lon": 1})
+    ]
+    if not ops:
+        return 0
+    return bathrooms_collection.bulk_write(ops, ordered=False).modified_count
+
+
+_geocells = {"ready": False}
+
+
+def ensure_geocells():
+    """Index and backfill ``geocell`` once per process, before the first lookup.
+
+    Bathrooms written before geocells existed would otherwise be invisible
+    to the duplicate check until ``merge_duplicates.py`` or an import ran.
+    """
+    if not _geocells["ready"]:
+        ensure_indexes()
+        backfill_geocells()
+        _geocells["ready"] = True
+
+
+def _survivor_rank(doc):
+    # keep OSM data over user submissions, then the most reviewed, then the lowest id
+    return (doc.get("source") == "user", -(doc.get("rating_count") or 0), doc["osm_id"])
+
+
+def _survivor(docs):
+    return min(docs, key=_survivor_rank)
+
+
+def duplicate_clusters(docs, radius_m=None, min_similarity=None):
+    """Groups of ``osm_id``s that are likely the same bathroom.
+
+    Each group is an anchor (the bathroom a merge keeps) plus the bathrooms
+    that match the anchor itself, so matches don't chain past the radius.
+    Two OSM bathrooms only match when both are named: OSM maps distinct
+    unnamed toilets close together, and merging would tombstone real nodes.
+    """
+    docs = [d for d in docs if d.get("lat") is not None and d.get("lon") is not None]
+    by_cell = {}
+    for doc in docs:
+        by_cell.setdefault(geocell(doc["lat"], doc["lon"]), []).append(doc)
+    by_id = {doc["osm_id"]: doc for doc in docs}
+
+    radius = DUPLICATE_RADIUS_M if radius_m is None else radius_m
+    assigned = set()
+    clusters = []
+    for anchor in sorted(docs, key=_survivor_rank):
+        if anchor["osm_id"] in assigned:
+            continue
+        nearby = [
+            other
+            for cell in neighbor_cells(anchor["lat"], anchor["lon"], radius)
+            for other in by_cell.get(cell, ())
+            if other["osm_id"] not in assigned
+        ]
+        members = [
+            candidate["osm_id"]
+            for candidate in rank_candidates(anchor, nearby, radius, min_similarity)
+            if candidate["name_similarity"] is not None
+            or "user" in (anchor.get("source"), by_id[candidate["osm_id"]].get("source"))
+        ]
+        if members:
+            assigned.update([anchor["osm_id"], *members])
+            clusters.append(sorted([anchor["osm_id"], *members]))
+    return clusters
+
+
+def _review_time(review):
+    return parse_timestamp(review.get("created_at")) or datetime.min
+
+
+def merged_reviews(docs):
+    """All reviews, keeping each user's newest, oldest first."""
+    newest = {}
+    anonymous = []
+    for doc in docs:
+        for review in doc.get("reviews") or []:
+            email = review.get("user_email")
+            if not email:
+                anonymous.append(review)
+            elif email not in newest or _review_time(review) > _review_time(newest[email]):
+                newest[email] = review
+    reviews = anonymous + list(newest.values())
+    reviews.sort(key=_review_time)
+    return reviews
+
+
+def merged_ids(osm_ids):
+    """The ids among ``osm_ids`` that were merged into another bathroom."""
+    osm_ids = list(osm_ids)
+    if not osm_ids:
+        return set()
+    cursor = merged_collection.find({"_id": {"$in": osm_ids}}, {"_id": 1})
+    return {doc["_id"] for doc in cursor}
+
+
+def record_merge(survivor_id, losers):
+    now = datetime.utcnow()
+    # anything merged into a loser earlier now points at the survivor
+    merged_collection.update_many(
+        {"merged_into": {"$in": losers}}, {"$set": {"merged_into": survivor_id}}
+    )
+    merged_collection.bulk_write(
+        [
+            UpdateOne(
+                {"_id": osm_id},
+                {"$set": {"merged_into": survivor_id, "merged_at": now}},
+                upsert=True,
+            )
+            for osm_id in losers
+        ],
+        ordered=False,
+    )
+    merged_collection.delete_one({"_id": survivor_id})
+
+
+def merge_cluster(osm_ids):
+    """Fold the bathrooms in ``osm_ids`` into one. Returns ``(survivor, merged)``."""
+    docs = list(bathrooms_collection.find({"osm_id": {"$in": osm_ids}}))
+    if len(docs) < 2:
+        return None, []
+    survivor = _survivor(docs)
+    losers = [d["osm_id"] for d in docs if d["osm_id"] != survivor["osm_id"]]
+
+    tags = {}
+    images = []
+    for doc in sorted(docs, key=lambda d: d is survivor):
+        tags.update(doc.get("tags") or {})  # survivor's tags applied last win
+    for doc in docs:
+        images.extend(i for i in doc.get("images") or [] if i not in images)
+    reviews = merged_reviews(docs)
+    display = display_fields(tags, survivor["osm_id"], survivor["lat"], survivor["lon"])
+    ratings = [r["rating"] for r in reviews]
+
+    # favorites: point everyone at the survivor, then drop the old ids
+    users_collection.update_many(
+        {"favorites": {"$in": losers}}, {"$addToSet": {"favorites": survivor["osm_id"]}}
+    )
+    users_collection.update_many(
+        {"favorites": {"$in": losers}}, {"$pull": {"favorites": {"$in": losers}}}
+    )
+    favorite_count = users_collection.count_documents({"favorites": survivor["osm_id"]})
+
+    bathrooms_collection.update_one(
+        {"osm_id": survivor["osm_id"]},
+        {
+            "$set": {
+                "tags": tags,
+                **display,
+                "images": images,
+                "reviews": reviews,
+                "average_rating": sum(ratings) / len(ratings) if ratings else None,
+                "rating_count": len(reviews),
+                "review_summary": summarize_reviews(reviews),
+                "favorite_count": favorite_count,
+            }
+        },
+    )
+    # tombstones first, so an import running now can't recreate a loser
+    record_merge(survivor["osm_id"], losers)
+    bathrooms_collection.delete_many({"osm_id": {"$in": losers}})
+    record_changes(losers, op="delete")
+    record_changes([survivor["osm_id"]])
+    return survivor["osm_id"], losers
+
+
+def merge_duplicates(radius_m=None, min_similarity=None, dry_run=False):
+    """Find and merge near-duplicates collection-wide. Returns the clusters."""
+    projection = {**CANDIDATE_PROJECTION, "source": 1, "rating_count": 1}
+    docs = bathrooms_collection.find({}, projection)
+    clusters = duplicate_clusters(docs, radius_m, min_similarity)
+    if dry_run:
+        return [{"osm_ids": ids} for ids in clusters]
+    results = []
+    for ids in clusters:
+        survivor, merged = merge_cluster(ids)
+        if survivor is not None:
+            results.append({"survivor": survivor, "merged": merged})
+    return results
@@ -0,0 +1,430 @@
+"""Background enrichment of newly added and moved bathrooms.
+
+Writes that create a bathroom or set its coordinates (``/bathrooms/add``,
+bulk ingest, the Overpass import) hand it to ``enrichment_queue.enqueue``.
+Bathrooms that already have a street and house number are skipped; the
+rest get one job each in the ``enrichment_jobs`` collection, keyed by
+``osm_id``, so a bathroom written twice before the worker gets to it is
+enriched once, at its latest coordinates.
+
+A worker thread, started by the first request (``init_app``) or enqueue in
+each process, leases due jobs with ``find_one_and_update``, including jobs
+queued before a restart or waiting for a retry. A lease lasts
+``LEASE_SECONDS``, so the job of a process that died is picked up again. The worker reverse
+geocodes the bathroom through the configured provider, fills in the
+address tags it was missing, and updates the fields derived from them and
+from the coordinates (display name and label, region, areas, geocell).
+Failed lookups are retried with exponential backoff. After
+``MAX_ATTEMPTS`` tries, the job stays in the collection as ``failed`` with
+its last error.
+
+Providers (``GEOCODER``):
+- ``nominatim``: the default. The public Nominatim reverse API, with at
+  most one request per ``NOMINATIM_MIN_INTERVAL`` seconds.
+- ``local``: the nearest point of an OpenAddresses-style CSV at
+  ``GEOCODER_PATH``.
+- ``none``: derived fields only.
+
+``ENRICHMENT_WORKER=0`` leaves jobs to ``update_addresses.py`` instead.
+"""
+
+import csv
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+import requests
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from webapp.db import bathrooms_collection, enrichment_jobs_collection
+from webapp.areas import area_fields
+from webapp.changes import record_change
+from webapp.display import display_fields
+from webapp.duplicates import geocell
+from webapp.geo import PointIndex
+from webapp.regions import region_for_point
+from webapp.store import read_model
+from webapp.stream import publisher
+
+logger = logging.getLogger(__name__)
+
+GEOCODER = os.environ.get("GEOCODER", "nominatim")
+GEOCODER_PATH = os.environ.get("GEOCODER_PATH")
+WORKER_ENABLED = os.environ.get("ENRICHMENT_WORKER", "1") != "0"
+NOMINATIM_URL = os.environ.get(
+    "NOMINATIM_URL", "https://nominatim.openstreetmap.org/reverse"
+)
+NOMINATIM_MIN_INTERVAL = float(os.environ.get("NOMINATIM_MIN_INTERVAL", "1.1"))
+NOMINATIM_HEADERS = {
+    "User-Agent": "VivoNYC-BathroomFinder/1.0 (educational-project; contact: swe-student@nyu.edu)",
+    "Referer": "https://github.com/swe-students-fall2025/5-final-vivo",
+}
+LOCAL_MAX_DISTANCE_M = 75
+
+LEASE_SECONDS = 120
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+POLL_SECONDS = 30.0
+
+QUEUED, LEASED, FAILED = "queued", "leased", "failed"
+
+# the tags a bathroom needs before it is left alone
+REQUIRED_TAGS = ("addr:street", "addr:housenumber")
+
+# Nominatim address fields -> OSM tags; the first field present wins
+NOMINATIM_FIELDS = {
+    "addr:housenumber": ("house_number",),
+    "addr:street": ("road",),
+    # NYC often only returns city_district
+    "addr:city": ("city", "town", "village", "city_district"),
+    "addr:state": ("state",),
+    "addr:postcode": ("postcode",),
+}
+# OpenAddresses CSV columns -> OSM tags
+LOCAL_COLUMNS = {
+    "addr:housenumber": "number",
+    "addr:street": "street",
+    "addr:city": "city",
+    "addr:state": "region",
+    "addr:postcode": "postcode",
+}
+
+
+class GeocodeError(Exception):
+    """A lookup that failed and should be retried."""
+
+
+def needs_address(tags):
+    tags = tags or {}
+    return not all(tags.get(tag) for tag in REQUIRED_TAGS)
+
+
+def nominatim_tags(address):
+    """Address tags from a Nominatim ``address`` object."""
+    tags = {}
+    for tag, fields in NOMINATIM_FIELDS.items():
+        value = next((address[f] for f in fields if address.get(f)), None)
+        if value:
+            tags[tag] = value
+    return tags
+
+
+class NominatimProvider:
+    def __init__(self, url=NOMINATIM_URL, min_interval=NOMINATIM_MIN_INTERVAL):
+        self.url = url
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._last = 0.0
+
+    def reverse(self, lat, lon):
+        """Address tags for (lat, lon), or None; raises GeocodeError."""
+        with self._lock:
+            # the public instance allows one request per second
+            wait = self._last + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                response = requests.get(
+                    self.url,
+                    params={"format": "jsonv2", "lat": lat, "lon": lon},
+                    headers=NOMINATIM_HEADERS,
+                    timeout=30,
+                )
+                response.raise_for_status()
+                data = response.json()
+            except (requests.RequestException, ValueError) as exc:
+                raise GeocodeError(str(exc)) from exc
+            finally:
+                self._last = time.monotonic()
+        return nominatim_tags(data.get("address") or {}) or None
+
+
+class LocalProvider:
+    """Nearest address point of an OpenAddresses-style CSV.
+
+    Needs ``LON`` and ``LAT`` columns (any case) plus whichever of
+    ``NUMBER``, ``STREET``, ``CITY``, ``REGION`` and ``POSTCODE`` it has.
+    """
+
+    def __init__(self, path, max_distance_m=LOCAL_MAX_DISTANCE_M):
+        self.max_distance_m = max_distance_m
+        self.addresses, lats, lons = [], [], []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+                try:
+                    lat, lon = float(row["lat"]), float(row["lon"])
+                except (KeyError, ValueError):
+                    continue
+                tags = {tag: row[col] for tag, col in LOCAL_COLUMNS.items() if row.get(col)}
+                if tags:
+                    lats.append(lat)
+                    lons.append(lon)
+                    self.addresses.append(tags)
+        self.index = PointIndex(list(range(len(self.addresses))), lats, lons)
+
+    def reverse(self, lat, lon):
+        hits = self.index.nearest(lat, lon, 1, radius_m=self.max_distance_m)
+        return dict(self.addresses[hits[0][0]]) if hits else None
+
+
+class NoProvider:
+    def reverse(self, lat, lon):
+        return None
+
+
+def make_provider(name=GEOCODER, path=GEOCODER_PATH):
+    if name == "nominatim":
+        return NominatimProvider()
+    if name == "local":
+        if not path:
+            raise ValueError("GEOCODER=local needs GEOCODER_PATH")
+        return LocalProvider(path)
+    if name == "none":
+        return NoProvider()
+    raise ValueError(f"unknown GEOCODER {name!r}")
+
+
+def enriched_fields(osm_id, lat, lon, tags, added):
+    """``$set`` for a bathroom whose ``tags`` now include the ``added`` ones."""
+    return {
+        **{f"tags.{tag}": value for tag, value in added.items()},
+        **display_fields(tags, osm_id, lat, lon),
+        "geocell": geocell(lat, lon),
+        "region": region_for_point(lat, lon),
+        **area_fields(lat, lon),
+    }
+
+
+def field_value(doc, path):
+    """Value at a dotted ``$set`` path of ``doc`` (None when missing)."""
+    for key in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(key)
+    return doc
+
+
+def retry_delay(attempts):
+    return min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+
+
+class EnrichmentQueue:
+    def __init__(self, collection=None, provider=None, autostart=WORKER_ENABLED):
+        self.collection = collection
+        # built on first use: a local provider loads its whole CSV
+        self.provider = provider
+        self.autostart = autostart
+        self.max_attempts = MAX_ATTEMPTS
+        self.lease_seconds = LEASE_SECONDS
+        self.poll_seconds = POLL_SECONDS
+        self.indexed = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def ensure_indexes(self):
+        self.collection.create_index([("state", ASCENDING), ("run_after", ASCENDING)])
+        self.collection.create_index([("state", ASCENDING), ("lease_until", ASCENDING)])
+
+    def enqueue(self, doc):
+        return self.enqueue_many([doc])
+
+    def enqueue_many(self, docs, now=None):
+        """Queue the bathrooms among ``docs`` that lack an address.
+
+        Returns how many were queued.
+        """
+        now = now or datetime.utcnow()
+        ops = [
+            UpdateOne(
+                {"_id": doc["osm_id"]},
+                {
+                    # a newer write restarts the job and voids any lease on it
+                    "$set": {
+                        "lat": doc["lat"],
+                        "lon": doc["lon"],
+                        "state": QUEUED,
+                        "attempts": 0,
+                        "run_after": now,
+                        "enqueued_at": now,
+                    },
+                    "$unset": {"lease": "", "lease_until": "", "error": ""},
+                },
+                upsert=True,
+            )
+            for doc in docs
+            if doc.get("lat") is not None
+            and doc.get("lon") is not None
+            and needs_address(doc.get("tags"))
+        ]
+        if not ops:
+            return 0
+        if not self.indexed:
+            self.ensure_indexes()
+            self.indexed = True
+        self.collection.bulk_write(ops, ordered=False)
+        if self.autostart:
+            self.start()
+        self._wake.set()
+        return len(ops)
+
+    def lease(self, now=None):
+        """Claim the next due job, or None."""
+        now = now or datetime.utcnow()
+        return self.collection.find_one_and_update(
+            {
+                "$or": [
+                    {"state": QUEUED, "run_after": {"$lte": now}},
+                    # its worker died mid-job
+                    {"state": LEASED, "lease_until": {"$lte": now}},
+                ]
+            },
+            {
+                "$set": {
+                    "state": LEASED,
+                    "lease": uuid.uuid4().hex,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_after", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def _held(self, job):
+        return {"_id": job["_id"], "lease": job["lease"]}
+
+    def complete(self, job):
+        self.collection.delete_one(self._held(job))
+
+    def fail(self, job, error, now=None):
+        now = now or datetime.utcnow()
+        update = {"error": error}
+        if job["attempts"] >= self.max_attempts:
+            update["state"] = FAILED
+        else:
+            update["state"] = QUEUED
+            update["run_after"] = now + timedelta(seconds=retry_delay(job["attempts"]))
+        self.collection.update_one(
+            self._held(job), {"$set": update, "$unset": {"lease": "", "lease_until": ""}}
+        )
+
+    def enrich(self, job):
+        """Geocode the job's bathroom and write what was found.
+
+        Returns the updated bathroom, or None when nothing was written.
+        """
+        osm_id, lat, lon = job["_id"], job["lat"], job["lon"]
+        bathroom = bathrooms_collection.find_one(
+            {"osm_id": osm_id, "lat": lat, "lon": lon}, {"reviews": 0}
+        )
+        if bathroom is None:
+            # deleted, or moved by a write that had its own address
+            return None
+        if self.provider is None:
+            self.provider = make_provider()
+        tags = dict(bathroom.get("tags") or {})
+        found = self.provider.reverse(lat, lon) or {}
+        added = {tag: value for tag, value in found.items() if not tags.get(tag)}
+        tags.update(added)
+        # derived fields follow the coordinates even when no address was found
+        fields = {
+            field: value
+            for field, value in enriched_fields(osm_id, lat, lon, tags, added).items()
+            if field_value(bathroom, field) != value
+        }
+        if not fields:
+            return None
+        result = bathrooms_collection.update_one(
+            # the coordinates the address was looked up for
+            {"osm_id": osm_id, "lat": lat, "lon": lon},
+            {"$set": fields},
+        )
+        if not result.matched_count:
+            return None
+        record_change(osm_id)
+        updated = bathrooms_collection.find_one({"osm_id": osm_id})
+        publisher.publish(updated)
+        read_model.upsert(updated)
+        return updated
+
+    def work_once(self, now=None):
+        """Lease and run one job. Returns False when none was due."""
+        job = self.lease(now)
+        if job is None:
+            return False
+        if job["attempts"] > self.max_attempts:
+            self.fail(job, job.get("error") or "lease expired", now)
+            return True
+        try:
+            self.enrich(job)
+        except Exception as exc:
+            self.fail(job, f"{type(exc).__name__}: {exc}", now)
+        else:
+            self.complete(job)
+        return True
+
+    def drain(self, limit=None, now=None):
+        """Run due jobs until none are left (or ``limit``). Returns how many ran."""
+        done = 0
+        while (limit is None or done < limit) and self.work_once(now):
+            done += 1
+        return done
+
+    def counts(self):
+        return {
+            row["_id"]: row["count"]
+            for row in self.collection.aggregate(
+                [{"$group": {"_id": "$state", "count": {"$sum": 1}}}]
+            )
+        }
+
+    def init_app(self, app):
+        # Started on a request rather than at import: a thread started before
+        # a preforking server forks would not survive into the workers.
+        app.before_request(self._before_request)
+
+    def _before_request(self):
+        if self.autostart:
+            self.start()
+
+    def start(self):
+        """Run the worker thread, which also picks up jobs queued before it."""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="enrichment", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the worker thread once its current job is done."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            self._wake.set()
+            thread.join(timeout)
+            self._stopping.clear()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                busy = self.work_once()
+            except Exception:
+                logger.exception("enrichment worker")
+                busy = False
+            if not busy:
+                # woken early by an enqueue in this process
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+
+enrichment_queue = EnrichmentQueue(enrichment_jobs_collection)
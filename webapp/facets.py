@@ -0,0 +1,171 @@
+"""Bitmap indexes over OSM accessibility tags.
+
+Each bathroom gets a bit position in a fixed (latitude-sorted) ordering,
+and each facet value owns a Python int used as a bitset. Combining
+filters and counting facet values inside a viewport are then ANDs, ORs
+and popcounts instead of one Mongo query per facet. Without the read model,
+an index per region partition is kept until the change log moves on.
+"""
+
+import re
+import threading
+from bisect import bisect_left, bisect_right
+
+FACETS = ("wheelchair", "fee", "changing_table", "unisex", "access")
+UNKNOWN = "unknown"
+
+_popcount = getattr(int, "bit_count", lambda bits: bin(bits).count("1"))
+
+
+def facet_value(tags, facet):
+    value = (tags or {}).get(facet)
+    if value is None or not str(value).strip():
+        return UNKNOWN
+    return str(value).strip().lower()
+
+
+def parse_facet_args(args):
+    """``{facet: [values]}`` from repeatable query parameters like ``fee=no``."""
+    filters = {}
+    for facet in FACETS:
+        values = [v.strip().lower() for v in args.getlist(facet) if v.strip()]
+        if values:
+            filters[facet] = values
+    return filters
+
+
+def mongo_facet_query(filters):
+    """Equivalent Mongo filter, for when no in-memory index is available.
+
+    Tag values match the way ``facet_value`` reads them: case and
+    surrounding whitespace are ignored and blank values count as unknown.
+    """
+    query = {}
+    for facet, values in filters.items():
+        wanted = []
+        for value in values:
+            pattern = re.escape(value)
+            if value == UNKNOWN:
+                wanted.append(None)
+                pattern = f"(?:{pattern})?"
+            wanted.append(re.compile(rf"^\s*{pattern}\s*$", re.IGNORECASE))
+        query[f"tags.{facet}"] = {"$in": wanted}
+    return query
+
+
+class FacetIndex:
+    def __init__(self, rows):
+        """``rows`` are objects or dicts with ``osm_id``, ``lat``, ``lon``, ``tags``."""
+        def get(row, field):
+            return row.get(field) if isinstance(row, dict) else getattr(row, field)
+
+        rows = [r for r in rows if get(r, "lat") is not None and get(r, "lon") is not None]
+        rows.sort(key=lambda r: get(r, "lat"))
+        self.ids = [get(r, "osm_id") for r in rows]
+        self.lats = [get(r, "lat") for r in rows]
+        self.lons = [get(r, "lon") for r in rows]
+        self.all = (1 << len(rows)) - 1
+
+        positions = {facet: {} for facet in FACETS}
+        for pos, row in enumerate(rows):
+            tags = get(row, "tags") or {}
+            for facet in FACETS:
+                positions[facet].setdefault(facet_value(tags, facet), []).append(pos)
+        self.bits = {
+            facet: {value: self._from_positions(ps) for value, ps in values.items()}
+            for facet, values in positions.items()
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _from_positions(self, positions):
+        buf = bytearray((len(self.ids) + 7) // 8)
+        for pos in positions:
+            buf[pos >> 3] |= 1 << (pos & 7)
+        return int.from_bytes(buf, "little")
+
+    def bbox_bits(self, min_lat, max_lat, min_lon, max_lon):
+        lo = bisect_left(self.lats, min_lat)
+        hi = bisect_right(self.lats, max_lat)
+        lons = self.lons
+        return self._from_positions(
+            pos for pos in range(lo, hi) if min_lon <= lons[pos] <= max_lon
+        )
+
+    def facet_bits(self, facet, values):
+        """Bathrooms matching any of ``values`` for one facet."""
+        bits = 0
+        for value in values:
+            bits |= self.bits[facet].get(value, 0)
+        return bits
+
+    def filter_bits(self, filters, base=None, skip=None):
+        """AND across facets (OR within a facet), optionally ignoring ``skip``."""
+        bits = self.all if base is None else base
+        for facet, values in filters.items():
+            if facet != skip:
+                bits &= self.facet_bits(facet, values)
+        return bits
+
+    def counts(self, base, filters):
+        """Per-value counts within ``base``.
+
+        A facet's own filter is left out of its counts so the client can
+        show how many results each alternative value would give.
+        """
+        result = {}
+        for facet in FACETS:
+            scoped = self.filter_bits(filters, base, skip=facet)
+            result[facet] = {
+                value: count
+                for value, bits in self.bits[facet].items()
+                if (count := _popcount(scoped & bits))
+            }
+        return result
+
+    def count(self, bits):
+        return _popcount(bits)
+
+    def ids_of(self, bits):
+        ids = self.ids
+        data = bits.to_bytes((len(ids) + 7) // 8, "little")
+        out = []
+        for byte_index, byte in enumerate(data):
+            while byte:
+                low = byte & -byte
+                out.append(ids[(byte_index << 3) + low.bit_length() - 1])
+                byte ^= low
+        return out
+
+
+_cache = {"key": None, "index": None}
+_cache_lock = threading.Lock()
+
+
+def index_for_store(store):
+    """FacetIndex over the read model, rebuilt only when the store changes."""
+    key = (id(store), store.version)
+    with _cache_lock:
+        if _cache["key"] != key:
+            _cache["index"] = FacetIndex(store.listings())
+            _cache["key"] = key
+        return _cache["index"]
+
+
+_partitions = {}  # partition -> (seq, FacetIndex)
+
+
+def cached_partition_index(partition, seq):
+    """Index built for ``partition`` at change-log ``seq``, or None."""
+    with _cache_lock:
+        entry = _partitions.get(partition)
+    return entry[1] if entry is not None and entry[0] == seq else None
+
+
+def cache_partition_index(partition, seq, rows):
+    """Build and keep the index for ``partition`` as of ``seq``."""
+    index = FacetIndex(list(rows))
+    with _cache_lock:
+        _partitions[partition] = (seq, index)
+    return index
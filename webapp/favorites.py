@@ -0,0 +1,164 @@
+"""Write-behind buffer for bathroom ``favorite_count`` counters.
+
+Favoriting only touches the user's document on the request path. The
+bathrooms it touched are coalesced per ``osm_id`` here, and every
+``FLUSH_INTERVAL_SECONDS`` (and at interpreter exit) their counts are
+recounted from ``users.favorites`` and written in one unordered
+``bulk_write``.
+
+Each web worker keeps its own buffer, so a blind ``$inc`` from one worker
+would land on top of a recount that already included it and the counter
+would drift again. Writing recounted values instead makes a late flush
+harmless. Every recount takes a version from ``counters`` before it reads
+the users, and only replaces a count stamped with an older version, so two
+workers flushing the same bathroom can't leave the staler count behind.
+``reconcile_favorite_counts`` is the same recount over every bathroom.
+"""
+
+import atexit
+import os
+import threading
+from pymongo import ReturnDocument, UpdateOne
+from webapp.db import bathrooms_collection, counters_collection, users_collection
+from webapp.changes import record_changes
+from webapp.store import read_model
+from webapp.stream import publisher
+
+FLUSH_INTERVAL_SECONDS = float(os.environ.get("FAVORITE_FLUSH_INTERVAL", "2.0"))
+
+VERSION_COUNTER_ID = "favorite_counts"
+
+_index = {"ready": False}
+
+
+class FavoriteCounter:
+    def __init__(self, interval=FLUSH_INTERVAL_SECONDS):
+        self.interval = interval
+        self._deltas = {}
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, osm_id, delta):
+        with self._lock:
+            self._buffer(osm_id, delta)
+        if self.interval <= 0:
+            self.flush()
+
+    def _buffer(self, osm_id, delta):
+        # called with the lock held
+        total = self._deltas.get(osm_id, 0) + delta
+        if total:
+            self._deltas[osm_id] = total
+        else:
+            # +1 then -1 before a flush cancels out entirely
+            self._deltas.pop(osm_id, None)
+        if self.interval > 0 and self._timer is None:
+            self._timer = threading.Timer(self.interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def pending(self, osm_id):
+        with self._lock:
+            return self._deltas.get(osm_id, 0)
+
+    def flush(self):
+        """Recount the buffered bathrooms. Returns the number touched."""
+        with self._lock:
+            deltas = self._deltas
+            self._deltas = {}
+            self._timer = None
+        if not deltas:
+            return 0
+
+        osm_ids = list(deltas)
+        try:
+            version = _next_version()
+            counts = dict.fromkeys(osm_ids, 0)
+            counts.update(_count_favorites(osm_ids))
+            _store_counts(counts, version)
+        except Exception:
+            # Put the deltas back so the next flush retries them. Not through
+            # add(), which would flush again straight away with interval <= 0.
+            with self._lock:
+                for osm_id, delta in deltas.items():
+                    self._buffer(osm_id, delta)
+            raise
+
+        _announce(osm_ids)
+        return len(osm_ids)
+
+
+favorite_counter = FavoriteCounter()
+atexit.register(favorite_counter.flush)
+
+
+def _next_version():
+    counter = counters_collection.find_one_and_update(
+        {"_id": VERSION_COUNTER_ID},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return counter["version"]
+
+
+def _count_favorites(osm_ids=None):
+    """Map ``osm_id`` to the number of users with it in their favorites."""
+    pipeline = [
+        {"$unwind": "$favorites"},
+        {"$group": {"_id": "$favorites", "count": {"$sum": 1}}},
+    ]
+    if osm_ids is not None:
+        if not _index["ready"]:
+            users_collection.create_index("favorites")
+            _index["ready"] = True
+        match = {"$match": {"favorites": {"$in": osm_ids}}}
+        # before the unwind to use the index, after it to drop the other ids
+        pipeline = [match, pipeline[0], match, pipeline[1]]
+    return {row["_id"]: row["count"] for row in users_collection.aggregate(pipeline)}
+
+
+def _store_counts(counts, version):
+    """Write ``counts`` over any count recounted under an older version."""
+    if not counts:
+        return 0
+    result = bathrooms_collection.bulk_write(
+        [
+            UpdateOne(
+                {"osm_id": osm_id, "favorite_count_version": {"$not": {"$gte": version}}},
+                {"$set": {"favorite_count": count, "favorite_count_version": version}},
+            )
+            for osm_id, count in counts.items()
+        ],
+        ordered=False,
+    )
+    return result.modified_count
+
+
+def _announce(osm_ids):
+    record_changes(osm_ids)
+    for doc in bathrooms_collection.find({"osm_id": {"$in": osm_ids}}):
+        publisher.publish(doc)
+        read_model.upsert(doc)
+
+
+def reconcile_favorite_counts():
+    """Recount every ``favorite_count`` from ``users.favorites``.
+
+    Safe to run while the web workers are up: their later flushes recount
+    too, rather than adding to the corrected values. Returns the number of
+    bathroom documents that were corrected.
+    """
+    version = _next_version()
+    counts = _count_favorites()
+
+    wrong = {}
+    for doc in bathrooms_collection.find({}, {"osm_id": 1, "favorite_count": 1}):
+        count = counts.get(doc["osm_id"], 0)
+        if doc.get("favorite_count", 0) != count:
+            wrong[doc["osm_id"]] = count
+
+    fixed = _store_counts(wrong, version)
+    if wrong:
+        _announce(list(wrong))
+    return fixed
@@ -0,0 +1,115 @@
+"""Vectorized great-circle distance search over bathroom coordinates."""
+
+import math
+import threading
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_M / 180
+
+
+def bbox_around(lat, lon, radius_m):
+    """Lat/lon box that contains every point within ``radius_m`` of (lat, lon)."""
+    dlat = radius_m / METERS_PER_DEGREE_LAT
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    dlon = min(radius_m / (METERS_PER_DEGREE_LAT * cos_lat), 180.0)
+    return (lat - dlat, lat + dlat, lon - dlon, lon + dlon)
+
+
+def haversine_m(lat, lon, lats, lons):
+    """Distances in meters from (lat, lon) to each point of the given arrays."""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlmb = np.radians(lons) - math.radians(lon)
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class PointIndex:
+    """Coordinates in contiguous arrays sorted by latitude.
+
+    The latitude band of a query is found with a binary search, so only
+    points inside the bounding box are passed to ``haversine_m``.
+    """
+
+    def __init__(self, ids, lats, lons):
+        lats = np.asarray(lats, dtype=np.float64)
+        order = np.argsort(lats, kind="stable")
+        # ids stay Python objects: osm_id is not guaranteed to be an int
+        self.ids = [ids[i] for i in order]
+        self.lats = np.ascontiguousarray(lats[order])
+        self.lons = np.ascontiguousarray(np.asarray(lons, dtype=np.float64)[order])
+
+    @classmethod
+    def from_docs(cls, docs):
+        docs = [d for d in docs if d.get("lat") is not None and d.get("lon") is not None]
+        return cls(
+            [d["osm_id"] for d in docs],
+            [d["lat"] for d in docs],
+            [d["lon"] for d in docs],
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nearest(self, lat, lon, limit, radius_m=None, accept=None):
+        """Up to ``limit`` ``(osm_id, distance_m)`` pairs, closest first.
+
+        ``accept(osm_id)`` can veto candidates; it is only called in
+        distance order until ``limit`` have been accepted.
+        """
+        if limit <= 0 or not len(self.ids):
+            return []
+
+        if radius_m is None:
+            lats, lons = self.lats, self.lons
+            positions = np.arange(len(self.ids))
+        else:
+            min_lat, max_lat, min_lon, max_lon = bbox_around(lat, lon, radius_m)
+            lo = np.searchsorted(self.lats, min_lat, side="left")
+            hi = np.searchsorted(self.lats, max_lat, side="right")
+            lons = self.lons[lo:hi]
+            in_box = np.flatnonzero((lons >= min_lon) & (lons <= max_lon))
+            positions = in_box + lo
+            lats, lons = self.lats[positions], self.lons[positions]
+
+        dist = haversine_m(lat, lon, lats, lons)
+        if radius_m is not None:
+            keep = dist <= radius_m
+            dist, positions = dist[keep], positions[keep]
+
+        if accept is not None:
+            hits = []
+            for i in np.argsort(dist, kind="stable"):
+                osm_id = self.ids[positions[i]]
+                if accept(osm_id):
+                    hits.append((osm_id, float(dist[i])))
+                    if len(hits) == limit:
+                        break
+            return hits
+
+        if len(dist) > limit:
+            top = np.argpartition(dist, limit - 1)[:limit]
+            dist, positions = dist[top], positions[top]
+        order = np.argsort(dist, kind="stable")
+        return [(self.ids[positions[i]], float(dist[i])) for i in order]
+
+
+_cache = {"key": None, "index": None}
+_cache_lock = threading.Lock()
+
+
+def index_for_store(store):
+    """PointIndex over the read model, rebuilt only when the store changes."""
+    key = (id(store), store.version)
+    with _cache_lock:
+        if _cache["key"] != key:
+            listings = store.listings()
+            _cache["index"] = PointIndex(
+                [item.osm_id for item in listings],
+                [item.lat for item in listings],
+                [item.lon for item in listings],
+            )
+            _cache["key"] = key
+        return _cache["index"]
@@ -0,0 +1,165 @@
+"""Streamed image uploads, stored once per content hash in GridFS.
+
+``POST /api/bathrooms/<id>/images`` takes the image as a raw body
+(``Content-Type: image/...``) or as the ``image`` part of a multipart form.
+The declared size and type are checked before anything is read, the
+first bytes are sniffed to confirm the type, and the body is then copied
+to GridFS ``CHUNK_SIZE`` bytes at a time while its SHA-256 is computed, so
+an upload never has to fit in memory. An image that is already stored
+(same hash) is not kept twice; bathrooms reference images by URL,
+``/api/images/<sha256>``.
+"""
+
+import hashlib
+import os
+from gridfs import GridFSBucket
+from webapp.db import db
+
+MAX_IMAGE_BYTES = int(os.environ.get("MAX_IMAGE_BYTES", 5 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+# room for multipart boundaries and part headers around the image itself
+MULTIPART_OVERHEAD = 16 * 1024
+SNIFF_BYTES = 12
+TOO_LARGE = f"Image is larger than {MAX_IMAGE_BYTES} bytes"
+
+IMAGE_TYPES = {
+    "image/jpeg": lambda head: head.startswith(b"\xff\xd8\xff"),
+    "image/png": lambda head: head.startswith(b"\x89PNG\r\n\x1a\n"),
+    "image/gif": lambda head: head[:6] in (b"GIF87a", b"GIF89a"),
+    "image/webp": lambda head: head[:4] == b"RIFF" and head[8:12] == b"WEBP",
+}
+
+images_bucket = GridFSBucket(db, bucket_name="images")
+image_files_collection = db["images.files"]
+
+
+class UploadError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def image_url(sha256):
+    return f"/api/images/{sha256}"
+
+
+def upload_limit(mimetype):
+    """Largest request body worth reading for an upload of this kind."""
+    if mimetype == "multipart/form-data":
+        return MAX_IMAGE_BYTES + MULTIPART_OVERHEAD
+    return MAX_IMAGE_BYTES
+
+
+def ensure_indexes():
+    image_files_collection.create_index("sha256")
+
+
+class ImageUpload:
+    """One upload, fed in chunks with ``write`` and completed with ``finish``.
+
+    Raises UploadError (413 or 415) as soon as the upload can be refused;
+    whatever was already written to GridFS is discarded.
+    """
+
+    def __init__(self, content_type, content_length=None, metadata=None):
+        content_type = (content_type or "").split(";")[0].strip().lower()
+        if content_type not in IMAGE_TYPES:
+            raise UploadError(f"Unsupported image type: {content_type or 'none'}", 415)
+        if content_length is not None and content_length > MAX_IMAGE_BYTES:
+            raise UploadError(TOO_LARGE, 413)
+        self.content_type = content_type
+        self.metadata = metadata or {}
+        self.hash = hashlib.sha256()
+        self.length = 0
+        self.head = b""
+        self.grid_in = None
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        self.length += len(chunk)
+        if self.length > MAX_IMAGE_BYTES:
+            self.abort()
+            raise UploadError(TOO_LARGE, 413)
+        self.hash.update(chunk)
+        if self.grid_in is None:
+            # hold the first few bytes until the type can be checked
+            self.head += chunk
+            if len(self.head) < SNIFF_BYTES:
+                return
+            self._open()
+            chunk, self.head = self.head, b""
+        self.grid_in.write(chunk)
+
+    def _open(self):
+        if not IMAGE_TYPES[self.content_type](self.head):
+            raise UploadError(f"Body is not a valid {self.content_type} image", 415)
+        self.grid_in = images_bucket.open_upload_stream(
+            self.content_type,
+            chunk_size_bytes=CHUNK_SIZE,
+            metadata={**self.metadata, "content_type": self.content_type},
+        )
+
+    def finish(self):
+        """Store the image (or reuse an identical one). Returns its description."""
+        if self.grid_in is None:
+            if not self.head:
+                raise UploadError("No image data provided", 400)
+            self._open()
+            self.grid_in.write(self.head)
+        sha256 = self.hash.hexdigest()
+        existing = image_files_collection.find_one({"sha256": sha256}, {"_id": 1})
+        if existing:
+            self.abort()
+        else:
+            # attributes set before close end up on the GridFS file document
+            self.grid_in.sha256 = sha256
+            self.grid_in.close()
+        return {
+            "sha256": sha256,
+            "url": image_url(sha256),
+            "content_type": self.content_type,
+            "length": self.length,
+            "duplicate": existing is not None,
+        }
+
+    def abort(self):
+        if self.grid_in is not None:
+            self.grid_in.abort()
+            self.grid_in = None
+
+
+def store_image(stream, content_type, content_length=None, metadata=None):
+    """Copy a file-like ``stream`` into GridFS; see ImageUpload.finish."""
+    upload = ImageUpload(content_type, content_length, metadata)
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            upload.write(chunk)
+    except BaseException:
+        upload.abort()
+        raise
+    return upload.finish()
+
+
+def image_type(grid_out):
+    return grid_out.metadata["content_type"]
+
+
+def image_headers(grid_out):
+    # content-addressed, so a URL's bytes never change
+    return {
+        "Content-Length": str(grid_out.length),
+        "ETag": f'"{grid_out.sha256}"',
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+
+
+def open_image(sha256):
+    """GridOut for a stored image, or None."""
+    doc = image_files_collection.find_one({"sha256": sha256}, {"_id": 1})
+    if doc is None:
+        return None
+    return images_bucket.open_download_stream(doc["_id"])
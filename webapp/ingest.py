@@ -0,0 +1,233 @@
+"""Streaming NDJSON ingest behind ``POST /api/bathrooms/bulk``.
+
+The request body is read one line at a time (each capped at
+``MAX_LINE_BYTES``), validated, and turned into an ``osm_id``-keyed upsert.
+Upserts go out in unordered ``bulk_write`` batches of ``BATCH_SIZE``, so
+memory stays bounded by one batch however large the upload is. Only OSM
+fields are ``$set``; reviews, ratings and favorites on existing bathrooms
+are left alone, and new ones start with the same defaults as
+``/bathrooms/add``. Records for bathrooms that were merged into another
+one are counted in ``merged`` and not written.
+"""
+
+import json
+import math
+import time
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from webapp.db import bathrooms_collection
+from webapp.changes import record_changes
+from webapp.display import display_fields
+from webapp.duplicates import geocell, merged_ids
+from webapp.enrichment import enrichment_queue
+from webapp.opening_hours import compile_opening_hours
+from webapp.areas import area_fields
+from webapp.regions import region_for_point
+from webapp.store import STORE_PROJECTION, read_model
+
+BATCH_SIZE = 500
+MAX_LINE_BYTES = 64 * 1024
+MAX_REPORTED_ERRORS = 1000
+
+NEW_BATHROOM_DEFAULTS = {
+    "reviews": [],
+    "average_rating": None,
+    "rating_count": 0,
+}
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return False
+    return math.isfinite(value)
+
+
+def validate_record(record):
+    """Returns ``($set fields, error)`` for one decoded NDJSON record."""
+    if not isinstance(record, dict):
+        return None, "record must be a JSON object"
+    osm_id = record.get("osm_id")
+    if not isinstance(osm_id, int) or isinstance(osm_id, bool):
+        return None, "osm_id must be an integer"
+    lat, lon = record.get("lat"), record.get("lon")
+    if not _number(lat) or not -90 <= lat <= 90:
+        return None, "lat must be a number between -90 and 90"
+    if not _number(lon) or not -180 <= lon <= 180:
+        return None, "lon must be a number between -180 and 180"
+    tags = record.get("tags", {})
+    if not isinstance(tags, dict) or not all(
+        isinstance(k, str) and isinstance(v, str) for k, v in tags.items()
+    ):
+        return None, "tags must be an object of strings"
+    return {
+        "osm_id": osm_id,
+        "lat": float(lat),
+        "lon": float(lon),
+        "geocell": geocell(lat, lon),
+        "region": region_for_point(lat, lon),
+        **area_fields(lat, lon),
+        "tags": tags,
+        **display_fields(tags, osm_id, lat, lon),
+        "open_intervals": compile_opening_hours(tags.get("opening_hours")),
+    }, None
+
+
+def iter_lines(stream, max_bytes=MAX_LINE_BYTES):
+    """Yield ``(line_number, bytes or None)``; None marks an over-long line."""
+    line_number = 0
+    while True:
+        line = stream.readline(max_bytes + 1)
+        if not line:
+            return
+        line_number += 1
+        if len(line) > max_bytes and not line.endswith(b"\n"):
+            # discard the rest of it without holding it in memory
+            while line and not line.endswith(b"\n"):
+                line = stream.readline(max_bytes + 1)
+            yield line_number, None
+            continue
+        yield line_number, line
+
+
+class ChunkLines:
+    """``iter_lines`` for a body that arrives as chunks (the ASGI app)."""
+
+    def __init__(self, max_bytes=MAX_LINE_BYTES):
+        self.max_bytes = max_bytes
+        self.line_number = 0
+        self.pending = b""
+        self.overlong = False
+
+    def _emit(self, line):
+        self.line_number += 1
+        too_long = self.overlong or len(line) > self.max_bytes
+        self.overlong = False
+        return self.line_number, None if too_long else line
+
+    def feed(self, chunk):
+        *lines, self.pending = (self.pending + chunk).split(b"\n")
+        out = [self._emit(line) for line in lines]
+        if len(self.pending) > self.max_bytes:
+            # remember the line is too long rather than buffering the rest
+            self.overlong, self.pending = True, b""
+        return out
+
+    def finish(self):
+        if self.pending or self.overlong:
+            return [self._emit(self.pending)]
+        return []
+
+
+class BulkIngest:
+    """Validates NDJSON lines and upserts them in batches.
+
+    Feed lines with ``add``; when it returns True a batch is full and the
+    caller should ``flush`` (the async app does that off the event loop).
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or BATCH_SIZE
+        self.batch = {}  # osm_id -> (line_number, fields)
+        self.lines = 0
+        self.accepted = 0
+        self.upserted = 0
+        self.modified = 0
+        self.merged = 0
+        self.errors = []
+        self.error_count = 0
+        self.started = time.perf_counter()
+
+    def error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_number, "error": message})
+
+    def add(self, line_number, line):
+        self.lines = line_number
+        if line is None:
+            self.error(line_number, f"line longer than {MAX_LINE_BYTES} bytes")
+            return False
+        if not line.strip():
+            return False
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            self.error(line_number, f"invalid JSON: {exc}")
+            return False
+        fields, error = validate_record(record)
+        if error:
+            self.error(line_number, error)
+            return False
+        if fields["osm_id"] in self.batch:
+            # a later line for the same bathroom supersedes the earlier one
+            self.accepted += 1
+        self.batch[fields["osm_id"]] = (line_number, fields)
+        return len(self.batch) >= self.batch_size
+
+    def flush(self):
+        if not self.batch:
+            return
+        entries = list(self.batch.items())
+        self.batch = {}
+        merged = merged_ids(osm_id for osm_id, _ in entries)
+        if merged:
+            entries = [entry for entry in entries if entry[0] not in merged]
+            self.merged += len(merged)
+            if not entries:
+                return
+        ops = [
+            UpdateOne(
+                {"osm_id": osm_id},
+                {"$set": fields, "$setOnInsert": NEW_BATHROOM_DEFAULTS},
+                upsert=True,
+            )
+            for osm_id, (_, fields) in entries
+        ]
+        failed = set()
+        try:
+            details = bathrooms_collection.bulk_write(ops, ordered=False).bulk_api_result
+        except BulkWriteError as exc:
+            details = exc.details
+            for write_error in details.get("writeErrors", []):
+                index = write_error["index"]
+                failed.add(index)
+                self.error(entries[index][1][0], write_error.get("errmsg", "write failed"))
+
+        self.upserted += details.get("nUpserted", 0)
+        self.modified += details.get("nModified", 0)
+        self.accepted += len(entries) - len(failed)
+
+        written = [osm_id for i, (osm_id, _) in enumerate(entries) if i not in failed]
+        record_changes(written)
+        enrichment_queue.enqueue_many(
+            fields for i, (_, (_, fields)) in enumerate(entries) if i not in failed
+        )
+        if read_model.enabled and written:
+            query = {"osm_id": {"$in": written}}
+            for doc in bathrooms_collection.find(query, STORE_PROJECTION):
+                read_model.upsert(doc)
+
+    def report(self):
+        seconds = time.perf_counter() - self.started
+        return {
+            "lines": self.lines,
+            "accepted": self.accepted,
+            "upserted": self.upserted,
+            "modified": self.modified,
+            "merged": self.merged,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "errors_truncated": self.error_count > len(self.errors),
+            "seconds": round(seconds, 3),
+            "records_per_second": round(self.accepted / seconds, 1) if seconds else None,
+        }
+
+
+def ingest_ndjson(stream, batch_size=None):
+    """Upsert every valid record in the NDJSON ``stream``; returns the report."""
+    ingest = BulkIngest(batch_size)
+    for line_number, line in iter_lines(stream):
+        if ingest.add(line_number, line):
+            ingest.flush()
+    ingest.flush()
+    return ingest.report()
@@ -0,0 +1,67 @@
+"""JSON provider shared by the Flask and Quart apps.
+
+Responses are encoded with orjson when it is installed (several times
+faster than the stdlib for the large listing responses), and with the
+framework's stdlib-based provider otherwise. Either way datetimes go out
+in the API's ISO 8601 "Z" form and ObjectIds as strings, so the bytes a
+client parses don't depend on which encoder ran. Keys are not sorted.
+"""
+
+import json
+from datetime import datetime
+from bson import ObjectId
+from webapp.display import isoformat
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+# naive datetimes are UTC (that's how pymongo returns them); with these
+# options orjson writes them exactly as display.isoformat does
+ORJSON_OPTIONS = (
+    orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    if orjson
+    else 0
+)
+
+
+def default(o):
+    """Types the encoders don't know: dates, ObjectIds."""
+    if isinstance(o, datetime):
+        return isoformat(o)
+    if isinstance(o, ObjectId):
+        return str(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj):
+    """UTF-8 JSON for ``obj``; orjson if available."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=ORJSON_OPTIONS)
+    return json.dumps(obj, default=default, separators=(",", ":")).encode()
+
+
+class FastJSONMixin:
+    """Mixed into a framework's DefaultJSONProvider (see webapp.app, webapp.asgi)."""
+
+    sort_keys = False
+    default = staticmethod(default)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        if orjson is None or pretty:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        # straight to bytes; no str round trip for the body
+        return self._app.response_class(dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
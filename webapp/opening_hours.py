@@ -0,0 +1,175 @@
+"""Compile OSM ``opening_hours`` strings into weekly interval tables.
+
+Parsing happens once, when a bathroom is imported or added; requests only
+look a minute-of-week up in the stored intervals. The common subset of the
+grammar is supported: ``24/7``, weekday ranges and lists, comma-separated
+time spans (including ones past midnight), ``off``/``closed`` and rules
+separated by ``;`` where later rules override earlier ones for the days
+they name. Public/school holiday rules (``PH``, ``SH``) are skipped.
+Anything else (months, sunrise, week numbers, comments, ...) compiles to
+None, which callers treat as "hours unknown".
+"""
+
+import re
+from datetime import datetime, timezone
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+    ZoneInfoNotFoundError = Exception
+
+DAYS = ("Mo", "Tu", "We", "Th", "Fr", "Sa", "Su")
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+DEFAULT_TIMEZONE = "America/New_York"
+
+_DAY_SPEC = re.compile(r"^(Mo|Tu|We|Th|Fr|Sa|Su)(?:-(Mo|Tu|We|Th|Fr|Sa|Su))?$")
+_TIME_SPAN = re.compile(r"^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})$")
+
+
+def _parse_days(spec):
+    days = []
+    for part in spec.split(","):
+        match = _DAY_SPEC.match(part.strip())
+        if not match:
+            return None
+        start = DAYS.index(match.group(1))
+        end = DAYS.index(match.group(2) or match.group(1))
+        # Fr-Mo wraps around the week
+        span = (end - start) % 7
+        days.extend((start + i) % 7 for i in range(span + 1))
+    return days
+
+
+def _parse_times(spec):
+    spans = []
+    for part in spec.split(","):
+        match = _TIME_SPAN.match(part.strip())
+        if not match:
+            return None
+        h1, m1, h2, m2 = (int(g) for g in match.groups())
+        if h1 > 24 or h2 > 24 or m1 > 59 or m2 > 59:
+            return None
+        start, end = h1 * 60 + m1, h2 * 60 + m2
+        if end <= start:
+            end += MINUTES_PER_DAY  # runs past midnight
+        spans.append((start, end))
+    return spans
+
+
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def compile_opening_hours(value):
+    """Weekly open intervals as ``[{"s": minute, "e": minute}, ...]`` or None.
+
+    Minutes count from Monday 00:00; ``e`` is exclusive.
+    """
+    if not value or not isinstance(value, str):
+        return None
+    value = value.strip()
+    if value == "24/7":
+        return [{"s": 0, "e": MINUTES_PER_WEEK}]
+
+    schedule = {}
+    for rule in value.split(";"):
+        rule = rule.strip()
+        if not rule:
+            continue
+        tokens = rule.split(None, 1)
+        if tokens[0].split(",")[0] in ("PH", "SH"):
+            continue
+        days = _parse_days(tokens[0])
+        if days is None:
+            days, rest = list(range(7)), rule
+        else:
+            rest = tokens[1] if len(tokens) > 1 else "00:00-24:00"
+        rest = rest.strip()
+
+        if rest in ("off", "closed"):
+            spans = []
+        else:
+            spans = _parse_times(rest.replace(" ", ""))
+            if spans is None:
+                return None
+        for day in days:
+            schedule[day] = spans
+
+    intervals = []
+    for day, spans in schedule.items():
+        for start, end in spans:
+            start += day * MINUTES_PER_DAY
+            end += day * MINUTES_PER_DAY
+            if end > MINUTES_PER_WEEK:
+                # Sunday night spilling into Monday morning
+                intervals.append((start, MINUTES_PER_WEEK))
+                intervals.append((0, end - MINUTES_PER_WEEK))
+            else:
+                intervals.append((start, end))
+
+    return [{"s": s, "e": e} for s, e in _merge(intervals)]
+
+
+def local_timezone(name=DEFAULT_TIMEZONE):
+    if ZoneInfo is None:
+        return timezone.utc
+    try:
+        return ZoneInfo(name)
+    except ZoneInfoNotFoundError:
+        return timezone.utc
+
+
+def minute_of_week(moment=None, tz_name=DEFAULT_TIMEZONE):
+    """Minute since local Monday 00:00 for ``moment`` (naive means local)."""
+    tz = local_timezone(tz_name)
+    if moment is None:
+        moment = datetime.now(tz)
+    elif moment.tzinfo is None:
+        moment = moment.replace(tzinfo=tz)
+    else:
+        moment = moment.astimezone(tz)
+    return moment.weekday() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+
+def is_open(intervals, minute):
+    """True/False, or None when the hours are unknown."""
+    if intervals is None:
+        return None
+    return any(iv["s"] <= minute < iv["e"] for iv in intervals)
+
+
+def open_query(minute):
+    """Mongo filter: open at ``minute``, or hours unknown."""
+    return {
+        "$or": [
+            {"open_intervals": {"$elemMatch": {"s": {"$lte": minute}, "e": {"$gt": minute}}}},
+            {"open_intervals": None},
+        ]
+    }
+
+
+def parse_open_args(args, tz_name=DEFAULT_TIMEZONE):
+    """Minute of week requested by ``open_now=1`` or ``open_at=<iso>``.
+
+    The minute is local to ``tz_name``, the time zone of the region being
+    queried; an ``open_at`` without an offset is read as local time there.
+    Returns ``(minute, error)``; both are None when no filter was asked for.
+    """
+    open_at = args.get("open_at")
+    if open_at:
+        try:
+            moment = datetime.fromisoformat(open_at.replace("Z", "+00:00"))
+        except ValueError:
+            return None, "open_at must be an ISO 8601 datetime"
+        return minute_of_week(moment, tz_name), None
+    if args.get("open_now") in ("1", "true", "yes"):
+        return minute_of_week(tz_name=tz_name), None
+    return None, None
@@ -0,0 +1,225 @@
+"""Tiled Overpass import with retries and resumable progress.
+
+A region's bounding box is cut into ``TILE_DEGREES`` tiles, each fetched
+with its own Overpass query (region filter plus the tile's bbox) on a
+pool of ``MAX_WORKERS`` threads, so no single query has to cover the whole
+area. A tile that fails (network error, 429/5xx, or an Overpass runtime
+error) is retried with exponential backoff. Each finished tile is written
+to Mongo and recorded in a checkpoint file; an import that is interrupted
+or leaves failed tiles behind resumes from the checkpoint on the next run,
+and the file is removed once every tile is in.
+"""
+
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from webapp.db import bathrooms_collection
+from webapp.areas import area_fields
+from webapp.changes import record_changes
+from webapp.display import display_fields
+from webapp.duplicates import geocell, merged_ids
+from webapp.enrichment import enrichment_queue
+from webapp.opening_hours import compile_opening_hours
+from webapp.regions import region_for_point
+
+OVERPASS_URL = os.environ.get("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+TILE_DEGREES = 0.1
+MAX_WORKERS = 4
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 2.0
+QUERY_TIMEOUT = 90  # Overpass [timeout:], per tile
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class OverpassError(Exception):
+    pass
+
+
+def tiles(bbox, size=TILE_DEGREES):
+    """(south, west, north, east) tiles covering ``bbox``, row by row."""
+    min_lat, max_lat, min_lon, max_lon = bbox
+
+    def edges(low, high):
+        # stepped by index, so float drift can't add a sliver tile at the end
+        count = max(1, math.ceil(round((high - low) / size, 6)))
+        points = [round(min(low + i * size, high), 6) for i in range(count + 1)]
+        return list(zip(points, points[1:]))
+
+    return [
+        (south, west, north, east)
+        for south, north in edges(min_lat, max_lat)
+        for west, east in edges(min_lon, max_lon)
+    ]
+
+
+def tile_key(tile):
+    return ",".join(f"{v:.6f}" for v in tile)
+
+
+def tile_query(region, tile):
+    area = f"{region.overpass_area}->.region;\n" if region.overpass_area else ""
+    where = region.overpass_filter() + "({},{},{},{})".format(*tile)
+    return f"""
+[out:json][timeout:{QUERY_TIMEOUT}];
+{area}(
+  node["amenity"="toilets"]{where};
+  way["amenity"="toilets"]{where};
+  relation["amenity"="toilets"]{where};
+);
+out center;
+"""
+
+
+def _retry_delay(attempt, backoff, response=None):
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return backoff * 2**attempt + random.uniform(0, backoff)
+
+
+def fetch_tile(url, query, attempts=MAX_ATTEMPTS, backoff=BACKOFF_SECONDS):
+    """Overpass ``elements`` for ``query``; raises OverpassError once out of attempts."""
+    error = None
+    for attempt in range(attempts):
+        response = None
+        try:
+            response = requests.post(url, data=query, timeout=QUERY_TIMEOUT + 30)
+            if response.status_code in RETRY_STATUSES:
+                error = f"HTTP {response.status_code}"
+            else:
+                response.raise_for_status()
+                data = response.json()
+                # Overpass reports timeouts and memory errors in a 200 body
+                remark = data.get("remark") or ""
+                if "error" not in remark:
+                    return data.get("elements", [])
+                error = remark
+        except (requests.RequestException, ValueError) as exc:
+            error = str(exc)
+        if attempt + 1 < attempts:
+            time.sleep(_retry_delay(attempt, backoff, response))
+    raise OverpassError(error)
+
+
+def element_doc(el):
+    """Bathroom ``$set`` fields for an Overpass element, or None without coordinates."""
+    osm_id = el["id"]
+    lat = el.get("lat") or el.get("center", {}).get("lat")
+    lon = el.get("lon") or el.get("center", {}).get("lon")
+    if lat is None or lon is None:
+        return None
+    tags = el.get("tags", {})
+    return {
+        "osm_id": osm_id,
+        "lat": lat,
+        "lon": lon,
+        "geocell": geocell(lat, lon),
+        # by polygon, not by which import found it, so it matches query routing
+        "region": region_for_point(lat, lon),
+        **area_fields(lat, lon),
+        "tags": tags,
+        **display_fields(tags, osm_id, lat, lon),
+        # compiled once here so "open now" is a lookup at request time
+        "open_intervals": compile_opening_hours(tags.get("opening_hours")),
+    }
+
+
+def upsert_elements(elements):
+    """Upsert elements by ``osm_id``; returns the ids that were added or changed.
+
+    Elements whose bathroom was merged into another one are skipped. Changed
+    bathrooms without an address are queued for enrichment; that also puts
+    back an address the OSM tags just overwrote.
+    """
+    docs = [doc for doc in map(element_doc, elements) if doc is not None]
+    merged = merged_ids(doc["osm_id"] for doc in docs)
+    changed = []
+    for doc in docs:
+        if doc["osm_id"] in merged:
+            continue
+        result = bathrooms_collection.update_one(
+            {"osm_id": doc["osm_id"]}, {"$set": doc}, upsert=True
+        )
+        if result.upserted_id or result.modified_count:
+            changed.append(doc)
+    enrichment_queue.enqueue_many(changed)
+    return [doc["osm_id"] for doc in changed]
+
+
+class Checkpoint:
+    """Tiles already imported, kept in a JSON file between runs."""
+
+    def __init__(self, path, region, tile_degrees):
+        self.path = path
+        self.header = {"region": region, "tile_degrees": tile_degrees}
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            # a checkpoint for another region or tiling doesn't apply
+            if {k: saved.get(k) for k in self.header} == self.header:
+                self.done = set(saved.get("done", []))
+
+    def mark(self, key):
+        self.done.add(key)
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({**self.header, "done": sorted(self.done)}, f)
+        os.replace(tmp, self.path)  # never leave a half-written checkpoint
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def import_region(
+    region,
+    url=None,
+    checkpoint_path=None,
+    tile_degrees=TILE_DEGREES,
+    workers=MAX_WORKERS,
+    attempts=MAX_ATTEMPTS,
+    backoff=BACKOFF_SECONDS,
+):
+    """Fetch and upsert every tile of ``region``. Returns a report dict."""
+    url = url or OVERPASS_URL
+    checkpoint = Checkpoint(checkpoint_path, region.name, tile_degrees)
+    pending = [
+        tile for tile in tiles(region.bbox, tile_degrees) if tile_key(tile) not in checkpoint.done
+    ]
+    report = {
+        "tiles": len(pending) + len(checkpoint.done),
+        "skipped": len(checkpoint.done),
+        "fetched": 0,
+        "changed": 0,
+        "failed": [],
+    }
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(fetch_tile, url, tile_query(region, tile), attempts, backoff): tile
+            for tile in pending
+        }
+        for future in as_completed(futures):
+            tile = futures[future]
+            try:
+                elements = future.result()
+            except OverpassError as exc:
+                report["failed"].append({"tile": tile_key(tile), "error": str(exc)})
+                continue
+            # writes stay on this thread; only the HTTP calls run in the pool
+            changed = upsert_elements(elements)
+            record_changes(changed)
+            report["fetched"] += 1
+            report["changed"] += len(changed)
+            checkpoint.mark(tile_key(tile))
+
+    if not report["failed"]:
+        checkpoint.clear()
+    return report
@@ -0,0 +1,127 @@
+"""Prepared point-in-polygon tests, for many points against one shape.
+
+``PreparedPolygon`` lays a grid over the polygon's bounding box once and
+classifies every cell as inside, outside, or boundary (some edge's box
+overlaps it). A point in an inside or outside cell is answered by a
+lookup. A point in a boundary cell is compared only with that cell's
+edges, walking from the cell centre, whose side is already known. A
+polygon is a list of (lat, lon) rings; holes and extra parts are just more
+rings (even-odd rule).
+"""
+
+import math
+import numpy as np
+
+OUTSIDE, INSIDE, BOUNDARY = 0, 1, 2
+MIN_GRID = 8
+MAX_GRID = 256
+
+
+def _inside(lats, lons, a_lat, a_lon, b_lat, b_lon):
+    """Even-odd ray casting of each point against every edge, vectorized."""
+    lats = np.asarray(lats, dtype=np.float64)[:, None]
+    lons = np.asarray(lons, dtype=np.float64)[:, None]
+    straddles = (a_lat > lats) != (b_lat > lats)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crossing = a_lon + (lats - a_lat) * (b_lon - a_lon) / (b_lat - a_lat)
+    return (np.count_nonzero(straddles & (lons < crossing), axis=1) % 2).astype(bool)
+
+
+def _orient(a_lat, a_lon, b_lat, b_lon, c_lat, c_lon):
+    return (b_lon - a_lon) * (c_lat - a_lat) - (b_lat - a_lat) * (c_lon - a_lon)
+
+
+class PreparedPolygon:
+    def __init__(self, rings, grid=None):
+        edges = [
+            (*ring[i], *ring[(i + 1) % len(ring)])
+            for ring in rings
+            for i in range(len(ring))
+            if len(ring) >= 3
+        ]
+        if not edges:
+            raise ValueError("A polygon needs at least three vertices")
+        a_lat, a_lon, b_lat, b_lon = np.array(edges, dtype=np.float64).T
+        self.a_lat, self.a_lon, self.b_lat, self.b_lon = a_lat, a_lon, b_lat, b_lon
+        lats, lons = np.concatenate([a_lat, b_lat]), np.concatenate([a_lon, b_lon])
+        self.bbox = (lats.min(), lats.max(), lons.min(), lons.max())
+
+        # ~2*sqrt(edges) cells a side leaves each boundary cell only a few edges
+        n = grid or min(MAX_GRID, max(MIN_GRID, int(2 * math.sqrt(len(edges)))))
+        self.n = n
+        min_lat, max_lat, min_lon, max_lon = self.bbox
+        self.cell_lat = (max_lat - min_lat) / n or 1e-9
+        self.cell_lon = (max_lon - min_lon) / n or 1e-9
+
+        self.cell_edges = {}
+        rows = self._rows(np.minimum(a_lat, b_lat)), self._rows(np.maximum(a_lat, b_lat))
+        cols = self._cols(np.minimum(a_lon, b_lon)), self._cols(np.maximum(a_lon, b_lon))
+        for e, (i0, i1, j0, j1) in enumerate(zip(*rows, *cols)):
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    self.cell_edges.setdefault((i, j), []).append(e)
+        self.cell_edges = {cell: np.array(ids) for cell, ids in self.cell_edges.items()}
+
+        # one vectorized ray cast per row of cell centres
+        centers_lon = min_lon + (np.arange(n) + 0.5) * self.cell_lon
+        self.center_inside = np.array(
+            [
+                _inside(
+                    np.full(n, min_lat + (i + 0.5) * self.cell_lat),
+                    centers_lon,
+                    a_lat,
+                    a_lon,
+                    b_lat,
+                    b_lon,
+                )
+                for i in range(n)
+            ]
+        )
+        self.state = np.where(self.center_inside, INSIDE, OUTSIDE).astype(np.int8)
+        for i, j in self.cell_edges:
+            self.state[i, j] = BOUNDARY
+
+    def _rows(self, lats):
+        rows = np.floor((np.asarray(lats) - self.bbox[0]) / self.cell_lat).astype(int)
+        return np.clip(rows, 0, self.n - 1)
+
+    def _cols(self, lons):
+        cols = np.floor((np.asarray(lons) - self.bbox[2]) / self.cell_lon).astype(int)
+        return np.clip(cols, 0, self.n - 1)
+
+    def _boundary_contains(self, i, j, lat, lon):
+        """Side of a point in a boundary cell: the centre's, flipped per crossing."""
+        center_lat = self.bbox[0] + (i + 0.5) * self.cell_lat
+        center_lon = self.bbox[2] + (j + 0.5) * self.cell_lon
+        e = self.cell_edges[(i, j)]
+        a_lat, a_lon = self.a_lat[e], self.a_lon[e]
+        b_lat, b_lon = self.b_lat[e], self.b_lon[e]
+        crosses = (
+            _orient(center_lat, center_lon, lat, lon, a_lat, a_lon)
+            * _orient(center_lat, center_lon, lat, lon, b_lat, b_lon)
+            < 0
+        ) & (
+            _orient(a_lat, a_lon, b_lat, b_lon, center_lat, center_lon)
+            * _orient(a_lat, a_lon, b_lat, b_lon, lat, lon)
+            < 0
+        )
+        return bool(self.center_inside[i, j]) != bool(np.count_nonzero(crosses) % 2)
+
+    def contains(self, lat, lon):
+        return bool(self.contains_many([lat], [lon])[0])
+
+    def contains_many(self, lats, lons):
+        """Boolean array: which of the points are inside."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        min_lat, max_lat, min_lon, max_lon = self.bbox
+        result = (lats >= min_lat) & (lats <= max_lat)
+        result &= (lons >= min_lon) & (lons <= max_lon)
+        candidates = np.flatnonzero(result)
+        rows, cols = self._rows(lats[candidates]), self._cols(lons[candidates])
+        state = self.state[rows, cols]
+        result[candidates] = state == INSIDE
+        for k in np.flatnonzero(state == BOUNDARY):
+            p = candidates[k]
+            result[p] = self._boundary_contains(rows[k], cols[k], lats[p], lons[p])
+        return result
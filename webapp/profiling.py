@@ -0,0 +1,233 @@
+"""Opt-in profiling of single requests to the Flask app.
+
+A request is profiled when it carries a valid signed ``X-Profile`` token
+(see ``profile_token``; the token names the path and an expiry, so one
+can't be replayed against other routes or later on), or when an admin
+(``ADMIN_EMAILS``) sends ``X-Profile: 1`` or ``?_profile=1``. That request
+alone runs under cProfile while the Mongo commands it issues are recorded
+with their offsets and durations. The call profile and the command
+timeline are stored in the ``profiles`` collection and listed at
+``/admin/profiles``; the response carries ``X-Profile-Id``.
+
+Requests that don't ask for a profile pay one header lookup. The command
+listener is only attached to the Mongo client when profiling is
+configured (``PROFILE_SECRET`` or ``ADMIN_EMAILS``), and it ignores
+commands outside a profiled request.
+"""
+
+import contextvars
+import cProfile
+import hashlib
+import hmac
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+from flask import g, request, session
+from pymongo import ASCENDING, monitoring
+
+PROFILE_SECRET = os.environ.get("PROFILE_SECRET", "")
+ADMIN_EMAILS = frozenset(
+    email.strip().lower()
+    for email in os.environ.get("ADMIN_EMAILS", "").split(",")
+    if email.strip()
+)
+HEADER = "X-Profile"
+QUERY_ARG = "_profile"
+TOKEN_TTL_SECONDS = 300
+TOP_FUNCTIONS = 40
+KEEP_SECONDS = 7 * 24 * 3600
+
+# the profile being recorded on this request, if any
+_recording = contextvars.ContextVar("profile_recording", default=None)
+
+
+def profile_token(path, ttl=TOKEN_TTL_SECONDS, secret=None, now=None):
+    """``X-Profile`` value that profiles one request to ``path`` until it expires."""
+    expires = int((time.time() if now is None else now) + ttl)
+    return f"{expires}.{_signature(secret or PROFILE_SECRET, path, expires)}"
+
+
+def _signature(secret, path, expires):
+    message = f"{expires}:{path}".encode()
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def token_valid(token, path, secret, now=None):
+    if not secret or not token:
+        return False
+    expires, _, signature = token.partition(".")
+    if not expires.isdigit() or int(expires) < (time.time() if now is None else now):
+        return False
+    return hmac.compare_digest(signature, _signature(secret, path, int(expires)))
+
+
+class Recording:
+    """One profiled request: its profiler and its Mongo command timeline."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started = clock()
+        self.profile = cProfile.Profile()
+        self.timeline = []
+        self._pending = {}
+
+    def command_started(self, event):
+        entry = {
+            "command": event.command_name,
+            "database": event.database_name,
+            "offset_ms": round((self.clock() - self.started) * 1000, 3),
+            "duration_ms": None,
+            "ok": None,
+        }
+        target = event.command.get(event.command_name)
+        if isinstance(target, str):
+            entry["collection"] = target
+        self._pending[event.request_id] = entry
+        self.timeline.append(entry)
+
+    def command_finished(self, event, ok):
+        entry = self._pending.pop(event.request_id, None)
+        if entry is not None:
+            entry["duration_ms"] = round(event.duration_micros / 1000, 3)
+            entry["ok"] = ok
+
+    def top_functions(self, limit=TOP_FUNCTIONS):
+        stats = pstats.Stats(self.profile)
+        # by cumulative time: (primitive calls, calls, total, cumulative, callers)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        rows = rows[:limit]
+        return [
+            {
+                "function": f"{filename}:{line}({name})",
+                "calls": calls,
+                "primitive_calls": primitive,
+                "total_ms": round(total * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3),
+            }
+            for (filename, line, name), (primitive, calls, total, cumulative, _) in rows
+        ]
+
+
+class CommandTimeline(monitoring.CommandListener):
+    """Feeds Mongo command events to the current request's Recording."""
+
+    def started(self, event):
+        recording = _recording.get()
+        if recording is not None:
+            recording.command_started(event)
+
+    def succeeded(self, event):
+        recording = _recording.get()
+        if recording is not None:
+            recording.command_finished(event, True)
+
+    def failed(self, event):
+        recording = _recording.get()
+        if recording is not None:
+            recording.command_finished(event, False)
+
+
+command_timeline = CommandTimeline()
+
+
+def command_listeners():
+    """``event_listeners`` for the Mongo client: none unless profiling is on."""
+    return [command_timeline] if PROFILE_SECRET or ADMIN_EMAILS else []
+
+
+class RequestProfiler:
+    def __init__(self, secret=PROFILE_SECRET, admins=ADMIN_EMAILS, collection=None):
+        self.secret = secret
+        self.admins = admins
+        self.collection = collection
+        self.indexed = False
+        # cProfile can't nest, so concurrent requests for a profile take turns
+        self._busy = threading.Lock()
+
+    def init_app(self, app, collection):
+        self.collection = collection
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def ensure_indexes(self):
+        self.collection.create_index(
+            [("created_at", ASCENDING)], expireAfterSeconds=KEEP_SECONDS
+        )
+
+    def is_admin(self, user=None):
+        user = session.get("user") if user is None else user
+        email = ((user or {}).get("email") or "").lower()
+        return bool(email) and email in self.admins
+
+    def trigger(self):
+        """How this request asked to be profiled ("token" or "admin"), or None."""
+        value = request.headers.get(HEADER)
+        if value is None and QUERY_ARG not in request.args:
+            return None
+        if value and value != "1" and token_valid(value, request.path, self.secret):
+            return "token"
+        if (value == "1" or request.args.get(QUERY_ARG) == "1") and self.is_admin():
+            return "admin"
+        return None
+
+    def _before_request(self):
+        if HEADER not in request.headers and QUERY_ARG not in request.args:
+            return None
+        trigger = self.trigger()
+        if trigger is None or not self._busy.acquire(blocking=False):
+            return None
+        recording = Recording()
+        g.profile_recording = (recording, trigger, _recording.set(recording))
+        recording.profile.enable()
+        return None
+
+    def _finish(self):
+        """Stop recording; returns (recording, trigger) or None."""
+        state = g.pop("profile_recording", None)
+        if state is None:
+            return None
+        recording, trigger, token = state
+        recording.profile.disable()
+        _recording.reset(token)
+        self._busy.release()
+        return recording, trigger
+
+    def _after_request(self, response):
+        finished = self._finish()
+        if finished is None:
+            return response
+        recording, trigger = finished
+        doc = {
+            "created_at": datetime.utcnow(),
+            "method": request.method,
+            "path": request.path,
+            "query_string": request.query_string.decode(errors="replace"),
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "user": (session.get("user") or {}).get("email"),
+            "trigger": trigger,
+            "duration_ms": round((recording.clock() - recording.started) * 1000, 3),
+            "mongo": {
+                "commands": len(recording.timeline),
+                "total_ms": round(
+                    sum(entry["duration_ms"] or 0 for entry in recording.timeline), 3
+                ),
+            },
+            "timeline": recording.timeline,
+            "functions": recording.top_functions(),
+        }
+        if not self.indexed:
+            self.ensure_indexes()
+            self.indexed = True
+        response.headers["X-Profile-Id"] = str(self.collection.insert_one(doc).inserted_id)
+        return response
+
+    def _teardown_request(self, exc=None):
+        # after_request didn't run (the view raised); just stop the profiler
+        self._finish()
+
+
+profiler = RequestProfiler()
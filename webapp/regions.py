@@ -0,0 +1,181 @@
+"""Region registry and the ``region`` partition key on bathrooms.
+
+Each region is a metro with a bounding polygon. A bathroom's ``region`` is
+the registry key of the polygon containing it, or None when it falls in
+none of them. Queries with a viewport or a point filter on the regions
+they can touch, and the ``(region, lat, lon)`` index keeps that filter a
+range scan inside those partitions, so a viewport in one city costs the
+same however many other cities are loaded. Unassigned bathrooms (None)
+are a partition of their own that is always included; that is also where
+bathrooms written before regions existed sit until ``backfill_regions``.
+Each region also names its time zone, which "open now" is judged in.
+"""
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from webapp.db import bathrooms_collection
+from webapp.geo import bbox_around
+from webapp.opening_hours import DEFAULT_TIMEZONE
+
+DEFAULT_REGION = "nyc"
+# how far outside its polygon a point still routes to a region
+POINT_MARGIN_M = 50000
+
+INDEXES = [
+    [("region", ASCENDING), ("lat", ASCENDING), ("lon", ASCENDING)],
+    [("region", ASCENDING), ("average_rating", DESCENDING)],
+    [("region", ASCENDING), ("favorite_count", DESCENDING)],
+]
+
+
+def point_in_polygon(lat, lon, polygon):
+    """Ray casting over a ring of (lat, lon) vertices."""
+    inside = False
+    j = len(polygon) - 1
+    for i, (lat_i, lon_i) in enumerate(polygon):
+        lat_j, lon_j = polygon[j]
+        if (lat_i > lat) != (lat_j > lat):
+            crossing = lon_i + (lat - lat_i) * (lon_j - lon_i) / (lat_j - lat_i)
+            if lon < crossing:
+                inside = not inside
+        j = i
+    return inside
+
+
+class Region:
+    def __init__(self, name, label, polygon, overpass_area=None, timezone=DEFAULT_TIMEZONE):
+        self.name = name
+        self.label = label
+        self.polygon = polygon
+        self.timezone = timezone
+        # Overpass area selector; without one the import clips to the polygon
+        self.overpass_area = overpass_area
+        lats = [lat for lat, _ in polygon]
+        lons = [lon for _, lon in polygon]
+        self.bbox = (min(lats), max(lats), min(lons), max(lons))
+
+    def contains(self, lat, lon):
+        min_lat, max_lat, min_lon, max_lon = self.bbox
+        if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+            return False
+        return point_in_polygon(lat, lon, self.polygon)
+
+    def intersects(self, bbox):
+        min_lat, max_lat, min_lon, max_lon = bbox
+        r_min_lat, r_max_lat, r_min_lon, r_max_lon = self.bbox
+        return (
+            min_lat <= r_max_lat
+            and max_lat >= r_min_lat
+            and min_lon <= r_max_lon
+            and max_lon >= r_min_lon
+        )
+
+    def overpass_filter(self):
+        """What follows ``node["amenity"="toilets"]`` in an Overpass query."""
+        if self.overpass_area:
+            return "(area.region)"
+        poly = " ".join(f"{lat} {lon}" for lat, lon in self.polygon)
+        return f'(poly:"{poly}")'
+
+
+REGIONS = {
+    region.name: region
+    for region in (
+        Region(
+            "nyc",
+            "New York City",
+            [
+                (40.477, -74.260),
+                (40.645, -74.260),
+                (40.645, -74.070),
+                (40.700, -74.025),
+                (40.880, -73.935),
+                (40.917, -73.915),
+                (40.917, -73.765),
+                (40.800, -73.700),
+                (40.590, -73.730),
+                (40.540, -73.940),
+            ],
+            overpass_area='area["name"="City of New York"]["boundary"="administrative"]'
+            '["admin_level"="5"]',
+            timezone="America/New_York",
+        ),
+        Region(
+            "chicago",
+            "Chicago",
+            [(41.644, -87.940), (42.023, -87.940), (42.023, -87.524), (41.644, -87.524)],
+            timezone="America/Chicago",
+        ),
+        Region(
+            "sf",
+            "San Francisco",
+            [(37.708, -122.515), (37.812, -122.515), (37.812, -122.355), (37.708, -122.355)],
+            timezone="America/Los_Angeles",
+        ),
+    )
+}
+
+
+def register(region):
+    REGIONS[region.name] = region
+
+
+def region_for_point(lat, lon):
+    return next((r.name for r in REGIONS.values() if r.contains(lat, lon)), None)
+
+
+def regions_for_bbox(bbox):
+    return [r.name for r in REGIONS.values() if r.intersects(bbox)]
+
+
+def partition_query(names):
+    # None matches the unassigned partition (no region, or region: null)
+    return {"region": {"$in": [*names, None]}}
+
+
+def bbox_partition_query(bbox):
+    """Filter for the partitions a (complete) viewport can touch."""
+    return partition_query(regions_for_bbox(bbox))
+
+
+def point_partition_query(lat, lon, margin_m=POINT_MARGIN_M):
+    """Filter for "near this point" queries; empty (every region) if it's near none."""
+    names = regions_for_bbox(bbox_around(lat, lon, margin_m))
+    return partition_query(names) if names else {}
+
+
+def timezone_for_point(lat, lon, margin_m=POINT_MARGIN_M):
+    """Time zone of the region at or near (lat, lon), else the default region's."""
+    name = region_for_point(lat, lon)
+    if name is None:
+        name = next(iter(regions_for_bbox(bbox_around(lat, lon, margin_m))), None)
+    region = REGIONS.get(name or DEFAULT_REGION)
+    return region.timezone if region else DEFAULT_TIMEZONE
+
+
+def timezone_for_bbox(bbox):
+    """Time zone for a viewport, judged at its centre; entries may be None."""
+    if None in bbox:
+        region = REGIONS.get(DEFAULT_REGION)
+        return region.timezone if region else DEFAULT_TIMEZONE
+    min_lat, max_lat, min_lon, max_lon = bbox
+    return timezone_for_point((min_lat + max_lat) / 2, (min_lon + max_lon) / 2)
+
+
+def ensure_indexes():
+    for keys in INDEXES:
+        bathrooms_collection.create_index(keys)
+
+
+def backfill_regions():
+    """Set ``region`` on bathrooms that don't have one. Returns the count."""
+    query = {"region": {"$exists": False}, "lat": {"$ne": None}, "lon": {"$ne": None}}
+    ops = [
+        UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {"region": region_for_point(doc["lat"], doc["lon"])}},
+        )
+        for doc in bathrooms_collection.find(query, {"lat": 1, "lon": 1})
+    ]
+    if not ops:
+        return 0
+    return bathrooms_collection.bulk_write(ops, ordered=False).modified_count
@@ -0,0 +1,133 @@
+"""Constant-size review summary stored on each bathroom as ``review_summary``.
+
+The detail popup only needs a star histogram, the newest few snippets and
+the last review time, so those are kept up to date on every review write
+and ``GET /api/bathrooms/<id>`` never has to ship the full ``reviews``
+array. Reviews are appended in time order, so the newest ones are always
+the tail of the list.
+"""
+
+from datetime import datetime
+from pymongo import UpdateOne
+from webapp.db import bathrooms_collection
+
+RECENT_REVIEWS = 3
+SNIPPET_CHARS = 200
+STAR_BUCKETS = 6  # 0 to 5 stars
+
+
+def star_bucket(rating):
+    try:
+        stars = int(float(rating) + 0.5)
+    except (TypeError, ValueError):
+        return 0
+    return min(STAR_BUCKETS - 1, max(0, stars))
+
+
+def snippet(review):
+    comment = review.get("comment") or ""
+    if len(comment) > SNIPPET_CHARS:
+        comment = comment[: SNIPPET_CHARS - 1].rstrip() + "…"
+    return {
+        "user_name": review.get("user_name", "Anonymous"),
+        "rating": review.get("rating"),
+        "comment": comment,
+        "created_at": review.get("created_at"),
+    }
+
+
+def _tail(reviews):
+    recent = [snippet(r) for r in reviews[-RECENT_REVIEWS:]]
+    recent.reverse()
+    last_review_at = recent[0]["created_at"] if recent else None
+    return recent, last_review_at
+
+
+def summarize_reviews(reviews):
+    """Build a summary from scratch (backfill, or docs written before summaries)."""
+    reviews = reviews or []
+    histogram = [0] * STAR_BUCKETS
+    for review in reviews:
+        histogram[star_bucket(review.get("rating"))] += 1
+    recent, last_review_at = _tail(reviews)
+    return {"histogram": histogram, "recent": recent, "last_review_at": last_review_at}
+
+
+def update_summary(summary, reviews, added=None, removed=None):
+    """Apply one review write to ``summary``.
+
+    ``reviews`` is the list after the write; ``added`` and ``removed`` are
+    the reviews that went in and out (a user editing their review is both).
+    Only the histogram is adjusted in place; the snippets are re-read from
+    the tail of ``reviews``.
+    """
+    histogram = (summary or {}).get("histogram")
+    if not histogram or len(histogram) != STAR_BUCKETS:
+        return summarize_reviews(reviews)
+    histogram = list(histogram)
+    if removed is not None:
+        bucket = star_bucket(removed.get("rating"))
+        histogram[bucket] = max(0, histogram[bucket] - 1)
+    if added is not None:
+        histogram[star_bucket(added.get("rating"))] += 1
+    recent, last_review_at = _tail(reviews)
+    return {"histogram": histogram, "recent": recent, "last_review_at": last_review_at}
+
+
+def backfill_review_summaries():
+    """Write ``review_summary`` on every bathroom. Returns the number updated."""
+    ops = [
+        UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {"review_summary": summarize_reviews(doc.get("reviews"))}},
+        )
+        for doc in bathrooms_collection.find({}, {"reviews": 1})
+    ]
+    if not ops:
+        return 0
+    return bathrooms_collection.bulk_write(ops, ordered=False).modified_count
+
+
+def parse_review(data, user):
+    """Validate a posted review. Returns ``(review, error)``."""
+    rating = data.get("rating")
+    if rating is None:
+        return None, "rating is required"
+    try:
+        rating = float(rating)
+    except (TypeError, ValueError):
+        return None, "rating must be a number"
+    if rating < 0 or rating > 5:
+        return None, "rating must be between 0 and 5"
+    return {
+        "rating": rating,
+        "comment": (data.get("comment") or "").strip(),
+        "user_name": user.get("name", "Anonymous"),
+        "user_email": user.get("email"),
+        "created_at": datetime.utcnow(),
+    }, None
+
+
+def review_write(doc, user_email, review=None):
+    """``$set`` fields replacing ``user_email``'s review with ``review``.
+
+    With no ``review`` the user's review is deleted; returns None if they
+    had none.
+    """
+    existing = doc.get("reviews", [])
+    previous = next((r for r in existing if r.get("user_email") == user_email), None)
+    if review is None and previous is None:
+        return None
+    reviews = [r for r in existing if r.get("user_email") != user_email]
+    if review is not None:
+        reviews.append(review)
+
+    ratings = [r["rating"] for r in reviews]
+    return {
+        "reviews": reviews,
+        "average_rating": sum(ratings) / len(ratings) if ratings else None,
+        "rating_count": len(reviews),
+        "review_summary": update_summary(
+            doc.get("review_summary"), reviews, added=review, removed=previous
+        ),
+    }
@@ -0,0 +1,39 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Blueprint, jsonify, request
+from webapp.db import profiles_collection
+from webapp.profiling import profiler
+
+bp = Blueprint("admin", __name__, url_prefix="/admin")
+
+# the list view leaves out the (large) call profile and command timeline
+PROFILE_SUMMARY = {"timeline": 0, "functions": 0}
+
+
+@bp.before_request
+def require_admin():
+    if not profiler.is_admin():
+        return jsonify({"error": "Admin access required"}), 403
+    return None
+
+
+@bp.route("/profiles", methods=["GET"])
+def list_profiles():
+    """Most recent request profiles, newest first."""
+    limit = max(1, min(request.args.get("limit", default=20, type=int), 200))
+    query = {}
+    if request.args.get("endpoint"):
+        query["endpoint"] = request.args["endpoint"]
+    cursor = profiles_collection.find(query, PROFILE_SUMMARY).sort("created_at", -1)
+    return jsonify({"profiles": list(cursor.limit(limit))})
+
+
+@bp.route("/profiles/<profile_id>", methods=["GET"])
+def get_profile(profile_id):
+    try:
+        doc = profiles_collection.find_one({"_id": ObjectId(profile_id)})
+    except InvalidId:
+        doc = None
+    if doc is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return jsonify(doc)
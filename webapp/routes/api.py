@@ -1,6 +1,36 @@
-from flask import Blueprint, jsonify, request, session
-from datetime import datetime
+import time
+from flask import Blueprint, Response, jsonify, request, session
+from webapp.admission import admission
+from webapp.areas import area_fields, parse_area_args
 from webapp.db import bathrooms_collection, users_collection
+from webapp.changes import (
+    changes_since,
+    compacted_floor,
+    current_seq,
+    record_change,
+)
+from webapp.display import display_fields
+from webapp.duplicates import find_duplicates, geocell
+from webapp.enrichment import enrichment_queue
+from webapp.facets import FACETS, cache_partition_index, cached_partition_index
+from webapp.facets import mongo_facet_query, parse_facet_args
+from webapp.facets import index_for_store as facet_index_for_store
+from webapp.favorites import favorite_counter
+from webapp.images import TOO_LARGE, UploadError, image_headers, image_type
+from webapp.images import open_image, store_image, upload_limit
+from webapp.ingest import ingest_ndjson
+from webapp.geo import PointIndex, bbox_around, index_for_store
+from webapp.profiling import profiler
+from webapp.opening_hours import compile_opening_hours, is_open, open_query, parse_open_args
+from webapp.regions import bbox_partition_query, point_partition_query, region_for_point
+from webapp.regions import regions_for_bbox
+from webapp.regions import timezone_for_bbox, timezone_for_point
+from webapp.reviews import parse_review, review_write, summarize_reviews
+from webapp import search
+from webapp import routing
+from webapp.store import REFRESH_SECONDS as STORE_REFRESH_SECONDS, read_model
+from webapp.stream import publisher
+from webapp.wire import parse_format_args
 
 bp = Blueprint("api", __name__, url_prefix="/api")
 
@@ -20,33 +50,461 @@ def serialize_bathroom(doc):
     }
 
 
+def serialize_bathroom_detail(doc, my_review=None):
+    """Detail popup shape: the review summary instead of every review."""
+    if not doc:
+        return {}
+    summary = doc.get("review_summary")
+    if summary is None:
+        summary = summarize_reviews(doc.get("reviews"))
+    return {
+        "osm_id": doc.get("osm_id"),
+        "lat": doc.get("lat"),
+        "lon": doc.get("lon"),
+        "tags": doc.get("tags", {}),
+        "images": doc.get("images", []),
+        "average_rating": doc.get("average_rating"),
+        "rating_count": doc.get("rating_count", 0),
+        "review_summary": summary,
+        "my_review": my_review,
+    }
+
+
+DETAIL_PROJECTION = {"_id": 0, "reviews": 0}
+
+
+def serialize_listing(doc):
+    """Lightweight shape used for map markers and list items."""
+    return {
+        "osm_id": doc.get("osm_id"),
+        "lat": doc.get("lat"),
+        "lon": doc.get("lon"),
+        "tags": doc.get("tags", {}),
+        "average_rating": doc.get("average_rating"),
+        "rating_count": doc.get("rating_count", 0),
+    }
+
+
+LISTING_PROJECTION = {
+    "_id": 0,
+    "osm_id": 1,
+    "lat": 1,
+    "lon": 1,
+    "tags": 1,
+    "average_rating": 1,
+    "rating_count": 1,
+}
+
+
+FULL_PROJECTION = {
+    **LISTING_PROJECTION,
+    "reviews": 1,
+    "images": 1,
+}
+
+# what serialize_listing / serialize_bathroom fill in for missing fields
+LISTING_DEFAULTS = {"tags": {}, "average_rating": None, "rating_count": 0}
+FULL_DEFAULTS = {**LISTING_DEFAULTS, "reviews": [], "images": []}
+
+
+def wire_rows(rows, defaults):
+    """Projected cursor rows, used as the response items without copying.
+
+    Same shape as serialize_listing (LISTING_PROJECTION) or
+    serialize_bathroom (FULL_PROJECTION); only missing fields are filled in
+    on the row itself. The empty defaults are shared, so the rows are for
+    encoding only.
+    """
+    rows = list(rows)
+    for row in rows:
+        for key, value in defaults.items():
+            row.setdefault(key, value)
+    return rows
+
+
+MAX_NEARBY_RADIUS_M = 50000
+
+SORT_SPECS = {
+    "rating": [("average_rating", -1)],
+    "reviews": [("rating_count", -1)],
+    "name": [("tags.name", 1)],
+}
+
+
+def listing_query(
+    bbox, keyword=None, facet_filters=None, open_minute=None, area_filter=None
+):
+    """Mongo filter for ``GET /bathrooms`` (bbox entries may be None).
+
+    With an ad-hoc polygon (``area_filter.query`` is None) this only covers
+    the polygon's box; the rows still go through ``area_filter.filter``.
+    """
+    query: dict = {}
+    if area_filter is not None:
+        bbox = area_filter.clip(bbox)
+    if None not in bbox:
+        min_lat, max_lat, min_lon, max_lon = bbox
+        query["lat"] = {"$gte": min_lat, "$lte": max_lat}
+        query["lon"] = {"$gte": min_lon, "$lte": max_lon}
+        query.update(bbox_partition_query(bbox))
+    if keyword:
+        query["tags.name"] = {"$regex": keyword, "$options": "i"}
+    query.update(mongo_facet_query(facet_filters or {}))
+    if open_minute is not None:
+        query.update(open_query(open_minute))
+    if area_filter is not None and area_filter.query:
+        query.update(area_filter.query)
+    return query
+
+
+def open_listing_filter(open_minute):
+    """``accept`` predicate over read-model ids, or None for no filter."""
+    if open_minute is None:
+        return None
+
+    def accept(osm_id):
+        listing = read_model.get(osm_id)
+        if listing is None:
+            return False
+        return is_open(listing.open_intervals, open_minute) is not False
+
+    return accept
+
+
+def rank_nearby(docs, lat, lon, limit, radius_m=None):
+    """Listings for the ``limit`` docs closest to (lat, lon), with ``distance_m``."""
+    by_id = {doc["osm_id"]: doc for doc in docs}
+    hits = PointIndex.from_docs(docs).nearest(lat, lon, limit, radius_m)
+    rows = []
+    for osm_id, distance in hits:
+        row = serialize_listing(by_id[osm_id])
+        row["distance_m"] = round(distance, 1)
+        rows.append(row)
+    return rows
+
+
+def read_model_nearby(lat, lon, limit, radius_m=None, open_minute=None):
+    """``nearby_listings`` answered from the (fresh) in-process read model."""
+    index = index_for_store(read_model)
+    hits = index.nearest(lat, lon, limit, radius_m, accept=open_listing_filter(open_minute))
+    rows = []
+    for osm_id, distance in hits:
+        row = read_model.get(osm_id).to_dict()
+        row["distance_m"] = round(distance, 1)
+        rows.append(row)
+    return rows
+
+
+def nearby_query(lat, lon, radius_m=None, open_minute=None):
+    query = {} if open_minute is None else open_query(open_minute)
+    if radius_m is not None:
+        query.update(listing_query(bbox_around(lat, lon, radius_m)))
+    else:
+        query.update(point_partition_query(lat, lon))
+    return query
+
+
+def nearby_listings(lat, lon, limit, radius_m=None, open_minute=None):
+    """Closest bathrooms to (lat, lon) as listings with ``distance_m``."""
+    if read_model.enabled:
+        read_model.ensure_fresh()
+        return read_model_nearby(lat, lon, limit, radius_m, open_minute)
+
+    query = nearby_query(lat, lon, radius_m, open_minute)
+    docs = list(bathrooms_collection.find(query, LISTING_PROJECTION))
+    return rank_nearby(docs, lat, lon, limit, radius_m)
+
+
+SEARCH_PROJECTION = {**LISTING_PROJECTION, "favorite_count": 1}
+SEARCH_DEFAULTS = {**LISTING_DEFAULTS, "favorite_count": 0}
+
+
+def parse_search_args(args):
+    """``(params, error)`` for ``GET /bathrooms/search``."""
+    try:
+        lat = float(args.get("lat"))
+        lon = float(args.get("lon"))
+    except (TypeError, ValueError):
+        return None, "Invalid lat/lon"
+    radius_m = args.get("radius_m", default=search.DEFAULT_RADIUS_M, type=float)
+    if radius_m is None or not 0 < radius_m <= MAX_NEARBY_RADIUS_M:
+        return None, f"radius_m must be between 0 and {MAX_NEARBY_RADIUS_M}"
+    limit = args.get("limit", default=20, type=int)
+    weights, error = search.parse_weight_args(args)
+    if error:
+        return None, error
+    open_minute, error = parse_open_args(args, timezone_for_point(lat, lon))
+    if error:
+        return None, error
+    return {
+        "lat": lat,
+        "lon": lon,
+        "radius_m": radius_m,
+        "limit": max(1, min(limit, search.MAX_LIMIT)),
+        "q": args.get("q", type=str),
+        "weights": weights,
+        "open_minute": open_minute,
+    }, None
+
+
+def read_model_search_candidates(lat, lon, radius_m, open_minute=None):
+    candidates = read_model.in_bbox(*bbox_around(lat, lon, radius_m))
+    if open_minute is not None:
+        candidates = [
+            item
+            for item in candidates
+            if is_open(item.open_intervals, open_minute) is not False
+        ]
+    return candidates
+
+
+def search_rows(hits):
+    """Listings with ``favorite_count``, ``distance_m`` and ``score``, best first."""
+    rows = []
+    for candidate, score, distance in hits:
+        if isinstance(candidate, dict):
+            row = wire_rows([candidate], SEARCH_DEFAULTS)[0]
+        else:
+            row = candidate.to_dict()
+            row["favorite_count"] = candidate.favorite_count
+        row["distance_m"] = round(distance, 1)
+        row["score"] = round(score, 4)
+        rows.append(row)
+    return rows
+
+
+def search_listings(lat, lon, radius_m, limit, q=None, weights=None, open_minute=None):
+    if read_model.enabled:
+        read_model.ensure_fresh()
+        candidates = read_model_search_candidates(lat, lon, radius_m, open_minute)
+    else:
+        query = nearby_query(lat, lon, radius_m, open_minute)
+        candidates = list(bathrooms_collection.find(query, SEARCH_PROJECTION))
+    hits = search.rank(candidates, lat, lon, limit, q, weights, radius_m)
+    return search_rows(hits)
+
+
+def walking_listings(lat, lon, k, open_minute=None):
+    """Bathrooms with the shortest walking time, or None without a street graph."""
+    engine = routing.engine
+    if engine is None:
+        return None
+
+    # Re-snap bathrooms onto the graph when the dataset may have changed.
+    now = time.monotonic()
+    if read_model.enabled:
+        read_model.ensure_fresh()
+        if engine.targets_version != read_model.version:
+            engine.set_bathrooms(listing.to_dict() for listing in read_model.listings())
+            engine.targets_version = read_model.version
+    elif now - engine.targets_loaded_at >= STORE_REFRESH_SECONDS:
+        engine.set_bathrooms(bathrooms_collection.find({}, LISTING_PROJECTION))
+        engine.targets_loaded_at = now
+
+    accept = None
+    if open_minute is not None:
+        if read_model.enabled:
+            accept = open_listing_filter(open_minute)
+        else:
+            # only bathrooms the search could reach need checking
+            query = nearby_query(lat, lon, routing.MAX_WALK_RADIUS_M, open_minute)
+            cursor = bathrooms_collection.find(query, {"osm_id": 1})
+            accept = {doc["osm_id"] for doc in cursor}.__contains__
+
+    hits = engine.nearest_bathrooms(lat, lon, k, accept=accept)
+    by_id = {}
+    if hits:
+        ids = [osm_id for osm_id, _ in hits]
+        cursor = bathrooms_collection.find({"osm_id": {"$in": ids}}, LISTING_PROJECTION)
+        by_id = {doc["osm_id"]: doc for doc in cursor}
+    return walking_rows(hits, by_id)
+
+
+def walking_rows(hits, by_id):
+    rows = []
+    for osm_id, seconds in hits:
+        if osm_id in by_id:
+            row = serialize_listing(by_id[osm_id])
+            row["walk_seconds"] = round(seconds)
+            rows.append(row)
+    return rows
+
+
+def new_bathroom_doc(data):
+    """Document for a user-submitted bathroom. Returns ``(doc, error)``."""
+    for field in ("osm_id", "lat", "lon"):
+        if field not in data:
+            return None, f"Missing field: {field}"
+    try:
+        lat, lon = float(data["lat"]), float(data["lon"])
+    except (TypeError, ValueError):
+        return None, "lat and lon must be numbers"
+    tags = data.get("tags", {})
+    return {
+        "osm_id": data["osm_id"],
+        "lat": lat,
+        "lon": lon,
+        "geocell": geocell(lat, lon),
+        "tags": tags,
+        "region": region_for_point(lat, lon),
+        **area_fields(lat, lon),
+        "source": "user",
+        **display_fields(tags, data["osm_id"], lat, lon),
+        "reviews": [],
+        "average_rating": None,
+        "rating_count": 0,
+        "open_intervals": compile_opening_hours(tags.get("opening_hours")),
+    }, None
+
+
 @bp.route("/bathrooms/add", methods=["POST"])
 def add_bathroom():
     data = request.get_json() or {}
+    doc, error = new_bathroom_doc(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    if not data.get("force"):
+        candidates = find_duplicates(doc)
+        if candidates:
+            return jsonify(
+                {
+                    "error": "This looks like a bathroom that is already on the map",
+                    "candidates": candidates,
+                }
+            ), 409
+
+    # insert-if-absent, so adding the same osm_id twice can't duplicate it
+    result = bathrooms_collection.update_one(
+        {"osm_id": doc["osm_id"]}, {"$setOnInsert": doc}, upsert=True
+    )
+    if result.upserted_id is None:
+        return jsonify({"error": "Bathroom already exists"}), 409
+    record_change(doc["osm_id"])
+    read_model.upsert(doc)
+    # address tags are looked up in the background
+    enrichment_queue.enqueue(doc)
 
-    required = ["osm_id", "lat", "lon"]
-    for field in required:
-        if field not in data:
-            return jsonify({"error": f"Missing field: {field}"}), 400
+    return jsonify({"message": "Bathroom added!", "bathroom": data}), 201
 
-    bathrooms_collection.insert_one(
+
+@bp.route("/bathrooms/bulk", methods=["POST"])
+def bulk_ingest_bathrooms():
+    """Upsert bathrooms from a streamed NDJSON body (one object per line)."""
+    if not session.get("user"):
+        return jsonify({"error": "User not logged in"}), 401
+    return jsonify(ingest_ndjson(request.stream))
+
+
+@bp.route("/bathrooms/full")
+def get_bathrooms_full():
+    bathrooms = wire_rows(bathrooms_collection.find({}, FULL_PROJECTION), FULL_DEFAULTS)
+    return jsonify({"bathrooms": bathrooms})
+
+
+@bp.route("/bathrooms/changes", methods=["GET"])
+def get_bathroom_changes():
+    """Upserts and deletions since ``since`` for clients keeping a local replica."""
+    since = request.args.get("since", default=0, type=int)
+    limit = request.args.get("limit", default=1000, type=int)
+    limit = max(1, min(limit, 5000))
+
+    # No replica yet, or the tombstones it would need are compacted away.
+    if since <= 0 or since < compacted_floor():
+        return jsonify(
+            {"reset": True, "seq": current_seq(), "upserts": [], "deletions": []}
+        )
+
+    changes = changes_since(since, limit + 1)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    upsert_ids = [c["osm_id"] for c in changes if c.get("op") != "delete"]
+    deletions = [c["osm_id"] for c in changes if c.get("op") == "delete"]
+    upserts = []
+    if upsert_ids:
+        cursor = bathrooms_collection.find(
+            {"osm_id": {"$in": upsert_ids}}, LISTING_PROJECTION
+        )
+        upserts = [serialize_listing(doc) for doc in cursor]
+
+    return jsonify(
         {
-            "osm_id": data["osm_id"],
-            "lat": data["lat"],
-            "lon": data["lon"],
-            "tags": data.get("tags", {}),
-            "reviews": [],
-            "average_rating": None,
-            "rating_count": 0,
+            "reset": False,
+            "seq": changes[-1]["seq"] if changes else since,
+            "has_more": has_more,
+            "upserts": upserts,
+            "deletions": deletions,
         }
     )
 
-    return jsonify({"message": "Bathroom added!", "bathroom": data}), 201
 
+@bp.route("/stream", methods=["GET"])
+def stream_updates():
+    """The live stream is served by the ASGI app only.
 
-@bp.route("/bathrooms/full")
-def get_bathrooms_full():
-    bathrooms = [serialize_bathroom(doc) for doc in bathrooms_collection.find()]
+    A sync SSE response would hold this worker thread for as long as the
+    client stays connected.
+    """
+    return jsonify({"error": "Live updates are served by the ASGI app (webapp.asgi)"}), 501
+
+
+@bp.route("/admission", methods=["GET"])
+def get_admission_stats():
+    """Counters for admitted, throttled and shed API requests (admins only)."""
+    if not profiler.is_admin():
+        return jsonify({"error": "Admin access required"}), 403
+    return jsonify(admission.stats())
+
+
+@bp.route("/bathrooms/nearby", methods=["GET"])
+def get_nearby_bathrooms():
+    try:
+        lat = float(request.args.get("lat"))
+        lon = float(request.args.get("lon"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid lat/lon"}), 400
+
+    radius_m = request.args.get("radius_m", default=1000, type=float)
+    if radius_m is None or not 0 < radius_m <= MAX_NEARBY_RADIUS_M:
+        return jsonify(
+            {"error": f"radius_m must be between 0 and {MAX_NEARBY_RADIUS_M}"}
+        ), 400
+    limit = request.args.get("limit", default=20, type=int)
+    limit = max(1, min(limit, 500))
+    open_minute, error = parse_open_args(request.args, timezone_for_point(lat, lon))
+    if error:
+        return jsonify({"error": error}), 400
+
+    rows = nearby_listings(lat, lon, limit, radius_m, open_minute)
+    return jsonify({"bathrooms": rows})
+
+
+@bp.route("/bathrooms/search", methods=["GET"])
+def search_bathrooms():
+    """Bathrooms near a point ranked by distance, rating, favorites and ``q``."""
+    params, error = parse_search_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify({"bathrooms": search_listings(**params)})
+
+
+@bp.route("/bathrooms/nearest-walk", methods=["GET"])
+def get_walking_nearest():
+    try:
+        lat = float(request.args.get("lat"))
+        lon = float(request.args.get("lon"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid lat/lon"}), 400
+    k = request.args.get("k", default=5, type=int)
+    k = max(1, min(k, 50))
+    open_minute, error = parse_open_args(request.args, timezone_for_point(lat, lon))
+    if error:
+        return jsonify({"error": error}), 400
+
+    bathrooms = walking_listings(lat, lon, k, open_minute)
+    if bathrooms is None:
+        return jsonify({"error": "Walking routes are not configured"}), 503
     return jsonify({"bathrooms": bathrooms})
 
 
@@ -56,10 +514,24 @@ def get_bathroom_detail(osm_id):
         osm_id = int(osm_id)
     except ValueError:
         return jsonify({"error": "Invalid osm_id"}), 400
-    doc = bathrooms_collection.find_one({"osm_id": osm_id})
+    doc = bathrooms_collection.find_one({"osm_id": osm_id}, DETAIL_PROJECTION)
     if not doc:
         return jsonify({"error": "Bathroom not found"}), 404
-    return jsonify(serialize_bathroom(doc))
+    if "review_summary" not in doc and doc.get("rating_count"):
+        # written before summaries existed; fall back to the full list once
+        full = bathrooms_collection.find_one({"osm_id": osm_id}, {"reviews": 1})
+        doc["review_summary"] = summarize_reviews(full.get("reviews"))
+
+    my_review = None
+    user_email = (session.get("user") or {}).get("email")
+    if user_email:
+        mine = bathrooms_collection.find_one(
+            {"osm_id": osm_id},
+            {"reviews": {"$elemMatch": {"user_email": user_email}}},
+        )
+        if mine and mine.get("reviews"):
+            my_review = mine["reviews"][0]
+    return jsonify(serialize_bathroom_detail(doc, my_review))
 
 
 @bp.route("/bathrooms/<string:osm_id>/reviews", methods=["GET"])
@@ -91,49 +563,19 @@ def add_bathroom_review(osm_id):
     if not user_email:
         return jsonify({"error": "User not logged in"}), 401
 
-    data = request.get_json() or {}
-    rating = data.get("rating")
-    comment = (data.get("comment") or "").strip()
-
-    if rating is None:
-        return jsonify({"error": "rating is required"}), 400
-    try:
-        rating = float(rating)
-    except (TypeError, ValueError):
-        return jsonify({"error": "rating must be a number"}), 400
-    if rating < 0 or rating > 5:
-        return jsonify({"error": "rating must be between 0 and 5"}), 400
-
-    review = {
-        "rating": rating,
-        "comment": comment,
-        "user_name": user.get("name", "Anonymous"),
-        "user_email": user.get("email"),
-        "created_at": datetime.utcnow().isoformat() + "Z",
-    }
-
-    existing_reviews = doc.get("reviews", [])
-    new_reviews = [r for r in existing_reviews if r.get("user_email") != user_email]
-    new_reviews.append(review)
-
-    # Recalculate average and count
-    ratings = [r["rating"] for r in new_reviews]
-    new_avg = sum(ratings) / len(ratings)
-    new_count = len(new_reviews)
+    review, error = parse_review(request.get_json() or {}, user)
+    if error:
+        return jsonify({"error": error}), 400
 
     bathrooms_collection.update_one(
-        {"osm_id": osm_id},
-        {
-            "$set": {
-                "reviews": new_reviews,
-                "average_rating": new_avg,
-                "rating_count": new_count,
-            }
-        },
+        {"osm_id": osm_id}, {"$set": review_write(doc, user_email, review)}
     )
+    record_change(osm_id)
 
     updated = bathrooms_collection.find_one({"osm_id": osm_id})
-    return jsonify(serialize_bathroom(updated)), 201
+    publisher.publish(updated)
+    read_model.upsert(updated)
+    return jsonify(serialize_bathroom_detail(updated, review)), 201
 
 
 @bp.route("/bathrooms", methods=["GET"])
@@ -146,48 +588,107 @@ def get_bathrooms():
     keyword = request.args.get("q", type=str)
     sort_param = request.args.get("sort", type=str)
     limit = request.args.get("limit", default=2000, type=int)
+    facet_filters = parse_facet_args(request.args)
+    bbox = (min_lat, max_lat, min_lon, max_lon)
+    open_minute, error = parse_open_args(request.args, timezone_for_bbox(bbox))
+    if error:
+        return jsonify({"error": error}), 400
+    area_filter, error = parse_area_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    compact, error = parse_format_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    if read_model.enabled:
+        read_model.ensure_fresh()
+        bbox = None
+        if None not in (min_lat, max_lat, min_lon, max_lon):
+            bbox = (min_lat, max_lat, min_lon, max_lon)
+        listings = read_model.query(
+            bbox, keyword, sort_param, limit, facet_filters, open_minute, area_filter
+        )
+        if compact:
+            return jsonify(compact.encode(listings, read_model.seq))
+        return jsonify(
+            {
+                "bathrooms": [listing.to_dict() for listing in listings],
+                "seq": read_model.seq,
+            }
+        )
 
-    query: dict = {}
-
-    if None not in (min_lat, max_lat, min_lon, max_lon):
-        query["lat"] = {"$gte": min_lat, "$lte": max_lat}
-        query["lon"] = {"$gte": min_lon, "$lte": max_lon}
-
-    if keyword:
-        query["tags.name"] = {"$regex": keyword, "$options": "i"}
-
-    sort_spec = None
-    if sort_param == "rating":
-        sort_spec = [("average_rating", -1)]
-    elif sort_param == "reviews":
-        sort_spec = [("rating_count", -1)]
-    elif sort_param == "name":
-        sort_spec = [("tags.name", 1)]
+    bbox = (min_lat, max_lat, min_lon, max_lon)
+    query = listing_query(bbox, keyword, facet_filters, open_minute, area_filter)
+    sort_spec = SORT_SPECS.get(sort_param)
+    in_polygon = area_filter is not None and area_filter.query is None
 
-    cursor = bathrooms_collection.find(query)
+    # Read the head before querying so a replica seeded from this response
+    # re-applies, rather than misses, writes that race with the query.
+    seq = current_seq()
+    projection = (compact and compact.projection) or LISTING_PROJECTION
+    cursor = bathrooms_collection.find(query, projection)
 
     if sort_spec:
         cursor = cursor.sort(sort_spec)
 
-    if limit and limit > 0:
+    if limit and limit > 0 and not in_polygon:
         cursor = cursor.limit(limit)
 
-    docs = list(cursor)
+    bathrooms = wire_rows(cursor, LISTING_DEFAULTS)
+    if in_polygon:
+        bathrooms = area_filter.filter(bathrooms)
+        if limit and limit > 0:
+            bathrooms = bathrooms[:limit]
 
-    bathrooms = []
-    for doc in docs:
-        bathrooms.append(
-            {
-                "osm_id": doc.get("osm_id"),
-                "lat": doc.get("lat"),
-                "lon": doc.get("lon"),
-                "tags": doc.get("tags", {}),
-                "average_rating": doc.get("average_rating"),
-                "rating_count": doc.get("rating_count", 0),
-            }
-        )
+    if compact:
+        return jsonify(compact.encode(bathrooms, seq))
+    return jsonify({"bathrooms": bathrooms, "seq": seq})
 
-    return jsonify({"bathrooms": bathrooms})
+
+FACET_PROJECTION = {"osm_id": 1, "lat": 1, "lon": 1, **{f"tags.{f}": 1 for f in FACETS}}
+
+
+def facet_partition(bbox):
+    """Key of the cached facet index for a viewport: the regions it touches."""
+    return None if bbox is None else tuple(regions_for_bbox(bbox))
+
+
+def facet_query(bbox):
+    """Every bathroom in the viewport's region partition (the same clause
+    ``listing_query`` uses); the viewport itself is cut out with bitsets."""
+    return {} if bbox is None else bbox_partition_query(bbox)
+
+
+@bp.route("/bathrooms/facets", methods=["GET"])
+def get_bathroom_facets():
+    """Counts per tag value for the bathrooms in a viewport."""
+    bbox = tuple(
+        request.args.get(name, type=float)
+        for name in ("min_lat", "max_lat", "min_lon", "max_lon")
+    )
+    if None in bbox:
+        bbox = None
+    facet_filters = parse_facet_args(request.args)
+
+    if read_model.enabled:
+        read_model.ensure_fresh()
+        index = facet_index_for_store(read_model)
+    else:
+        # One projected query per region partition and change-log seq;
+        # everything after it is bitwise.
+        partition, seq = facet_partition(bbox), current_seq()
+        index = cached_partition_index(partition, seq)
+        if index is None:
+            rows = bathrooms_collection.find(facet_query(bbox), FACET_PROJECTION)
+            index = cache_partition_index(partition, seq, rows)
+
+    base = index.bbox_bits(*bbox) if bbox else index.all
+    return jsonify(
+        {
+            "total": index.count(index.filter_bits(facet_filters, base)),
+            "facets": index.counts(base, facet_filters),
+        }
+    )
 
 
 @bp.route("/my-reviews", methods=["GET"])
@@ -237,36 +738,43 @@ def delete_bathroom_review(osm_id):
     if not user_email:
         return jsonify({"error": "User not logged in"}), 401
 
-    existing_reviews = doc.get("reviews", [])
-
-    remaining_reviews = [
-        r for r in existing_reviews if r.get("user_email") != user_email
-    ]
-
-    if len(remaining_reviews) == len(existing_reviews):
+    update = review_write(doc, user_email)
+    if update is None:
         return jsonify({"message": "No review from this user to delete."}), 200
 
-    if remaining_reviews:
-        ratings = [r["rating"] for r in remaining_reviews]
-        new_avg = sum(ratings) / len(ratings)
-        new_count = len(remaining_reviews)
-    else:
-        new_avg = None
-        new_count = 0
-
-    bathrooms_collection.update_one(
-        {"osm_id": osm_id},
-        {
-            "$set": {
-                "reviews": remaining_reviews,
-                "average_rating": new_avg,
-                "rating_count": new_count,
-            }
-        },
-    )
+    bathrooms_collection.update_one({"osm_id": osm_id}, {"$set": update})
+    record_change(osm_id)
 
     updated = bathrooms_collection.find_one({"osm_id": osm_id})
-    return jsonify(serialize_bathroom(updated)), 200
+    publisher.publish(updated)
+    read_model.upsert(updated)
+    return jsonify(serialize_bathroom_detail(updated)), 200
+
+
+def receive_image(osm_id, user):
+    """Stream the request's image (raw body or multipart ``image``) into storage."""
+    metadata = {"osm_id": osm_id, "uploaded_by": user.get("email")}
+    limit = upload_limit(request.mimetype)
+    if request.content_length is not None and request.content_length > limit:
+        raise UploadError(TOO_LARGE, 413)
+    if request.mimetype == "multipart/form-data":
+        # werkzeug spools large parts to a temporary file, so parsing stays bounded
+        request.max_content_length = limit
+        part = request.files.get("image")
+        if part is None:
+            raise UploadError("No image data provided", 400)
+        return store_image(part.stream, part.mimetype, None, metadata)
+    return store_image(request.stream, request.mimetype, request.content_length, metadata)
+
+
+@bp.route("/images/<string:sha256>", methods=["GET"])
+def get_image(sha256):
+    if sha256 in request.if_none_match:
+        return Response(status=304)
+    grid_out = open_image(sha256)
+    if grid_out is None:
+        return jsonify({"error": "Image not found"}), 404
+    return Response(grid_out, mimetype=image_type(grid_out), headers=image_headers(grid_out))
 
 
 @bp.route("/bathrooms/<string:osm_id>/images", methods=["POST"])
@@ -284,15 +792,21 @@ def add_bathroom_image(osm_id):
     if not user:
         return jsonify({"error": "User not logged in"}), 401
 
-    data = request.get_json() or {}
-    image_data = data.get("image")
-
-    if not image_data:
-        return jsonify({"error": "No image data provided"}), 400
+    if request.is_json:
+        # older clients: the image as a base64 data URL, stored inline
+        image_data = (request.get_json() or {}).get("image")
+        if not image_data:
+            return jsonify({"error": "No image data provided"}), 400
+    else:
+        try:
+            image_data = receive_image(osm_id, user)["url"]
+        except UploadError as exc:
+            return jsonify({"error": str(exc)}), exc.status
 
     bathrooms_collection.update_one(
-        {"osm_id": osm_id}, {"$push": {"images": image_data}}
+        {"osm_id": osm_id}, {"$addToSet": {"images": image_data}}
     )
+    record_change(osm_id)
 
     updated = bathrooms_collection.find_one({"osm_id": osm_id})
     return jsonify(serialize_bathroom(updated)), 201
@@ -322,15 +836,14 @@ def add_favorite(osm_id):
     if not user:
         return jsonify({"error": "User not logged in"}), 401
 
-    # Check if already favorited to avoid double counting
-    user_doc = users_collection.find_one({"email": user["email"], "favorites": osm_id})
-    if not user_doc:
-        users_collection.update_one(
-            {"email": user["email"]}, {"$addToSet": {"favorites": osm_id}}
-        )
-        bathrooms_collection.update_one(
-            {"osm_id": osm_id}, {"$inc": {"favorite_count": 1}}
-        )
+    # The filter makes this a no-op when already favorited, so
+    # modified_count tells us whether to count it without a separate read.
+    result = users_collection.update_one(
+        {"email": user["email"], "favorites": {"$ne": osm_id}},
+        {"$addToSet": {"favorites": osm_id}},
+    )
+    if result.modified_count:
+        favorite_counter.add(osm_id, 1)
 
     return jsonify({"message": "Added to favorites", "osm_id": osm_id}), 200
 
@@ -346,15 +859,12 @@ def remove_favorite(osm_id):
     if not user:
         return jsonify({"error": "User not logged in"}), 401
 
-    # Check if favorited
-    user_doc = users_collection.find_one({"email": user["email"], "favorites": osm_id})
-    if user_doc:
-        users_collection.update_one(
-            {"email": user["email"]}, {"$pull": {"favorites": osm_id}}
-        )
-        bathrooms_collection.update_one(
-            {"osm_id": osm_id}, {"$inc": {"favorite_count": -1}}
-        )
+    result = users_collection.update_one(
+        {"email": user["email"], "favorites": osm_id},
+        {"$pull": {"favorites": osm_id}},
+    )
+    if result.modified_count:
+        favorite_counter.add(osm_id, -1)
 
     return jsonify({"message": "Removed from favorites", "osm_id": osm_id}), 200
 
@@ -367,9 +877,16 @@ def get_recommendations():
     except (TypeError, ValueError):
         return jsonify({"error": "Invalid lat/lon"}), 400
 
+    open_minute, error = parse_open_args(request.args, timezone_for_point(lat, lon))
+    if error:
+        return jsonify({"error": error}), 400
+    open_filter = {} if open_minute is None else open_query(open_minute)
+    # rankings are for the region the user is in
+    open_filter.update(point_partition_query(lat, lon))
+
     # Top Rated (highest average_rating, min 1 review)
     top_rated_cursor = (
-        bathrooms_collection.find({"average_rating": {"$ne": None}})
+        bathrooms_collection.find({"average_rating": {"$ne": None}, **open_filter})
         .sort("average_rating", -1)
         .limit(5)
     )
@@ -377,45 +894,17 @@ def get_recommendations():
 
     # Most Favorited (highest favorite_count)
     most_favorited_cursor = (
-        bathrooms_collection.find({"favorite_count": {"$gt": 0}})
+        bathrooms_collection.find({"favorite_count": {"$gt": 0}, **open_filter})
         .sort("favorite_count", -1)
         .limit(5)
     )
     most_favorited = [serialize_bathroom(doc) for doc in most_favorited_cursor]
 
-    all_bathrooms = list(
-        bathrooms_collection.find(
-            {},
-            {
-                "osm_id": 1,
-                "lat": 1,
-                "lon": 1,
-                "tags": 1,
-                "average_rating": 1,
-                "rating_count": 1,
-            },
-        )
-    )
-
-    for b in all_bathrooms:
-        # Simple squared euclidean distance is enough for sorting
-        b["dist_sq"] = (b["lat"] - lat) ** 2 + (b["lon"] - lon) ** 2
-
-    all_bathrooms.sort(key=lambda x: x["dist_sq"])
-    nearest_docs = all_bathrooms[:5]
-
-    nearest = []
-    for doc in nearest_docs:
-        nearest.append(
-            {
-                "osm_id": doc.get("osm_id"),
-                "lat": doc.get("lat"),
-                "lon": doc.get("lon"),
-                "tags": doc.get("tags", {}),
-                "average_rating": doc.get("average_rating"),
-                "rating_count": doc.get("rating_count", 0),
-            }
-        )
+    # Walking time when a street graph is loaded, straight-line otherwise (also
+    # when the user is off the graph's extract and the walk search finds nothing)
+    nearest = walking_listings(lat, lon, 5, open_minute)
+    if not nearest:
+        nearest = nearby_listings(lat, lon, 5, open_minute=open_minute)
 
     return jsonify(
         {"top_rated": top_rated, "most_favorited": most_favorited, "nearest": nearest}
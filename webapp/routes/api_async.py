@@ -0,0 +1,672 @@
+"""Asyncio twin of ``webapp.routes.api`` for the ASGI app (``webapp.asgi``).
+
+Same routes and response shapes; Mongo is reached through the native async
+driver so a worker keeps serving other requests while a query is in
+flight. Query building and serialization are shared with the sync module.
+Bookkeeping that only exists as sync helpers (the change log, read-model
+refresh) runs via ``asyncio.to_thread``; in-memory work runs inline.
+"""
+
+import asyncio
+import time
+from quart import Blueprint, Response, jsonify, request, session
+from webapp.admission import admission
+from webapp.areas import parse_area_args
+from webapp.changes import changes_since, compacted_floor, current_seq, record_change
+from webapp.db_async import bathrooms_collection, users_collection
+from webapp.duplicates import CANDIDATE_PROJECTION, candidate_query, ensure_geocells
+from webapp.duplicates import rank_candidates
+from webapp.enrichment import enrichment_queue
+from webapp.facets import cache_partition_index, cached_partition_index, parse_facet_args
+from webapp.facets import index_for_store as facet_index_for_store
+from webapp.favorites import favorite_counter
+from webapp.images import TOO_LARGE, ImageUpload, UploadError, image_headers, open_image
+from webapp.images import image_type, store_image, upload_limit
+from webapp.ingest import BulkIngest, ChunkLines
+from webapp.profiling import profiler
+from webapp.opening_hours import open_query, parse_open_args
+from webapp import routing
+from webapp.regions import point_partition_query, timezone_for_bbox, timezone_for_point
+from webapp.reviews import parse_review, review_write, summarize_reviews
+from webapp import search
+from webapp.routes.api import (
+    DETAIL_PROJECTION,
+    FACET_PROJECTION,
+    FULL_DEFAULTS,
+    FULL_PROJECTION,
+    LISTING_DEFAULTS,
+    LISTING_PROJECTION,
+    MAX_NEARBY_RADIUS_M,
+    SEARCH_PROJECTION,
+    SORT_SPECS,
+    facet_partition,
+    facet_query,
+    listing_query,
+    nearby_query,
+    new_bathroom_doc,
+    open_listing_filter,
+    parse_search_args,
+    rank_nearby,
+    read_model_nearby,
+    read_model_search_candidates,
+    search_rows,
+    serialize_bathroom,
+    serialize_bathroom_detail,
+    serialize_listing,
+    walking_rows,
+    wire_rows,
+)
+from webapp.store import REFRESH_SECONDS as STORE_REFRESH_SECONDS, read_model
+from webapp.stream import async_event_stream, publisher
+from webapp.wire import parse_format_args
+
+bp = Blueprint("api", __name__, url_prefix="/api")
+
+
+async def fresh_read_model():
+    """True when the read model is on; refreshes it off the event loop."""
+    if not read_model.enabled:
+        return False
+    await asyncio.to_thread(read_model.ensure_fresh)
+    return True
+
+
+async def nearby_listings(lat, lon, limit, radius_m=None, open_minute=None):
+    if await fresh_read_model():
+        return read_model_nearby(lat, lon, limit, radius_m, open_minute)
+    query = nearby_query(lat, lon, radius_m, open_minute)
+    docs = await bathrooms_collection.find(query, LISTING_PROJECTION).to_list()
+    return rank_nearby(docs, lat, lon, limit, radius_m)
+
+
+async def search_listings(
+    lat, lon, radius_m, limit, q=None, weights=None, open_minute=None
+):
+    if await fresh_read_model():
+        candidates = read_model_search_candidates(lat, lon, radius_m, open_minute)
+    else:
+        query = nearby_query(lat, lon, radius_m, open_minute)
+        candidates = await bathrooms_collection.find(query, SEARCH_PROJECTION).to_list()
+    hits = search.rank(candidates, lat, lon, limit, q, weights, radius_m)
+    return search_rows(hits)
+
+
+async def walking_listings(lat, lon, k, open_minute=None):
+    engine = routing.engine
+    if engine is None:
+        return None
+
+    now = time.monotonic()
+    if await fresh_read_model():
+        if engine.targets_version != read_model.version:
+            engine.set_bathrooms(listing.to_dict() for listing in read_model.listings())
+            engine.targets_version = read_model.version
+    elif now - engine.targets_loaded_at >= STORE_REFRESH_SECONDS:
+        docs = await bathrooms_collection.find({}, LISTING_PROJECTION).to_list()
+        engine.set_bathrooms(docs)
+        engine.targets_loaded_at = now
+
+    accept = None
+    if open_minute is not None:
+        if read_model.enabled:
+            accept = open_listing_filter(open_minute)
+        else:
+            query = nearby_query(lat, lon, routing.MAX_WALK_RADIUS_M, open_minute)
+            cursor = bathrooms_collection.find(query, {"osm_id": 1})
+            accept = {doc["osm_id"] async for doc in cursor}.__contains__
+
+    hits = engine.nearest_bathrooms(lat, lon, k, accept=accept)
+    by_id = {}
+    if hits:
+        ids = [osm_id for osm_id, _ in hits]
+        cursor = bathrooms_collection.find({"osm_id": {"$in": ids}}, LISTING_PROJECTION)
+        by_id = {doc["osm_id"]: doc async for doc in cursor}
+    return walking_rows(hits, by_id)
+
+
+async def after_write(osm_id, publish=True):
+    """Change log, live stream and read model for a bathroom that just changed."""
+    await asyncio.to_thread(record_change, osm_id)
+    updated = await bathrooms_collection.find_one({"osm_id": osm_id})
+    if publish:
+        publisher.publish(updated)
+        read_model.upsert(updated)
+    return updated
+
+
+@bp.route("/bathrooms/add", methods=["POST"])
+async def add_bathroom():
+    data = await request.get_json() or {}
+    doc, error = new_bathroom_doc(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    if not data.get("force"):
+        await asyncio.to_thread(ensure_geocells)
+        query = candidate_query(doc["lat"], doc["lon"])
+        nearby = await bathrooms_collection.find(query, CANDIDATE_PROJECTION).to_list()
+        candidates = rank_candidates(doc, nearby)
+        if candidates:
+            return jsonify(
+                {
+                    "error": "This looks like a bathroom that is already on the map",
+                    "candidates": candidates,
+                }
+            ), 409
+
+    result = await bathrooms_collection.update_one(
+        {"osm_id": doc["osm_id"]}, {"$setOnInsert": doc}, upsert=True
+    )
+    if result.upserted_id is None:
+        return jsonify({"error": "Bathroom already exists"}), 409
+    await asyncio.to_thread(record_change, doc["osm_id"])
+    read_model.upsert(doc)
+    await asyncio.to_thread(enrichment_queue.enqueue, doc)
+
+    return jsonify({"message": "Bathroom added!", "bathroom": data}), 201
+
+
+@bp.route("/bathrooms/bulk", methods=["POST"])
+async def bulk_ingest_bathrooms():
+    if not session.get("user"):
+        return jsonify({"error": "User not logged in"}), 401
+
+    # the body is consumed incrementally, so Quart's whole-body cap doesn't apply
+    request.max_content_length = None
+    ingest = BulkIngest()
+    lines = ChunkLines()
+    async for chunk in request.body:
+        for line_number, line in lines.feed(chunk):
+            if ingest.add(line_number, line):
+                await asyncio.to_thread(ingest.flush)
+    for line_number, line in lines.finish():
+        ingest.add(line_number, line)
+    await asyncio.to_thread(ingest.flush)
+    return jsonify(ingest.report())
+
+
+@bp.route("/bathrooms/full")
+async def get_bathrooms_full():
+    cursor = bathrooms_collection.find({}, FULL_PROJECTION)
+    bathrooms = wire_rows(await cursor.to_list(), FULL_DEFAULTS)
+    return jsonify({"bathrooms": bathrooms})
+
+
+@bp.route("/bathrooms/changes", methods=["GET"])
+async def get_bathroom_changes():
+    since = request.args.get("since", default=0, type=int)
+    limit = request.args.get("limit", default=1000, type=int)
+    limit = max(1, min(limit, 5000))
+
+    if since <= 0 or since < await asyncio.to_thread(compacted_floor):
+        seq = await asyncio.to_thread(current_seq)
+        return jsonify({"reset": True, "seq": seq, "upserts": [], "deletions": []})
+
+    changes = await asyncio.to_thread(changes_since, since, limit + 1)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    upsert_ids = [c["osm_id"] for c in changes if c.get("op") != "delete"]
+    deletions = [c["osm_id"] for c in changes if c.get("op") == "delete"]
+    upserts = []
+    if upsert_ids:
+        cursor = bathrooms_collection.find(
+            {"osm_id": {"$in": upsert_ids}}, LISTING_PROJECTION
+        )
+        upserts = [serialize_listing(doc) async for doc in cursor]
+
+    return jsonify(
+        {
+            "reset": False,
+            "seq": changes[-1]["seq"] if changes else since,
+            "has_more": has_more,
+            "upserts": upserts,
+            "deletions": deletions,
+        }
+    )
+
+
+@bp.route("/stream", methods=["GET"])
+async def stream_updates():
+    bbox = tuple(
+        request.args.get(name, type=float)
+        for name in ("min_lat", "max_lat", "min_lon", "max_lon")
+    )
+    if None in bbox:
+        bbox = None
+
+    sub = publisher.subscribe(bbox)
+    if sub is None:
+        return jsonify({"error": "Too many live connections"}), 503
+
+    response = Response(
+        async_event_stream(sub),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    response.timeout = None
+    return response
+
+
+@bp.route("/admission", methods=["GET"])
+async def get_admission_stats():
+    # passed explicitly, is_admin() would read Flask's session otherwise
+    if not profiler.is_admin(session.get("user") or {}):
+        return jsonify({"error": "Admin access required"}), 403
+    return jsonify(admission.stats())
+
+
+@bp.route("/bathrooms/nearby", methods=["GET"])
+async def get_nearby_bathrooms():
+    try:
+        lat = float(request.args.get("lat"))
+        lon = float(request.args.get("lon"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid lat/lon"}), 400
+
+    radius_m = request.args.get("radius_m", default=1000, type=float)
+    if radius_m is None or not 0 < radius_m <= MAX_NEARBY_RADIUS_M:
+        return jsonify(
+            {"error": f"radius_m must be between 0 and {MAX_NEARBY_RADIUS_M}"}
+        ), 400
+    limit = request.args.get("limit", default=20, type=int)
+    limit = max(1, min(limit, 500))
+    open_minute, error = parse_open_args(request.args, timezone_for_point(lat, lon))
+    if error:
+        return jsonify({"error": error}), 400
+
+    rows = await nearby_listings(lat, lon, limit, radius_m, open_minute)
+    return jsonify({"bathrooms": rows})
+
+
+@bp.route("/bathrooms/search", methods=["GET"])
+async def search_bathrooms():
+    params, error = parse_search_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify({"bathrooms": await search_listings(**params)})
+
+
+@bp.route("/bathrooms/nearest-walk", methods=["GET"])
+async def get_walking_nearest():
+    try:
+        lat = float(request.args.get("lat"))
+        lon = float(request.args.get("lon"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid lat/lon"}), 400
+    k = request.args.get("k", default=5, type=int)
+    k = max(1, min(k, 50))
+    open_minute, error = parse_open_args(request.args, timezone_for_point(lat, lon))
+    if error:
+        return jsonify({"error": error}), 400
+
+    rows = await walking_listings(lat, lon, k, open_minute)
+    if rows is None:
+        return jsonify({"error": "Walking routes are not configured"}), 503
+    return jsonify({"bathrooms": rows})
+
+
+@bp.route("/bathrooms/<string:osm_id>", methods=["GET"])
+async def get_bathroom_detail(osm_id):
+    try:
+        osm_id = int(osm_id)
+    except ValueError:
+        return jsonify({"error": "Invalid osm_id"}), 400
+
+    user_email = (session.get("user") or {}).get("email")
+    detail = bathrooms_collection.find_one({"osm_id": osm_id}, DETAIL_PROJECTION)
+    if user_email:
+        mine = bathrooms_collection.find_one(
+            {"osm_id": osm_id},
+            {"reviews": {"$elemMatch": {"user_email": user_email}}},
+        )
+        doc, mine = await asyncio.gather(detail, mine)
+    else:
+        doc, mine = await detail, None
+    if not doc:
+        return jsonify({"error": "Bathroom not found"}), 404
+    if "review_summary" not in doc and doc.get("rating_count"):
+        full = await bathrooms_collection.find_one({"osm_id": osm_id}, {"reviews": 1})
+        doc["review_summary"] = summarize_reviews(full.get("reviews"))
+
+    my_review = mine["reviews"][0] if mine and mine.get("reviews") else None
+    return jsonify(serialize_bathroom_detail(doc, my_review))
+
+
+@bp.route("/bathrooms/<string:osm_id>/reviews", methods=["GET"])
+async def get_bathroom_reviews(osm_id):
+    try:
+        osm_id = int(osm_id)
+    except ValueError:
+        return jsonify({"error": "Invalid osm_id"}), 400
+    doc = await bathrooms_collection.find_one({"osm_id": osm_id})
+    if not doc:
+        return jsonify({"error": "Bathroom not found"}), 404
+
+    return jsonify({"osm_id": osm_id, "reviews": doc.get("reviews", [])})
+
+
+@bp.route("/bathrooms/<string:osm_id>/reviews", methods=["POST"])
+async def add_bathroom_review(osm_id):
+    try:
+        osm_id = int(osm_id)
+    except ValueError:
+        return jsonify({"error": "Invalid osm_id"}), 400
+    doc = await bathrooms_collection.find_one({"osm_id": osm_id})
+    if not doc:
+        return jsonify({"error": "Bathroom not found"}), 404
+
+    user = session.get("user") or {}
+    user_email = user.get("email")
+    if not user_email:
+        return jsonify({"error": "User not logged in"}), 401
+
+    review, error = parse_review(await request.get_json() or {}, user)
+    if error:
+        return jsonify({"error": error}), 400
+
+    await bathrooms_collection.update_one(
+        {"osm_id": osm_id}, {"$set": review_write(doc, user_email, review)}
+    )
+    updated = await after_write(osm_id)
+    return jsonify(serialize_bathroom_detail(updated, review)), 201
+
+
+@bp.route("/bathrooms", methods=["GET"])
+async def get_bathrooms():
+    bbox = tuple(
+        request.args.get(name, type=float)
+        for name in ("min_lat", "max_lat", "min_lon", "max_lon")
+    )
+    keyword = request.args.get("q", type=str)
+    sort_param = request.args.get("sort", type=str)
+    limit = request.args.get("limit", default=2000, type=int)
+    facet_filters = parse_facet_args(request.args)
+    open_minute, error = parse_open_args(request.args, timezone_for_bbox(bbox))
+    if error:
+        return jsonify({"error": error}), 400
+    area_filter, error = parse_area_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    compact, error = parse_format_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    if await fresh_read_model():
+        listings = read_model.query(
+            None if None in bbox else bbox,
+            keyword,
+            sort_param,
+            limit,
+            facet_filters,
+            open_minute,
+            area_filter,
+        )
+        if compact:
+            return jsonify(compact.encode(listings, read_model.seq))
+        return jsonify(
+            {
+                "bathrooms": [listing.to_dict() for listing in listings],
+                "seq": read_model.seq,
+            }
+        )
+
+    seq = await asyncio.to_thread(current_seq)
+    cursor = bathrooms_collection.find(
+        listing_query(bbox, keyword, facet_filters, open_minute, area_filter),
+        (compact and compact.projection) or LISTING_PROJECTION,
+    )
+    sort_spec = SORT_SPECS.get(sort_param)
+    if sort_spec:
+        cursor = cursor.sort(sort_spec)
+    in_polygon = area_filter is not None and area_filter.query is None
+    if limit and limit > 0 and not in_polygon:
+        cursor = cursor.limit(limit)
+
+    bathrooms = wire_rows(await cursor.to_list(), LISTING_DEFAULTS)
+    if in_polygon:
+        bathrooms = area_filter.filter(bathrooms)
+        if limit and limit > 0:
+            bathrooms = bathrooms[:limit]
+    if compact:
+        return jsonify(compact.encode(bathrooms, seq))
+    return jsonify({"bathrooms": bathrooms, "seq": seq})
+
+
+@bp.route("/bathrooms/facets", methods=["GET"])
+async def get_bathroom_facets():
+    bbox = tuple(
+        request.args.get(name, type=float)
+        for name in ("min_lat", "max_lat", "min_lon", "max_lon")
+    )
+    if None in bbox:
+        bbox = None
+    facet_filters = parse_facet_args(request.args)
+
+    if await fresh_read_model():
+        index = facet_index_for_store(read_model)
+    else:
+        partition = facet_partition(bbox)
+        seq = await asyncio.to_thread(current_seq)
+        index = cached_partition_index(partition, seq)
+        if index is None:
+            cursor = bathrooms_collection.find(facet_query(bbox), FACET_PROJECTION)
+            index = cache_partition_index(partition, seq, await cursor.to_list())
+
+    base = index.bbox_bits(*bbox) if bbox else index.all
+    return jsonify(
+        {
+            "total": index.count(index.filter_bits(facet_filters, base)),
+            "facets": index.counts(base, facet_filters),
+        }
+    )
+
+
+@bp.route("/my-reviews", methods=["GET"])
+async def get_my_reviews():
+    user = session.get("user") or {}
+    user_email = user.get("email")
+    if not user_email:
+        return jsonify({"error": "User not logged in"}), 401
+
+    results = []
+    async for doc in bathrooms_collection.find({"reviews.user_email": user_email}):
+        osm_id = doc.get("osm_id")
+        bathroom_name = doc.get("tags", {}).get("name") or f"Bathroom {osm_id}"
+        for review in doc.get("reviews", []):
+            if review.get("user_email") == user_email:
+                results.append(
+                    {
+                        "osm_id": osm_id,
+                        "bathroom_name": bathroom_name,
+                        "rating": review.get("rating"),
+                        "comment": review.get("comment"),
+                        "created_at": review.get("created_at"),
+                    }
+                )
+
+    return jsonify({"reviews": results})
+
+
+@bp.route("/bathrooms/<string:osm_id>/reviews", methods=["DELETE"])
+async def delete_bathroom_review(osm_id):
+    try:
+        osm_id = int(osm_id)
+    except ValueError:
+        return jsonify({"error": "Invalid osm_id"}), 400
+
+    doc = await bathrooms_collection.find_one({"osm_id": osm_id})
+    if not doc:
+        return jsonify({"error": "Bathroom not found"}), 404
+
+    user_email = (session.get("user") or {}).get("email")
+    if not user_email:
+        return jsonify({"error": "User not logged in"}), 401
+
+    update = review_write(doc, user_email)
+    if update is None:
+        return jsonify({"message": "No review from this user to delete."}), 200
+
+    await bathrooms_collection.update_one({"osm_id": osm_id}, {"$set": update})
+    updated = await after_write(osm_id)
+    return jsonify(serialize_bathroom_detail(updated)), 200
+
+
+async def receive_image(osm_id, user):
+    """``api.receive_image`` for the ASGI app; GridFS writes run off the loop."""
+    metadata = {"osm_id": osm_id, "uploaded_by": user.get("email")}
+    limit = upload_limit(request.mimetype)
+    if request.content_length is not None and request.content_length > limit:
+        raise UploadError(TOO_LARGE, 413)
+    if request.mimetype == "multipart/form-data":
+        files = await request.files
+        part = files.get("image")
+        if part is None:
+            raise UploadError("No image data provided", 400)
+        return await asyncio.to_thread(store_image, part.stream, part.mimetype, None, metadata)
+
+    upload = ImageUpload(request.mimetype, request.content_length, metadata)
+    try:
+        async for chunk in request.body:
+            await asyncio.to_thread(upload.write, chunk)
+        return await asyncio.to_thread(upload.finish)
+    except BaseException:
+        await asyncio.to_thread(upload.abort)
+        raise
+
+
+@bp.route("/images/<string:sha256>", methods=["GET"])
+async def get_image(sha256):
+    if sha256 in request.if_none_match:
+        return Response(status=304)
+    grid_out = await asyncio.to_thread(open_image, sha256)
+    if grid_out is None:
+        return jsonify({"error": "Image not found"}), 404
+
+    async def chunks():
+        while chunk := await asyncio.to_thread(grid_out.readchunk):
+            yield chunk
+
+    return Response(chunks(), mimetype=image_type(grid_out), headers=image_headers(grid_out))
+
+
+@bp.route("/bathrooms/<string:osm_id>/images", methods=["POST"])
+async def add_bathroom_image(osm_id):
+    try:
+        osm_id = int(osm_id)
+    except ValueError:
+        return jsonify({"error": "Invalid osm_id"}), 400
+
+    doc = await bathrooms_collection.find_one({"osm_id": osm_id})
+    if not doc:
+        return jsonify({"error": "Bathroom not found"}), 404
+
+    if not session.get("user"):
+        return jsonify({"error": "User not logged in"}), 401
+
+    if request.is_json:
+        image_data = (await request.get_json() or {}).get("image")
+        if not image_data:
+            return jsonify({"error": "No image data provided"}), 400
+    else:
+        try:
+            image_data = (await receive_image(osm_id, session["user"]))["url"]
+        except UploadError as exc:
+            return jsonify({"error": str(exc)}), exc.status
+
+    await bathrooms_collection.update_one(
+        {"osm_id": osm_id}, {"$addToSet": {"images": image_data}}
+    )
+    updated = await after_write(osm_id, publish=False)
+    return jsonify(serialize_bathroom(updated)), 201
+
+
+@bp.route("/users/favorites", methods=["GET"])
+async def get_favorites():
+    user = session.get("user")
+    if not user:
+        return jsonify({"error": "User not logged in"}), 401
+
+    user_doc = await users_collection.find_one({"email": user["email"]})
+    if not user_doc:
+        return jsonify({"favorites": []})
+
+    return jsonify({"favorites": user_doc.get("favorites", [])})
+
+
+@bp.route("/users/favorites/<string:osm_id>", methods=["POST"])
+async def add_favorite(osm_id):
+    try:
+        osm_id = int(osm_id)
+    except ValueError:
+        return jsonify({"error": "Invalid osm_id"}), 400
+
+    user = session.get("user")
+    if not user:
+        return jsonify({"error": "User not logged in"}), 401
+
+    result = await users_collection.update_one(
+        {"email": user["email"], "favorites": {"$ne": osm_id}},
+        {"$addToSet": {"favorites": osm_id}},
+    )
+    if result.modified_count:
+        favorite_counter.add(osm_id, 1)
+
+    return jsonify({"message": "Added to favorites", "osm_id": osm_id}), 200
+
+
+@bp.route("/users/favorites/<string:osm_id>", methods=["DELETE"])
+async def remove_favorite(osm_id):
+    try:
+        osm_id = int(osm_id)
+    except ValueError:
+        return jsonify({"error": "Invalid osm_id"}), 400
+
+    user = session.get("user")
+    if not user:
+        return jsonify({"error": "User not logged in"}), 401
+
+    result = await users_collection.update_one(
+        {"email": user["email"], "favorites": osm_id},
+        {"$pull": {"favorites": osm_id}},
+    )
+    if result.modified_count:
+        favorite_counter.add(osm_id, -1)
+
+    return jsonify({"message": "Removed from favorites", "osm_id": osm_id}), 200
+
+
+@bp.route("/bathrooms/recommendations", methods=["GET"])
+async def get_recommendations():
+    try:
+        lat = float(request.args.get("lat"))
+        lon = float(request.args.get("lon"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid lat/lon"}), 400
+
+    open_minute, error = parse_open_args(request.args, timezone_for_point(lat, lon))
+    if error:
+        return jsonify({"error": error}), 400
+    open_filter = {} if open_minute is None else open_query(open_minute)
+    # rankings are for the region the user is in
+    open_filter.update(point_partition_query(lat, lon))
+
+    async def top(query, field):
+        cursor = bathrooms_collection.find({**query, **open_filter}).sort(field, -1)
+        return [serialize_bathroom(doc) async for doc in cursor.limit(5)]
+
+    async def nearest():
+        rows = await walking_listings(lat, lon, 5, open_minute)
+        if not rows:
+            rows = await nearby_listings(lat, lon, 5, open_minute=open_minute)
+        return rows
+
+    # The three lists are independent, so their queries overlap.
+    top_rated, most_favorited, nearest_rows = await asyncio.gather(
+        top({"average_rating": {"$ne": None}}, "average_rating"),
+        top({"favorite_count": {"$gt": 0}}, "favorite_count"),
+        nearest(),
+    )
+    return jsonify(
+        {"top_rated": top_rated, "most_favorited": most_favorited, "nearest": nearest_rows}
+    )
@@ -0,0 +1,410 @@
+"""Walking-time search over a local street graph.
+
+Optional: ``build_street_graph.py`` reads an OSM XML extract (e.g. cut with
+osmium from a Geofabrik download) once, compacts the walkable ways into CSR
+adjacency arrays and picks a few landmarks with full shortest-path trees
+(ALT). The result is one file; set ``STREET_GRAPH_PATH`` to it and each
+worker maps it read-only, so the pages are shared between workers.
+
+``nearest_bathrooms`` is an A* from the query point towards the set of
+bathrooms: a node's bound is the landmark lower bound to the closest
+bathroom, so streets leading away from every bathroom are not explored.
+It stops as soon as the k-th bathroom is settled. ``walking_seconds`` is a
+landmark-guided A* between two points.
+
+File layout (little-endian, every section 8-byte aligned)::
+
+    header     magic, version, n_nodes, n_edges, n_landmarks
+    lats, lons float64[n_nodes]
+    offsets    int64[n_nodes + 1]   node u's edges are offsets[u]:offsets[u + 1]
+    targets    int64[n_edges]
+    weights    float64[n_edges]     seconds
+    landmarks  float64[n_landmarks * n_nodes]  one distance tree per landmark
+"""
+
+import heapq
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import xml.etree.ElementTree as ET
+from array import array
+from bisect import bisect_left
+from webapp.geo import PointIndex
+
+MAGIC = b"VIVOWALK"
+VERSION = 1
+HEADER = struct.Struct("<8sIqqI")
+
+WALK_SPEED_MPS = 1.4
+# Cap on how far a search explores before giving up (seconds of walking).
+MAX_WALK_SECONDS = 45 * 60
+# Nothing farther than this in a straight line can be reached within the cap.
+MAX_WALK_RADIUS_M = MAX_WALK_SECONDS * WALK_SPEED_MPS
+LANDMARK_COUNT = 4
+
+# highway=* values pedestrians can use
+WALKABLE_HIGHWAYS = {
+    "footway", "pedestrian", "path", "steps", "living_street", "residential",
+    "service", "unclassified", "tertiary", "tertiary_link", "secondary",
+    "secondary_link", "primary", "primary_link", "track", "corridor", "cycleway",
+}
+NO_FOOT_ACCESS = {"no", "private"}
+
+logger = logging.getLogger(__name__)
+
+# populated by load_engine()
+engine = None
+
+
+def _distance_m(lat1, lon1, lat2, lon2):
+    # scalar haversine; the vectorized one has per-call NumPy overhead
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * 6371008.8 * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _is_walkable(tags):
+    if tags.get("highway") not in WALKABLE_HIGHWAYS:
+        return False
+    return tags.get("foot", tags.get("access")) not in NO_FOOT_ACCESS
+
+
+def _elements(path, tag):
+    """Top-level ``tag`` elements of an OSM file, each freed once handled."""
+    context = ET.iterparse(path, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event == "end" and elem.tag == tag:
+            yield elem
+            # everything parsed so far hangs off the root until it is cleared
+            root.clear()
+
+
+def read_osm_xml(path):
+    """Return ``(coords, ways)``: node id -> (lat, lon), and walkable node-id lists.
+
+    Two passes, so only the nodes of walkable ways are kept.
+    """
+    ways = []
+    for elem in _elements(path, "way"):
+        tags = {tag.get("k"): tag.get("v") for tag in elem.iter("tag")}
+        if _is_walkable(tags):
+            ways.append([int(nd.get("ref")) for nd in elem.iter("nd")])
+    wanted = {ref for way in ways for ref in way}
+    coords = {}
+    for elem in _elements(path, "node"):
+        osm_node = int(elem.get("id"))
+        if osm_node in wanted:
+            coords[osm_node] = (float(elem.get("lat")), float(elem.get("lon")))
+    return coords, ways
+
+
+class StreetGraph:
+    """Undirected walking graph in CSR form; edge weights are seconds."""
+
+    def __init__(self, coords, ways):
+        index = {}
+        lats, lons = array("d"), array("d")
+        edges = {}
+
+        def node(osm_node):
+            i = index.get(osm_node)
+            if i is None:
+                i = index[osm_node] = len(lats)
+                lat, lon = coords[osm_node]
+                lats.append(lat)
+                lons.append(lon)
+            return i
+
+        for way in ways:
+            refs = [ref for ref in way if ref in coords]
+            for a, b in zip(refs, refs[1:]):
+                u, v = node(a), node(b)
+                if u == v:
+                    continue
+                seconds = _distance_m(lats[u], lons[u], lats[v], lons[v]) / WALK_SPEED_MPS
+                for x, y in ((u, v), (v, u)):
+                    edges.setdefault(x, {})
+                    if seconds < edges[x].get(y, math.inf):
+                        edges[x][y] = seconds
+
+        offsets = array("q", [0])
+        targets = array("q")
+        weights = array("d")
+        for u in range(len(lats)):
+            for v, seconds in edges.get(u, {}).items():
+                targets.append(v)
+                weights.append(seconds)
+            offsets.append(len(targets))
+        self._set_arrays(lats, lons, offsets, targets, weights)
+
+    @classmethod
+    def from_arrays(cls, lats, lons, offsets, targets, weights):
+        graph = cls.__new__(cls)
+        graph._set_arrays(lats, lons, offsets, targets, weights)
+        return graph
+
+    def _set_arrays(self, lats, lons, offsets, targets, weights):
+        self.lats, self.lons = lats, lons
+        self.offsets, self.targets, self.weights = offsets, targets, weights
+        self.nodes = PointIndex(range(len(lats)), lats, lons)
+
+    def __len__(self):
+        return len(self.lats)
+
+    def neighbors(self, u):
+        for i in range(self.offsets[u], self.offsets[u + 1]):
+            yield self.targets[i], self.weights[i]
+
+    def snap(self, lat, lon):
+        """Nearest graph node and the seconds it takes to walk to it directly."""
+        hits = self.nodes.nearest(lat, lon, 1)
+        if not hits:
+            return None, math.inf
+        node, meters = hits[0]
+        return node, meters / WALK_SPEED_MPS
+
+    def shortest_tree(self, source):
+        """Seconds from ``source`` to every node (inf when unreachable)."""
+        dist = array("d", [math.inf]) * len(self)
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for v, w in self.neighbors(u):
+                nd = d + w
+                if nd < dist[v]:
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return dist
+
+
+class WalkingEngine:
+    def __init__(self, graph, landmarks=LANDMARK_COUNT, landmark_trees=None):
+        self.graph = graph
+        if landmark_trees is None:
+            landmark_trees = self._pick_landmarks(landmarks)
+        self.landmark_trees = landmark_trees
+        self._targets = {}  # node -> [(osm_id, seconds from node to bathroom)]
+        # per landmark: sorted distances from it to every node with a bathroom
+        self._target_dists = [[] for _ in landmark_trees]
+        # what the targets were built from, so callers know when to rebuild
+        self.targets_version = None
+        self.targets_loaded_at = -math.inf
+
+    def _pick_landmarks(self, count):
+        """Farthest-point selection; each landmark keeps a full distance tree."""
+        if not len(self.graph) or count <= 0:
+            return []
+        trees = []
+        # distance from each node to its closest landmark so far
+        closest = [math.inf] * len(self.graph)
+        current = 0
+        for _ in range(count):
+            tree = self.graph.shortest_tree(current)
+            trees.append(tree)
+            # next landmark: the reachable node farthest from all chosen so far
+            best, best_score = None, 0.0
+            for v, seconds in enumerate(tree):
+                if seconds < closest[v]:
+                    closest[v] = seconds
+                if closest[v] != math.inf and closest[v] > best_score:
+                    best, best_score = v, closest[v]
+            if best is None:
+                break
+            current = best
+        return trees
+
+    def lower_bound(self, u, target):
+        bound = 0.0
+        for tree in self.landmark_trees:
+            du, dt = tree[u], tree[target]
+            if du != math.inf and dt != math.inf:
+                bound = max(bound, abs(dt - du))
+        return bound
+
+    def set_bathrooms(self, docs):
+        """Snap bathrooms onto the graph so searches can stop at them."""
+        targets = {}
+        for doc in docs:
+            if doc.get("lat") is None or doc.get("lon") is None:
+                continue
+            node, seconds = self.graph.snap(doc["lat"], doc["lon"])
+            if node is not None:
+                targets.setdefault(node, []).append((doc["osm_id"], seconds))
+        self._targets = targets
+        self._target_dists = [
+            sorted(d for d in (tree[node] for node in targets) if d != math.inf)
+            for tree in self.landmark_trees
+        ]
+
+    def target_bound(self, u):
+        """Lower bound on the seconds from ``u`` to the closest bathroom node.
+
+        For each landmark, no bathroom can be nearer to ``u`` than the
+        smallest gap between its distance from the landmark and ``u``'s.
+        """
+        bound = 0.0
+        for tree, dists in zip(self.landmark_trees, self._target_dists):
+            du = tree[u]
+            if du == math.inf:
+                continue
+            if not dists:
+                # no bathroom in this landmark's component, which holds u
+                return math.inf
+            i = bisect_left(dists, du)
+            gap = min(abs(dists[j] - du) for j in (i - 1, i) if 0 <= j < len(dists))
+            bound = max(bound, gap)
+        return bound
+
+    def nearest_bathrooms(self, lat, lon, k=5, max_seconds=MAX_WALK_SECONDS, accept=None):
+        """Up to ``k`` ``(osm_id, walk_seconds)`` pairs, quickest first.
+
+        ``accept(osm_id)`` can rule bathrooms out without stopping the search.
+        """
+        source, start = self.graph.snap(lat, lon)
+        if source is None or k <= 0 or not self._targets:
+            return []
+
+        best = {}
+        kth_best = math.inf
+        dist = {source: start}
+        settled = set()
+        heap = [(start + self.target_bound(source), start, source)]
+        while heap:
+            f, d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            # the bound is consistent, so no bathroom left is nearer than f
+            if f > max_seconds or f >= kth_best:
+                break
+            settled.add(u)
+            for osm_id, extra in self._targets.get(u, ()):
+                if accept is not None and not accept(osm_id):
+                    continue
+                total = d + extra
+                if total <= max_seconds and total < best.get(osm_id, math.inf):
+                    best[osm_id] = total
+                    if len(best) >= k:
+                        kth_best = sorted(best.values())[k - 1]
+            for v, w in self.graph.neighbors(u):
+                nd = d + w
+                if v not in settled and nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd + self.target_bound(v), nd, v))
+
+        return sorted(best.items(), key=lambda item: item[1])[:k]
+
+    def walking_seconds(self, from_lat, from_lon, to_lat, to_lon):
+        """Point-to-point walking time via A* with landmark lower bounds."""
+        source, start = self.graph.snap(from_lat, from_lon)
+        target, end = self.graph.snap(to_lat, to_lon)
+        if source is None or target is None:
+            return None
+
+        dist = {source: 0.0}
+        heap = [(self.lower_bound(source, target), source)]
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u == target:
+                return start + dist[u] + end
+            for v, w in self.graph.neighbors(u):
+                nd = dist[u] + w
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd + self.lower_bound(v, target), v))
+        return None
+
+
+def _pad(n):
+    return -n % 8
+
+
+def _little_endian(arr):
+    if sys.byteorder != "little":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr
+
+
+def build_engine(osm_path, landmarks=LANDMARK_COUNT):
+    return WalkingEngine(StreetGraph(*read_osm_xml(osm_path)), landmarks=landmarks)
+
+
+def write_graph(path, engine):
+    """Write ``engine``'s graph and landmark trees to ``path``."""
+    graph = engine.graph
+    sections = [
+        array("d", graph.lats),
+        array("d", graph.lons),
+        array("q", graph.offsets),
+        array("q", graph.targets),
+        array("d", graph.weights),
+    ]
+    sections += [array("d", tree) for tree in engine.landmark_trees]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC, VERSION, len(graph), len(graph.targets), len(engine.landmark_trees)
+            )
+        )
+        f.write(b"\0" * _pad(HEADER.size))
+        for section in sections:
+            data = _little_endian(section).tobytes()
+            f.write(data)
+            f.write(b"\0" * _pad(len(data)))
+    os.replace(tmp_path, path)
+
+
+def read_graph(path):
+    """WalkingEngine over the file at ``path``; the arrays stay in the mapping."""
+    with open(path, "rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapping)
+    magic, version, n_nodes, n_edges, n_landmarks = HEADER.unpack_from(view, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a v{VERSION} street graph")
+    offset = HEADER.size + _pad(HEADER.size)
+
+    def take(code, n):
+        nonlocal offset
+        size = array(code).itemsize * n
+        section = view[offset : offset + size].cast(code)
+        if sys.byteorder != "little":
+            section = _little_endian(array(code, section))
+        offset += size + _pad(size)
+        return section
+
+    graph = StreetGraph.from_arrays(
+        take("d", n_nodes),
+        take("d", n_nodes),
+        take("q", n_nodes + 1),
+        take("q", n_edges),
+        take("d", n_edges),
+    )
+    trees = [take("d", n_nodes) for _ in range(n_landmarks)]
+    return WalkingEngine(graph, landmark_trees=trees)
+
+
+def load_engine(path):
+    """Map the street graph built by ``build_street_graph.py``, if configured.
+
+    A file that can't be read is logged and walking search stays off.
+    """
+    global engine
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        engine = read_graph(path)
+    except (OSError, ValueError, struct.error) as exc:
+        logger.warning("Ignoring street graph %s: %s", path, exc)
+        return None
+    return engine
@@ -0,0 +1,179 @@
+"""Ranked search: distance, rating, favorites and name match in one score.
+
+``GET /api/bathrooms/search`` answers "good bathrooms near me named like
+X". Candidates come from a spatial prefilter, everything within
+``radius_m`` of the point (one indexed bbox query, or the read model's
+latitude index). Each candidate gets four 0..1 signals:
+
+- distance: ``0.5 ** (distance / DISTANCE_HALF_LIFE_M)``
+- rating: the Bayesian average of ``average_rating`` over ``rating_count``
+  reviews and ``RATING_PRIOR_WEIGHT`` reviews at ``RATING_PRIOR``, scaled
+  from 1..5, so a single 5-star review doesn't outrank fifty 4.8s
+- favorites: ``log1p(favorite_count)``, saturating at ``FAVORITES_SATURATION``
+- text: how well the name matches ``q`` (only when ``q`` is given)
+
+The score is their weighted mean; weights come from ``SEARCH_WEIGHTS``
+and can be overridden per request with ``w_<signal>``. Only the top
+``limit`` scores are selected (``argpartition``), so the candidate set is
+never fully sorted.
+"""
+
+import math
+import os
+import re
+from difflib import SequenceMatcher
+import numpy as np
+from webapp.geo import haversine_m
+
+SIGNALS = ("distance", "rating", "favorites", "text")
+DEFAULT_WEIGHTS = {"distance": 1.0, "rating": 1.0, "favorites": 0.5, "text": 1.5}
+
+DEFAULT_RADIUS_M = 2000
+DISTANCE_HALF_LIFE_M = 400
+RATING_PRIOR = 3.0
+RATING_PRIOR_WEIGHT = 5
+FAVORITES_SATURATION = 50
+# with q, names matching worse than this are not results at all
+MIN_TEXT_SCORE = 0.5
+MAX_LIMIT = 100
+
+
+def parse_weights(spec, base=None):
+    """Weights from ``"distance=1,rating=2"``; signals not named keep ``base``."""
+    weights = dict(base or DEFAULT_WEIGHTS)
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in SIGNALS:
+            raise ValueError(f"Unknown search signal: {name}")
+        weight = float(value)
+        if not weight >= 0:
+            raise ValueError(f"Weight for {name} must be a non-negative number")
+        weights[name] = weight
+    return weights
+
+
+WEIGHTS = parse_weights(os.environ.get("SEARCH_WEIGHTS"))
+
+
+def parse_weight_args(args):
+    """Weights with any ``w_<signal>`` query parameters applied.
+
+    Returns ``(weights, error)`` like the other request parsers.
+    """
+    overrides = [f"{name}={args[f'w_{name}']}" for name in SIGNALS if f"w_{name}" in args]
+    try:
+        weights = parse_weights(",".join(overrides), WEIGHTS)
+    except ValueError as exc:
+        return None, str(exc)
+    if not any(weights.values()):
+        return None, "At least one search weight must be positive"
+    return weights, None
+
+
+def _words(text):
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+
+def text_score(query_words, name):
+    """0..1 match of the search words against a bathroom name.
+
+    1 when the name contains the query as a phrase; otherwise the better of
+    the share of query words that start some word of the name (so "starb"
+    finds "Starbucks") and a fuzzy ratio, capped below a phrase match.
+    """
+    name_words = _words(name)
+    if not query_words or not name_words:
+        return 0.0
+    phrase, joined = " ".join(query_words), " ".join(name_words)
+    if f" {phrase} " in f" {joined} ":
+        return 1.0
+    covered = sum(any(w.startswith(q) for w in name_words) for q in query_words)
+    fuzzy = SequenceMatcher(None, phrase, joined).ratio()
+    return 0.9 * max(covered / len(query_words), fuzzy)
+
+
+def rating_signal(average, count):
+    """Confidence-adjusted rating on 0..1; unrated bathrooms get the prior."""
+    count = count or 0
+    mean = RATING_PRIOR if average is None or not count else average
+    adjusted = (RATING_PRIOR * RATING_PRIOR_WEIGHT + mean * count) / (
+        RATING_PRIOR_WEIGHT + count
+    )
+    return (adjusted - 1) / 4
+
+
+def favorites_signal(count):
+    return min(1.0, math.log1p(count or 0) / math.log1p(FAVORITES_SATURATION))
+
+
+def _get(row, field):
+    return row.get(field) if isinstance(row, dict) else getattr(row, field)
+
+
+def rank(candidates, lat, lon, limit, q=None, weights=None, radius_m=None):
+    """The ``limit`` best ``(candidate, score, distance_m)``, best first.
+
+    ``candidates`` are dicts or read-model listings with ``lat``, ``lon``,
+    ``tags``, ``average_rating``, ``rating_count`` and ``favorite_count``.
+    """
+    weights = dict(WEIGHTS if weights is None else weights)
+    query_words = _words(q)
+    if not query_words:
+        weights["text"] = 0.0
+    total = sum(weights.values())
+    candidates = [c for c in candidates if _get(c, "lat") is not None]
+    if not candidates or limit <= 0 or not total:
+        return []
+
+    distances = haversine_m(
+        lat,
+        lon,
+        np.fromiter((_get(c, "lat") for c in candidates), float, len(candidates)),
+        np.fromiter((_get(c, "lon") for c in candidates), float, len(candidates)),
+    )
+    keep = np.ones(len(candidates), dtype=bool)
+    if radius_m is not None:
+        keep &= distances <= radius_m
+
+    score = weights["distance"] * 0.5 ** (distances / DISTANCE_HALF_LIFE_M)
+    if weights["rating"]:
+        score += weights["rating"] * np.fromiter(
+            (
+                rating_signal(_get(c, "average_rating"), _get(c, "rating_count"))
+                for c in candidates
+            ),
+            float,
+            len(candidates),
+        )
+    if weights["favorites"]:
+        score += weights["favorites"] * np.fromiter(
+            (favorites_signal(_get(c, "favorite_count")) for c in candidates),
+            float,
+            len(candidates),
+        )
+    if query_words:
+        # names repeat a lot ("Starbucks", unnamed), so match each once
+        matches = {}
+        for c in candidates:
+            name = (_get(c, "tags") or {}).get("name")
+            if name not in matches:
+                matches[name] = text_score(query_words, name)
+        text = np.fromiter(
+            (matches[(_get(c, "tags") or {}).get("name")] for c in candidates),
+            float,
+            len(candidates),
+        )
+        keep &= text >= MIN_TEXT_SCORE
+        score += weights["text"] * text
+    score /= total
+
+    positions = np.flatnonzero(keep)
+    if len(positions) > limit:
+        top = np.argpartition(-score[positions], limit - 1)[:limit]
+        positions = positions[top]
+    # best first; ties go to the closer bathroom
+    order = np.lexsort((distances[positions], -score[positions]))
+    return [
+        (candidates[i], float(score[i]), float(distances[i])) for i in positions[order]
+    ]
@@ -0,0 +1,319 @@
+"""Compact columnar snapshot of the bathroom listing fields.
+
+``export_snapshot.py`` writes one file; workers ``mmap`` it at startup and
+read the numeric columns in place instead of decoding thousands of BSON
+documents. Anything written after the snapshot is fetched through the
+change sequence (see ``webapp.changes``). The ``osm_id`` column only holds
+integers, so the rare bathroom with another kind of id is left out of the
+file and read from Mongo when the snapshot is seeded. A file that can't be
+read (another format version, truncated) is logged and ignored.
+
+File layout (little-endian, every section 8-byte aligned)::
+
+    header   magic, version, count, seq, created_at, n_strings, n_pairs, n_intervals
+    osm_id          int64[count]
+    lat, lon        float64[count]
+    average_rating  float64[count]   NaN when unrated
+    rating_count    int32[count]
+    favorite_count  int32[count]
+    hours_known     int8[count]      0 when opening_hours could not be compiled
+    tag_offsets     uint32[count + 1]  row i owns pairs[tag_offsets[i]:tag_offsets[i + 1]]
+    tag_pairs       uint32[2 * n_pairs]  (key, value) indexes into the string table
+    hours_offsets   uint32[count + 1]  same scheme for the open intervals
+    hours           uint16[2 * n_intervals]  (start, end) minute of week
+    str_offsets     uint32[n_strings + 1]
+    strings         utf-8 blob
+"""
+
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from webapp.changes import changes_since, compacted_floor, current_seq
+from webapp.db import bathrooms_collection
+
+MAGIC = b"VIVOSNAP"
+VERSION = 2
+HEADER = struct.Struct("<8sIIqdIII")
+
+SNAPSHOT_PROJECTION = {
+    "_id": 0,
+    "osm_id": 1,
+    "lat": 1,
+    "lon": 1,
+    "tags": 1,
+    "average_rating": 1,
+    "rating_count": 1,
+    "favorite_count": 1,
+    "open_intervals": 1,
+}
+
+# (column, array typecode); order is the on-disk order
+COLUMNS = (
+    ("osm_id", "q"),
+    ("lat", "d"),
+    ("lon", "d"),
+    ("average_rating", "d"),
+    ("rating_count", "i"),
+    ("favorite_count", "i"),
+    ("hours_known", "b"),
+)
+
+# ids the osm_id column can't hold, for seed_rows to fetch from Mongo
+NON_INT_ID_QUERY = {
+    "$and": [
+        {"osm_id": {"$not": {"$type": "int"}}},
+        {"osm_id": {"$not": {"$type": "long"}}},
+    ]
+}
+
+logger = logging.getLogger(__name__)
+
+# populated by warm_start()
+loaded = None
+
+
+def _pad(n):
+    return -n % 8
+
+
+def _int_id(value):
+    if isinstance(value, bool) or not isinstance(value, int):
+        return False
+    return -(2**63) <= value < 2**63
+
+
+def _little_endian(arr):
+    if sys.byteorder != "little":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr
+
+
+def write_snapshot(path, docs, seq=0):
+    """Write ``docs`` (listing-shaped dicts) to ``path``. Returns the row count."""
+    columns = {name: array(code) for name, code in COLUMNS}
+    tag_offsets = array("I", [0])
+    tag_pairs = array("I")
+    hours_offsets = array("I", [0])
+    hours = array("H")
+    strings = {}
+
+    def intern(value):
+        value = str(value)
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+        return index
+
+    for doc in docs:
+        if doc.get("lat") is None or doc.get("lon") is None or not _int_id(doc["osm_id"]):
+            continue
+        rating = doc.get("average_rating")
+        columns["osm_id"].append(doc["osm_id"])
+        columns["lat"].append(float(doc["lat"]))
+        columns["lon"].append(float(doc["lon"]))
+        columns["average_rating"].append(math.nan if rating is None else float(rating))
+        columns["rating_count"].append(int(doc.get("rating_count") or 0))
+        columns["favorite_count"].append(int(doc.get("favorite_count") or 0))
+        intervals = doc.get("open_intervals")
+        columns["hours_known"].append(0 if intervals is None else 1)
+        for interval in intervals or ():
+            hours.append(interval["s"])
+            hours.append(interval["e"])
+        hours_offsets.append(len(hours) // 2)
+        for key, value in (doc.get("tags") or {}).items():
+            tag_pairs.append(intern(key))
+            tag_pairs.append(intern(value))
+        tag_offsets.append(len(tag_pairs) // 2)
+
+    blob = bytearray()
+    str_offsets = array("I", [0])
+    for value in strings:
+        blob += value.encode("utf-8")
+        str_offsets.append(len(blob))
+
+    count = len(columns["osm_id"])
+    sections = [columns[name] for name, _ in COLUMNS]
+    sections += [tag_offsets, tag_pairs, hours_offsets, hours, str_offsets]
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                count,
+                seq,
+                time.time(),
+                len(strings),
+                len(tag_pairs) // 2,
+                len(hours) // 2,
+            )
+        )
+        f.write(b"\0" * _pad(HEADER.size))
+        for section in sections:
+            data = _little_endian(section).tobytes()
+            f.write(data)
+            f.write(b"\0" * _pad(len(data)))
+        f.write(blob)
+    os.replace(tmp_path, path)
+    return count
+
+
+class Snapshot:
+    """Read-only view over a snapshot file; numeric columns are zero-copy."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        (
+            magic,
+            version,
+            count,
+            seq,
+            created_at,
+            n_strings,
+            n_pairs,
+            n_intervals,
+        ) = HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a v{VERSION} bathroom snapshot")
+        self.count = count
+        self.seq = seq
+        self.created_at = created_at
+
+        offset = HEADER.size + _pad(HEADER.size)
+
+        def take(code, n):
+            nonlocal offset
+            size = array(code).itemsize * n
+            section = view[offset : offset + size].cast(code)
+            if sys.byteorder != "little":
+                section = _little_endian(array(code, section))
+            offset += size + _pad(size)
+            return section
+
+        for name, code in COLUMNS:
+            setattr(self, name, take(code, count))
+        self.tag_offsets = take("I", count + 1)
+        self.tag_pairs = take("I", 2 * n_pairs)
+        self.hours_offsets = take("I", count + 1)
+        self.hours = take("H", 2 * n_intervals)
+        str_offsets = take("I", n_strings + 1)
+
+        blob = bytes(view[offset : offset + (str_offsets[-1] if n_strings else 0)])
+        self.strings = [
+            blob[str_offsets[i] : str_offsets[i + 1]].decode("utf-8")
+            for i in range(n_strings)
+        ]
+
+    def tags(self, i):
+        pairs = self.tag_pairs
+        strings = self.strings
+        return {
+            strings[pairs[2 * j]]: strings[pairs[2 * j + 1]]
+            for j in range(self.tag_offsets[i], self.tag_offsets[i + 1])
+        }
+
+    def open_intervals(self, i):
+        if not self.hours_known[i]:
+            return None
+        hours = self.hours
+        return [
+            {"s": hours[2 * j], "e": hours[2 * j + 1]}
+            for j in range(self.hours_offsets[i], self.hours_offsets[i + 1])
+        ]
+
+    def row(self, i):
+        rating = self.average_rating[i]
+        return {
+            "osm_id": self.osm_id[i],
+            "lat": self.lat[i],
+            "lon": self.lon[i],
+            "tags": self.tags(i),
+            "average_rating": None if math.isnan(rating) else rating,
+            "rating_count": self.rating_count[i],
+            "favorite_count": self.favorite_count[i],
+            "open_intervals": self.open_intervals(i),
+        }
+
+    def rows(self):
+        for i in range(self.count):
+            yield self.row(i)
+
+
+def export_snapshot(path):
+    # Read the head first: catch-up replays anything that races the scan.
+    seq = current_seq()
+    docs = bathrooms_collection.find({}, SNAPSHOT_PROJECTION)
+    return write_snapshot(path, docs, seq=seq)
+
+
+def catch_up(snapshot):
+    """Fetch what changed since ``snapshot`` was taken.
+
+    Returns ``(upserts, deleted_ids, seq)``, or None when the change log no
+    longer reaches back that far and the caller should load from Mongo.
+    """
+    if snapshot.seq < compacted_floor():
+        return None
+
+    upserts, deleted, seq = [], set(), snapshot.seq
+    while True:
+        changes = changes_since(seq, 1000)
+        if not changes:
+            break
+        seq = changes[-1]["seq"]
+        deleted.update(c["osm_id"] for c in changes if c.get("op") == "delete")
+        ids = [c["osm_id"] for c in changes if c.get("op") != "delete"]
+        upserts.extend(
+            bathrooms_collection.find({"osm_id": {"$in": ids}}, SNAPSHOT_PROJECTION)
+        )
+    return upserts, deleted, seq
+
+
+def warm_start(path):
+    """Load the snapshot at ``path`` for this worker, if there is one."""
+    global loaded
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        snapshot = Snapshot(path)
+    except (OSError, ValueError, TypeError, struct.error) as exc:
+        # the read model loads from Mongo instead
+        logger.warning("ignoring snapshot %s: %s", path, exc)
+        return None
+    loaded = snapshot
+    return loaded
+
+
+def seed_rows(snapshot):
+    """Snapshot rows merged with everything written since it was taken.
+
+    Returns ``(rows, seq)``, or None if the snapshot is too old to catch up.
+    """
+    caught_up = catch_up(snapshot)
+    if caught_up is None:
+        return None
+    upserts, deleted, seq = caught_up
+
+    fresh = {doc["osm_id"]: doc for doc in upserts}
+    rows = [
+        snapshot.row(i)
+        for i in range(snapshot.count)
+        if snapshot.osm_id[i] not in fresh and snapshot.osm_id[i] not in deleted
+    ]
+    rows.extend(fresh.values())
+    rows.extend(
+        doc
+        for doc in bathrooms_collection.find(NON_INT_ID_QUERY, SNAPSHOT_PROJECTION)
+        if doc["osm_id"] not in fresh and doc["osm_id"] not in deleted
+    )
+    return rows, seq
@@ -143,29 +143,16 @@ async function loadBathroomDetails(osm_id) {
     const res = await fetch(`/api/bathrooms/${osm_id}`);
     const data = await res.json();
 
-    // 1. Handle Reviews
-    if (data.reviews) {
-      renderComments(data.reviews);
-
-      // use the average
-      const avg =
-        data.average_rating ??
-        data.reviews.reduce((sum, r) => sum + r.rating, 0) /
-          (data.reviews.length || 1);
-      const count = data.rating_count ?? data.reviews.length;
-
-      renderAverageRating(avg, count);
-      const userEmail = window.currentUserEmail;
-      const myReview = data.reviews.find((r) => r.user_email === userEmail);
-      if (myReview) {
-        selectedRating = myReview.rating;
-        highlightStars(selectedRating);
-      } else {
-        selectedRating = null;
-        highlightStars(0);
-      }
+    // 1. Handle Reviews (summary only; the full list is at /reviews)
+    const summary = data.review_summary || { recent: [] };
+    renderComments(summary.recent);
+    renderAverageRating(data.average_rating || 0, data.rating_count || 0);
+    if (data.my_review) {
+      selectedRating = data.my_review.rating;
+      highlightStars(selectedRating);
     } else {
-      renderAverageRating(0, 0);
+      selectedRating = null;
+      highlightStars(0);
     }
 
     // 2. Handle Images
@@ -235,10 +222,10 @@ submitCommentModalBtn.addEventListener("click", async () => {
     }
 
     const updatedBathroom = await res.json();
-    renderComments(updatedBathroom.reviews);
+    renderComments(updatedBathroom.review_summary.recent);
     renderAverageRating(
       updatedBathroom.average_rating || 0,
-      updatedBathroom.rating_count || updatedBathroom.reviews.length,
+      updatedBathroom.rating_count || 0,
     );
 
     commentModal.classList.add("hidden"); 
@@ -348,6 +335,10 @@ if (addImageBtn && imageInput) {
         const ctx = canvas.getContext("2d");
         ctx.drawImage(img, 0, 0, width, height);
         const resizedUrl = canvas.toDataURL("image/png");
+        // sent as raw bytes rather than base64 inside JSON
+        const blob = await new Promise((resolve) =>
+          canvas.toBlob(resolve, "image/png"),
+        );
 
         if (!currentBathroomId) {
           alert("No bathroom selected!");
@@ -359,8 +350,8 @@ if (addImageBtn && imageInput) {
             `/api/bathrooms/${currentBathroomId}/images`,
             {
               method: "POST",
-              headers: { "Content-Type": "application/json" },
-              body: JSON.stringify({ image: resizedUrl }),
+              headers: { "Content-Type": "image/png" },
+              body: blob,
             },
           );
 
@@ -621,14 +612,81 @@ async function reverseGeocode(lat, lon) {
   }
 }
 
+// Local replica of the marker list, kept fresh with /api/bathrooms/changes
+const REPLICA_KEY = "vivo.bathrooms.replica";
+
+function loadReplica() {
+  try {
+    return JSON.parse(localStorage.getItem(REPLICA_KEY));
+  } catch (err) {
+    return null;
+  }
+}
+
+function saveReplica(replica) {
+  try {
+    localStorage.setItem(REPLICA_KEY, JSON.stringify(replica));
+  } catch (err) {
+    console.warn("Could not persist bathroom replica:", err);
+  }
+}
+
+// Rows from a format=compact body (see webapp/wire.py): one array per
+// field, integer coordinates, and tags as indexes into a string table.
+function expandCompact(data) {
+  const { scale, strings } = data;
+  return data.osm_id.map((osm_id, i) => {
+    const flat = data.tags[i];
+    const tags = {};
+    for (let j = 0; j < flat.length; j += 2) {
+      tags[strings[flat[j]]] = strings[flat[j + 1]];
+    }
+    return {
+      osm_id,
+      lat: data.lat[i] === null ? null : data.lat[i] / scale,
+      lon: data.lon[i] === null ? null : data.lon[i] / scale,
+      tags,
+      average_rating: data.average_rating[i],
+      rating_count: data.rating_count[i],
+    };
+  });
+}
+
+async function syncBathrooms() {
+  let replica = loadReplica();
+
+  // apply diffs until caught up; the server asks for a reset if it can't diff
+  while (replica && replica.seq) {
+    const res = await fetch(`/api/bathrooms/changes?since=${replica.seq}`);
+    const data = await res.json();
+    if (data.reset) {
+      replica = null;
+      break;
+    }
+    data.upserts.forEach((b) => (replica.bathrooms[b.osm_id] = b));
+    data.deletions.forEach((id) => delete replica.bathrooms[id]);
+    replica.seq = data.seq;
+    if (!data.has_more) break;
+  }
+
+  if (!replica || !replica.seq) {
+    const res = await fetch("/api/bathrooms?format=compact");
+    const data = await res.json();
+    replica = { seq: data.seq, bathrooms: {} };
+    expandCompact(data).forEach((b) => (replica.bathrooms[b.osm_id] = b));
+  }
+
+  saveReplica(replica);
+  return Object.values(replica.bathrooms);
+}
+
 // Fetch bathrooms
 function fetchBathrooms() {
-  fetch("/api/bathrooms")
-    .then((res) => res.json())
-    .then((data) => {
+  syncBathrooms()
+    .then((bathrooms) => {
       markersLayer.clearLayers();
 
-      data.bathrooms.forEach((el) => {
+      bathrooms.forEach((el) => {
         const lat = el.lat;
         const lon = el.lon;
         if (!lat || !lon) return;
@@ -815,6 +873,46 @@ const debouncedFetchRecommendations = debounce(fetchRecommendations, 1000);
 // Listen to map move
 map.on("moveend", debouncedFetchRecommendations);
 
+// --- Live updates (SSE) ---
+
+let updatesSource = null;
+
+function applyLiveUpdates(updates) {
+  const replica = loadReplica();
+  updates.forEach((u) => {
+    if (replica && replica.bathrooms[u.osm_id]) {
+      Object.assign(replica.bathrooms[u.osm_id], {
+        average_rating: u.average_rating,
+        rating_count: u.rating_count,
+      });
+    }
+    if (u.osm_id === currentBathroomId) {
+      renderAverageRating(u.average_rating || 0, u.rating_count);
+    }
+  });
+  if (replica) saveReplica(replica);
+}
+
+// re-subscribe with the current viewport so the server only pushes what we can see
+function subscribeToUpdates() {
+  if (!window.EventSource) return;
+  if (updatesSource) updatesSource.close();
+
+  const b = map.getBounds();
+  updatesSource = new EventSource(
+    `/api/stream?min_lat=${b.getSouth()}&max_lat=${b.getNorth()}` +
+      `&min_lon=${b.getWest()}&max_lon=${b.getEast()}`,
+  );
+  updatesSource.addEventListener("bathrooms", (e) =>
+    applyLiveUpdates(JSON.parse(e.data)),
+  );
+  // we fell too far behind; pull a diff instead
+  updatesSource.addEventListener("resync", () => fetchBathrooms());
+}
+
+map.on("moveend", debounce(subscribeToUpdates, 1000));
+subscribeToUpdates();
+
 // Initial fetch
 fetchFavorites().then(() => {
   debouncedFetchRecommendations();
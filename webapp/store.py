@@ -0,0 +1,265 @@
+"""In-process read model for the map listing queries.
+
+Holds one slotted ``Listing`` per bathroom and answers the bbox / keyword /
+sort / limit queries of ``GET /api/bathrooms`` without a Mongo round trip.
+It is seeded from the columnar snapshot when one is loaded (falling back to
+a Mongo scan), updated in place by the write endpoints, and catches up on
+writes from other workers and the import scripts through the change
+sequence. Enabled with ``READ_MODEL=1``.
+"""
+
+import heapq
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from webapp import facets, snapshot
+from webapp.opening_hours import is_open
+from webapp.changes import changes_since, compacted_floor, current_seq
+from webapp.db import bathrooms_collection
+
+REFRESH_SECONDS = float(os.environ.get("READ_MODEL_REFRESH", "5"))
+
+LISTING_FIELDS = (
+    "osm_id",
+    "lat",
+    "lon",
+    "tags",
+    "average_rating",
+    "rating_count",
+    "favorite_count",
+    "open_intervals",
+)
+STORE_PROJECTION = {"_id": 0, **{field: 1 for field in LISTING_FIELDS}}
+
+
+class Listing:
+    __slots__ = LISTING_FIELDS
+
+    def __init__(self, doc):
+        self.osm_id = doc["osm_id"]
+        self.lat = doc["lat"]
+        self.lon = doc["lon"]
+        self.tags = doc.get("tags") or {}
+        self.average_rating = doc.get("average_rating")
+        self.rating_count = doc.get("rating_count") or 0
+        self.favorite_count = doc.get("favorite_count") or 0
+        self.open_intervals = doc.get("open_intervals")
+
+    def to_dict(self):
+        return {
+            "osm_id": self.osm_id,
+            "lat": self.lat,
+            "lon": self.lon,
+            "tags": self.tags,
+            "average_rating": self.average_rating,
+            "rating_count": self.rating_count,
+        }
+
+
+# Sort keys mirror Mongo's ordering, where null sorts below every value.
+def _rating_key(listing):
+    rating = listing.average_rating
+    return (rating is None, -(rating or 0))
+
+
+def _reviews_key(listing):
+    return -listing.rating_count
+
+
+def _name_key(listing):
+    name = listing.tags.get("name")
+    return (name is not None, name or "")
+
+
+SORT_KEYS = {"rating": _rating_key, "reviews": _reviews_key, "name": _name_key}
+
+
+def _keyword_matcher(keyword):
+    try:
+        pattern = re.compile(keyword, re.IGNORECASE)
+    except re.error:
+        pattern = re.compile(re.escape(keyword), re.IGNORECASE)
+    return lambda listing: bool(pattern.search(listing.tags.get("name") or ""))
+
+
+class BathroomStore:
+    def __init__(self, enabled=None):
+        if enabled is None:
+            enabled = os.environ.get("READ_MODEL") == "1"
+        self.enabled = enabled
+        self.loaded = False
+        self.seq = 0
+        self.refreshed_at = 0.0
+        # bumped on every mutation so derived indexes know when to rebuild
+        self.version = 0
+        self._by_id = {}
+        self._by_lat = None  # (lats, listings) sorted by lat; rebuilt lazily
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def load(self):
+        """(Re)build from the warm-start snapshot, or from Mongo."""
+        seeded = snapshot.seed_rows(snapshot.loaded) if snapshot.loaded else None
+        if seeded is None:
+            seq = current_seq()
+            rows = bathrooms_collection.find({}, STORE_PROJECTION)
+        else:
+            rows, seq = seeded
+
+        by_id = {}
+        for row in rows:
+            if row.get("lat") is not None and row.get("lon") is not None:
+                by_id[row["osm_id"]] = Listing(row)
+
+        with self._lock:
+            self._by_id = by_id
+            self._by_lat = None
+            self.version += 1
+            self.seq = seq
+            self.loaded = True
+            self.refreshed_at = time.monotonic()
+
+    def ensure_fresh(self, max_age=REFRESH_SECONDS):
+        if not self.loaded:
+            self.load()
+        elif time.monotonic() - self.refreshed_at >= max_age:
+            self.refresh()
+
+    def refresh(self):
+        """Apply writes recorded by other processes since ``self.seq``."""
+        if self.seq < compacted_floor():
+            self.load()
+            return
+        while True:
+            changes = changes_since(self.seq, 1000)
+            if not changes:
+                break
+            ids = [c["osm_id"] for c in changes if c.get("op") != "delete"]
+            docs = bathrooms_collection.find({"osm_id": {"$in": ids}}, STORE_PROJECTION)
+            with self._lock:
+                for change in changes:
+                    if change.get("op") == "delete":
+                        self._remove(change["osm_id"])
+                for doc in docs:
+                    self._upsert(doc)
+                self.seq = max(self.seq, changes[-1]["seq"])
+        self.refreshed_at = time.monotonic()
+
+    def upsert(self, doc):
+        if not self.loaded or not doc:
+            return
+        with self._lock:
+            self._upsert(doc)
+
+    def remove(self, osm_id):
+        if not self.loaded:
+            return
+        with self._lock:
+            self._remove(osm_id)
+
+    def _upsert(self, doc):
+        if doc.get("lat") is None or doc.get("lon") is None:
+            self._remove(doc.get("osm_id"))
+            return
+        self._by_id[doc["osm_id"]] = Listing(doc)
+        self._by_lat = None
+        self.version += 1
+
+    def _remove(self, osm_id):
+        if self._by_id.pop(osm_id, None) is not None:
+            self._by_lat = None
+            self.version += 1
+
+    def get(self, osm_id):
+        return self._by_id.get(osm_id)
+
+    def listings(self):
+        return list(self._by_id.values())
+
+    def _lat_index(self):
+        with self._lock:
+            if self._by_lat is None:
+                ordered = sorted(self._by_id.values(), key=lambda item: item.lat)
+                self._by_lat = ([item.lat for item in ordered], ordered)
+            return self._by_lat
+
+    def in_bbox(self, min_lat, max_lat, min_lon, max_lon):
+        lats, ordered = self._lat_index()
+        lo = bisect_left(lats, min_lat)
+        hi = bisect_right(lats, max_lat)
+        return [
+            item for item in ordered[lo:hi] if min_lon <= item.lon <= max_lon
+        ]
+
+    def query(
+        self,
+        bbox=None,
+        keyword=None,
+        sort=None,
+        limit=None,
+        facet_filters=None,
+        open_minute=None,
+        area_filter=None,
+    ):
+        """Same semantics as the Mongo query in ``get_bathrooms``."""
+        if area_filter is not None:
+            bbox = area_filter.clip(bbox or (None,) * 4)
+        if facet_filters:
+            index = facets.index_for_store(self)
+            bits = index.bbox_bits(*bbox) if bbox else index.all
+            bits = index.filter_bits(facet_filters, bits)
+            candidates = [self._by_id[osm_id] for osm_id in index.ids_of(bits)]
+        elif bbox:
+            candidates = self.in_bbox(*bbox)
+        else:
+            candidates = self.listings()
+        if area_filter is not None:
+            candidates = area_filter.filter(candidates)
+        if keyword:
+            matches = _keyword_matcher(keyword)
+            candidates = [item for item in candidates if matches(item)]
+        if open_minute is not None:
+            # unknown hours (None) stay in, matching open_query()
+            candidates = [
+                item
+                for item in candidates
+                if is_open(item.open_intervals, open_minute) is not False
+            ]
+
+        key = SORT_KEYS.get(sort)
+        if key and limit and limit > 0:
+            return heapq.nsmallest(limit, candidates, key=key)
+        if key:
+            candidates.sort(key=key)
+        if limit and limit > 0:
+            return candidates[:limit]
+        return candidates
+
+    def verify(self):
+        """Compare against Mongo. Returns ids that are missing, extra, or stale."""
+        report = {"missing": [], "extra": [], "stale": []}
+        seen = set()
+        for doc in bathrooms_collection.find({}, STORE_PROJECTION):
+            if doc.get("lat") is None or doc.get("lon") is None:
+                continue
+            osm_id = doc["osm_id"]
+            seen.add(osm_id)
+            listing = self._by_id.get(osm_id)
+            if listing is None:
+                report["missing"].append(osm_id)
+            else:
+                fresh = Listing(doc)
+                if any(
+                    getattr(listing, field) != getattr(fresh, field)
+                    for field in LISTING_FIELDS
+                ):
+                    report["stale"].append(osm_id)
+        report["extra"] = [osm_id for osm_id in self._by_id if osm_id not in seen]
+        return report
+
+
+read_model = BathroomStore()
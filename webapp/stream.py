@@ -0,0 +1,168 @@
+"""In-process fan-out of live bathroom updates for the SSE stream.
+
+Write endpoints call ``publisher.publish(doc)``; every open ``/api/stream``
+connection holds a ``Subscription`` whose pending updates are coalesced per
+``osm_id``, so a burst of reviews on one bathroom costs a subscriber a single
+event. A subscriber that falls more than ``MAX_PENDING`` bathrooms behind is
+told to resync instead of buffering without bound.
+
+The stream is only served by the ASGI app, where an open connection is a
+parked coroutine rather than a worker thread. Publishers may run on any
+thread (request handlers, the favorite flush timer), so they wake a
+subscriber's coroutine with ``call_soon_threadsafe``.
+"""
+
+import asyncio
+import json
+import threading
+
+MAX_PENDING = 500
+MAX_SUBSCRIBERS = 200
+HEARTBEAT_SECONDS = 15.0
+
+LIVE_FIELDS = ("average_rating", "rating_count", "favorite_count")
+
+
+def live_update(doc):
+    update = {"osm_id": doc.get("osm_id"), "lat": doc.get("lat"), "lon": doc.get("lon")}
+    for field in LIVE_FIELDS:
+        update[field] = doc.get(field)
+    update["rating_count"] = update["rating_count"] or 0
+    update["favorite_count"] = update["favorite_count"] or 0
+    return update
+
+
+class Subscription:
+    def __init__(self, bbox=None, max_pending=MAX_PENDING):
+        # bbox is (min_lat, max_lat, min_lon, max_lon) or None for everything
+        self.bbox = bbox
+        self.max_pending = max_pending
+        self.pending = {}
+        self.overflowed = False
+        self.closed = False
+        self._cond = threading.Condition()
+        self._waker = None
+
+    def wants(self, update):
+        if self.bbox is None:
+            return True
+        lat, lon = update.get("lat"), update.get("lon")
+        if lat is None or lon is None:
+            return False
+        min_lat, max_lat, min_lon, max_lon = self.bbox
+        return min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+
+    def offer(self, update):
+        with self._cond:
+            if self.overflowed:
+                return
+            osm_id = update["osm_id"]
+            if osm_id not in self.pending and len(self.pending) >= self.max_pending:
+                # Slow consumer: drop the backlog and ask it to resync.
+                self.pending.clear()
+                self.overflowed = True
+            else:
+                self.pending[osm_id] = update
+            self._notify()
+
+    def drain(self, timeout):
+        """Block until updates arrive or ``timeout`` passes.
+
+        Returns ``(updates, overflowed)`` and resets both.
+        """
+        with self._cond:
+            if not self.pending and not self.overflowed and not self.closed:
+                self._cond.wait(timeout)
+            updates = list(self.pending.values())
+            overflowed = self.overflowed
+            self.pending = {}
+            self.overflowed = False
+            return updates, overflowed
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._notify()
+
+    def wake(self, loop, event):
+        """Also set the asyncio ``event`` on ``loop`` whenever there is news."""
+        with self._cond:
+            self._waker = (loop, event)
+
+    def _notify(self):
+        # called with the condition held
+        self._cond.notify()
+        if self._waker is not None:
+            loop, event = self._waker
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # the loop is closed, and the stream went with it
+                pass
+
+
+class Publisher:
+    def __init__(self, max_subscribers=MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, bbox=None):
+        """Register a subscriber, or return None when at capacity."""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            sub = Subscription(bbox)
+            self._subscribers.add(sub)
+            return sub
+
+    def unsubscribe(self, sub):
+        sub.close()
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, doc):
+        if not doc:
+            return
+        update = live_update(doc)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            if sub.wants(update):
+                sub.offer(update)
+
+
+publisher = Publisher()
+
+
+async def async_event_stream(sub, heartbeat=None):
+    """Yield SSE frames for ``sub`` until the client goes away.
+
+    Between events the coroutine waits on an ``asyncio.Event`` that
+    ``Subscription.offer`` sets, so an idle client costs no wakeups until
+    its heartbeat.
+    """
+    heartbeat = HEARTBEAT_SECONDS if heartbeat is None else heartbeat
+    news = asyncio.Event()
+    sub.wake(asyncio.get_running_loop(), news)
+    try:
+        yield "retry: 5000\n\n"
+        while not sub.closed:
+            # cleared before draining, so an offer after the drain still wakes us
+            news.clear()
+            updates, overflowed = sub.drain(0)
+            if overflowed:
+                yield "event: resync\ndata: {}\n\n"
+            elif updates:
+                yield f"event: bathrooms\ndata: {json.dumps(updates)}\n\n"
+            else:
+                try:
+                    await asyncio.wait_for(news.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+    finally:
+        publisher.unsubscribe(sub)
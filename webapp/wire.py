@@ -0,0 +1,121 @@
+"""Compact, dictionary-encoded marker list for ``GET /api/bathrooms?format=compact``.
+
+The default listing repeats every key name on every row and ships the
+whole ``tags`` dict. The compact form is one array per field instead:
+
+    {"format": "compact", "scale": 100000, "strings": ["name", "Cafe", ...],
+     "osm_id": [...], "lat": [4073012, ...], "lon": [-7399051, ...],
+     "average_rating": [4.5, null, ...], "rating_count": [2, 0, ...],
+     "tags": [[0, 1], [], ...]}
+
+Coordinates are integers in units of 1/``scale`` degree (five decimals,
+about a metre). Tag keys and values are interned into ``strings``, and a
+row's tags are a flat list of alternating key and value indexes. Only the
+``MAP_TAGS`` the marker list uses are sent unless all tags are asked for.
+``expand`` turns a payload back into the usual rows.
+"""
+
+COORD_PRECISION = 5
+SCALE = 10**COORD_PRECISION
+RATING_DECIMALS = 2
+
+# what the map reads from a marker: its title and address lines
+MAP_TAGS = (
+    "name",
+    "addr:housenumber",
+    "addr:street",
+    "addr:city",
+    "addr:state",
+    "addr:postcode",
+)
+COMPACT_PROJECTION = {
+    "_id": 0,
+    "osm_id": 1,
+    "lat": 1,
+    "lon": 1,
+    "average_rating": 1,
+    "rating_count": 1,
+    **{f"tags.{key}": 1 for key in MAP_TAGS},
+}
+
+
+class CompactFormat:
+    """``format=compact`` options for one request."""
+
+    def __init__(self, all_tags=False):
+        self.tag_keys = None if all_tags else MAP_TAGS
+        # None: the caller's usual projection (every tag)
+        self.projection = None if all_tags else COMPACT_PROJECTION
+
+    def encode(self, rows, seq):
+        return {**compact_listings(rows, self.tag_keys), "seq": seq}
+
+
+def parse_format_args(args):
+    """``(CompactFormat or None, error)`` from ``format=`` and ``tags=all``."""
+    fmt = args.get("format", "json")
+    if fmt == "json":
+        return None, None
+    if fmt != "compact":
+        return None, "format must be json or compact"
+    return CompactFormat(all_tags=args.get("tags") == "all"), None
+
+
+def compact_listings(rows, tag_keys=MAP_TAGS):
+    """Column-encode listing rows (dicts or read-model listings).
+
+    ``tag_keys=None`` keeps every tag.
+    """
+    rows = list(rows)
+    if rows and isinstance(rows[0], dict):
+        column = lambda name: [row.get(name) for row in rows]  # noqa: E731
+    else:
+        column = lambda name: [getattr(row, name) for row in rows]  # noqa: E731
+
+    # insertion-ordered, so the keys are the string table
+    index = {}
+    intern = index.setdefault
+    wanted = None if tag_keys is None else frozenset(tag_keys)
+    encoded_tags = []
+    for tags in column("tags"):
+        flat = []
+        for key, value in (tags or {}).items():
+            if wanted is None or key in wanted:
+                flat.append(intern(key, len(index)))
+                flat.append(intern(value, len(index)))
+        encoded_tags.append(flat)
+
+    return {
+        "format": "compact",
+        "scale": SCALE,
+        "strings": list(index),
+        "osm_id": column("osm_id"),
+        "lat": [None if v is None else round(v * SCALE) for v in column("lat")],
+        "lon": [None if v is None else round(v * SCALE) for v in column("lon")],
+        "average_rating": [
+            None if v is None else round(v, RATING_DECIMALS)
+            for v in column("average_rating")
+        ],
+        "rating_count": [v or 0 for v in column("rating_count")],
+        "tags": encoded_tags,
+    }
+
+
+def expand(payload):
+    """The listing rows a compact payload encodes."""
+    scale, strings = payload["scale"], payload["strings"]
+    rows = []
+    for i, osm_id in enumerate(payload["osm_id"]):
+        lat, lon, flat = payload["lat"][i], payload["lon"][i], payload["tags"][i]
+        pairs = zip(flat[::2], flat[1::2])
+        rows.append(
+            {
+                "osm_id": osm_id,
+                "lat": None if lat is None else lat / scale,
+                "lon": None if lon is None else lon / scale,
+                "tags": {strings[k]: strings[v] for k, v in pairs},
+                "average_rating": payload["average_rating"][i],
+                "rating_count": payload["rating_count"][i],
+            }
+        )
+    return rows